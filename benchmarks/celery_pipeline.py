@@ -0,0 +1,285 @@
+"""
+Throughput of the Gemini message pipeline, from queue to stored response.
+
+    python -m benchmarks.celery_pipeline --messages 2000 --gemini-latency-ms 800
+    python -m benchmarks.celery_pipeline --pool threads --concurrency 32
+    python -m benchmarks.celery_pipeline --max-tasks-per-child 100 --save out.json
+
+Seeds `--messages` pending messages spread over `--users` users, starts a
+worker (`celery_worker.py`) with the fake Gemini model and file tracing, then
+floods `send_gemini_message`: either directly (`--path direct`, the default)
+or through the fair queue like `send_message` does (`--path fair`, which is
+capped by `FAIR_QUEUE_MAX_INFLIGHT`).
+
+Reported once every message is processed or `--timeout` runs out:
+
+- completion rate and time to drain
+- queue wait per task (`celery.queue_wait` spans)
+- DB write time (`db.process_gemini_responses` spans) and rows per write:
+  results are batched by the result sink under the threads pool only, and
+  written one by one under prefork
+- worker memory: RSS of the pool processes sampled from /proc, and how many
+  children were recycled by `worker_max_tasks_per_child`
+
+Needs the Postgres and Redis configured in the environment and Linux for the
+memory numbers. Compare pool modes and sizes by running it once per setting.
+"""
+
+import argparse
+import json
+import os
+import random
+import secrets
+import string
+import subprocess
+import sys
+import tempfile
+import time
+from collections import defaultdict
+
+from sqlmodel import Session, func, select
+
+from benchmarks.stats import compare, percentile, save_baseline
+from src.core.db_models import Chatrooms, Messages, Users
+from src.core.db_pool import DataBasePool
+
+
+def seed(session: Session, users: int, messages: int):
+    """Creates bench users, one chatroom each, and pending messages round-robin."""
+    owners = []
+    for _ in range(users):
+        mobile_number = "8" + "".join(random.choices(string.digits, k=9))
+        user = Users(mobile_number=mobile_number, confirmed=True)
+        chatroom = Chatrooms(owner_id=user.uid, name="bench")
+        session.add_all([user, chatroom])
+        owners.append((user.uid, chatroom.chatroom_id))
+    session.flush()
+
+    jobs = []
+    for i in range(messages):
+        uid, chatroom_id = owners[i % users]
+        message = Messages(chatroom_id=chatroom_id, sender_id=uid, text=f"bench {i}")
+        session.add(message)
+        jobs.append(
+            {
+                "message_id": message.mid,
+                "message_text": message.text,
+                "user_id": uid,
+                "traceparent": f"00-{secrets.token_hex(16)}-{secrets.token_hex(8)}-01",
+            }
+        )
+    session.commit()
+    return jobs
+
+
+def flood(jobs, path: str):
+    if path == "fair":
+        from src.celery.fair_queue import fair_queue
+
+        fair_queue.enqueue_many(jobs)
+        return
+
+    from src.celery.service import send_gemini_message
+
+    for job in jobs:
+        send_gemini_message.apply_async(
+            kwargs={"message_id": job["message_id"], "message_text": job["message_text"]},
+            headers={"traceparent": job["traceparent"], "enqueued_at": time.time()},
+        )
+
+
+def children_of(pid: int):
+    children = []
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat") as f:
+                ppid = int(f.read().rsplit(")", 1)[1].split()[1])
+        except (OSError, IndexError, ValueError):
+            continue
+        if ppid == pid:
+            children.append(int(entry))
+    return children
+
+
+def rss_kb(pid: int) -> int:
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return 0
+
+
+class MemorySampler:
+    """Tracks RSS of the worker's pool processes, keyed by pid."""
+
+    def __init__(self, worker_pid: int):
+        self.worker_pid = worker_pid
+        self.first = {}
+        self.last = {}
+        self.totals = []
+
+    def sample(self):
+        if not os.path.isdir("/proc"):
+            return
+        # celery_worker.py is the main worker process; pool children hang off it.
+        pids = [self.worker_pid] + children_of(self.worker_pid)
+        total = 0
+        for pid in pids:
+            rss = rss_kb(pid)
+            if rss:
+                self.first.setdefault(pid, rss)
+                self.last[pid] = rss
+                total += rss
+        self.totals.append(total)
+
+    def summary(self) -> dict:
+        growth = [self.last[pid] - self.first[pid] for pid in self.first]
+        return {
+            "processes_seen": len(self.first),
+            "rss_total_start_mb": round(self.totals[0] / 1024, 1) if self.totals else 0,
+            "rss_total_peak_mb": round(max(self.totals) / 1024, 1) if self.totals else 0,
+            "rss_total_end_mb": round(self.totals[-1] / 1024, 1) if self.totals else 0,
+            "rss_growth_per_process_max_mb": round(max(growth) / 1024, 1) if growth else 0,
+        }
+
+
+def read_spans(path: str, trace_ids: set):
+    """Span durations by name, plus the batch size each stored result was written in."""
+    durations = defaultdict(list)
+    batch_sizes = []
+    if not os.path.exists(path):
+        return durations, batch_sizes
+    with open(path) as f:
+        for line in f:
+            span = json.loads(line)
+            if span["trace_id"] in trace_ids and span.get("duration_ms") is not None:
+                durations[span["name"]].append(span["duration_ms"])
+                if span["name"] == "db.process_gemini_responses":
+                    batch_sizes.append(span["attributes"].get("batch_size", 1))
+    return durations, batch_sizes
+
+
+def write_batching(batch_sizes) -> dict:
+    # Every message in a batch records the same write, so a batch of n counts 1/n each.
+    writes = sum(1 / size for size in batch_sizes)
+    return {
+        "rows": len(batch_sizes),
+        "writes": round(writes),
+        "rows_per_write": round(len(batch_sizes) / writes, 2) if writes else 0,
+    }
+
+
+def distribution(values):
+    return {
+        "count": len(values),
+        "p50_ms": round(percentile(values, 50), 2),
+        "p95_ms": round(percentile(values, 95), 2),
+        "p99_ms": round(percentile(values, 99), 2),
+    }
+
+
+def run(args) -> dict:
+    DataBasePool.sync_setup()
+    trace_file = tempfile.NamedTemporaryFile(prefix="pipeline-", suffix=".jsonl", delete=False).name
+    env = {
+        **os.environ,
+        "GEMINI_FAKE_LATENCY_MS": str(args.gemini_latency_ms),
+        "TRACE_EXPORTER": "file",
+        "TRACE_FILE": trace_file,
+        "CELERY_POOL": args.pool,
+        "CELERY_CONCURRENCY": str(args.concurrency),
+        "CELERY_MAX_TASKS_PER_CHILD": str(args.max_tasks_per_child),
+        "WORKER_METRICS_PORT": "0",
+    }
+    worker = subprocess.Popen([sys.executable, "celery_worker.py"], env=env)
+    sampler = MemorySampler(worker.pid)
+    try:
+        time.sleep(args.warmup)
+        with Session(DataBasePool._engine) as session:
+            jobs = seed(session, args.users, args.messages)
+        mids = [job["message_id"] for job in jobs]
+
+        sampler.sample()
+        started = time.monotonic()
+        flood(jobs, args.path)
+
+        processed = 0
+        deadline = started + args.timeout
+        while time.monotonic() < deadline:
+            time.sleep(0.5)
+            sampler.sample()
+            with Session(DataBasePool._engine) as session:
+                processed = session.exec(
+                    select(func.count())
+                    .select_from(Messages)
+                    .where(Messages.mid.in_(mids), Messages.status == "processed")
+                ).one()
+            if processed >= len(mids):
+                break
+        elapsed = time.monotonic() - started
+    finally:
+        worker.terminate()
+        worker.wait(timeout=60)
+
+    spans, batch_sizes = read_spans(trace_file, {job["traceparent"].split("-")[1] for job in jobs})
+    return {
+        "config": {
+            "pool": args.pool or "prefork",
+            "concurrency": args.concurrency,
+            "max_tasks_per_child": args.max_tasks_per_child,
+            "path": args.path,
+            "gemini_latency_ms": args.gemini_latency_ms,
+        },
+        "pipeline": {
+            "count": processed,
+            "errors": len(mids) - processed,
+            "rps": round(processed / elapsed, 2),
+            "drain_seconds": round(elapsed, 2),
+        },
+        "queue_wait": distribution(spans["celery.queue_wait"]),
+        "task": distribution(spans["celery.send_gemini_message"]),
+        "db_write": distribution(spans["db.process_gemini_responses"]),
+        "db_write_batching": write_batching(batch_sizes),
+        "memory": sampler.summary(),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--messages", type=int, default=1000)
+    parser.add_argument("--users", type=int, default=50)
+    parser.add_argument("--path", choices=["direct", "fair"], default="direct")
+    parser.add_argument("--pool", default="", help="prefork (default), threads, solo, ...")
+    parser.add_argument("--concurrency", type=int, default=0)
+    parser.add_argument("--max-tasks-per-child", type=int, default=1000)
+    parser.add_argument("--gemini-latency-ms", type=float, default=800)
+    parser.add_argument("--warmup", type=float, default=5, help="Seconds to let the worker boot")
+    parser.add_argument("--timeout", type=float, default=600)
+    parser.add_argument("--save", metavar="PATH")
+    parser.add_argument("--compare", metavar="PATH")
+    parser.add_argument("--tolerance", type=float, default=0.1)
+    args = parser.parse_args()
+
+    results = run(args)
+    print(json.dumps(results, indent=2))
+    if args.save:
+        save_baseline(args.save, results)
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        series = ("pipeline", "queue_wait", "db_write")
+        regressions = compare(
+            {k: baseline[k] for k in series if k in baseline},
+            {k: results[k] for k in series},
+            args.tolerance,
+        )
+        for line in regressions:
+            print(f"REGRESSION {line}")
+        sys.exit(1 if regressions else 0)
@@ -0,0 +1,141 @@
+"""
+Local stand-in for the parts of the Stripe API used during checkout.
+
+Point the app at it with `STRIPE_API_BASE=http://127.0.0.1:<port>`.
+`latency_ms` adds a fixed delay to every response to mimic the real round trip.
+"""
+
+import argparse
+import json
+import secrets
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs
+
+
+def make_handler(latency_ms: float, unit_amount: int):
+    class StripeHandler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+        calls = {}
+
+        def log_message(self, format, *args):
+            pass
+
+        def _reply(self, body: dict, status: int = 200):
+            if latency_ms:
+                time.sleep(latency_ms / 1000)
+            raw = json.dumps(body).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(raw)))
+            self.send_header("Request-Id", f"req_{secrets.token_hex(8)}")
+            self.end_headers()
+            self.wfile.write(raw)
+
+        def _count(self, key: str):
+            StripeHandler.calls[key] = StripeHandler.calls.get(key, 0) + 1
+
+        def _form(self) -> dict:
+            length = int(self.headers.get("Content-Length") or 0)
+            raw = self.rfile.read(length).decode() if length else ""
+            return {k: v[0] for k, v in parse_qs(raw).items()}
+
+        def do_POST(self):
+            form = self._form()
+            if self.path == "/v1/customers":
+                self._count("customers.create")
+                return self._reply(
+                    {
+                        "id": f"cus_{secrets.token_hex(7)}",
+                        "object": "customer",
+                        "email": form.get("email"),
+                    }
+                )
+            if self.path == "/v1/checkout/sessions":
+                self._count("checkout.sessions.create")
+                session_id = f"cs_test_{secrets.token_hex(12)}"
+                return self._reply(
+                    {
+                        "id": session_id,
+                        "object": "checkout.session",
+                        "customer": form.get("customer"),
+                        "mode": form.get("mode"),
+                        "url": f"https://checkout.stripe.test/{session_id}",
+                    }
+                )
+            self._reply({"error": {"message": "not found"}}, status=404)
+
+        def do_GET(self):
+            if self.path.startswith("/v1/prices/"):
+                self._count("prices.retrieve")
+                return self._reply(
+                    {
+                        "id": self.path.rsplit("/", 1)[-1],
+                        "object": "price",
+                        "unit_amount": unit_amount,
+                        "currency": "usd",
+                    }
+                )
+            if self.path.startswith("/v1/subscriptions/"):
+                self._count("subscriptions.retrieve")
+                return self._reply(
+                    {
+                        "id": self.path.rsplit("/", 1)[-1],
+                        "object": "subscription",
+                        "status": "active",
+                        "current_period_end": int(time.time()) + 30 * 86400,
+                    }
+                )
+            if self.path.startswith("/v1/customers/"):
+                self._count("customers.retrieve")
+                return self._reply(
+                    {"id": self.path.rsplit("/", 1)[-1], "object": "customer"}
+                )
+            self._reply({"error": {"message": "not found"}}, status=404)
+
+    return StripeHandler
+
+
+class FakeStripeServer:
+    def __init__(
+        self,
+        host: str = "127.0.0.1",
+        port: int = 0,
+        latency_ms: float = 0,
+        unit_amount: int = 99900,
+    ):
+        self.handler = make_handler(latency_ms, unit_amount)
+        self.server = ThreadingHTTPServer((host, port), self.handler)
+        self.server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self) -> str:
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    @property
+    def calls(self) -> dict:
+        return dict(self.handler.calls)
+
+    def start(self):
+        self._thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=12111)
+    parser.add_argument("--latency-ms", type=float, default=150)
+    args = parser.parse_args()
+
+    server = FakeStripeServer(args.host, args.port, args.latency_ms)
+    print(f"Fake Stripe listening on {server.url}")
+    server.server.serve_forever()
@@ -0,0 +1,219 @@
+"""
+HTTP load test of the API with stand-ins for Gemini and Stripe.
+
+    python -m benchmarks.http_load --users 20 --duration 30
+    python -m benchmarks.http_load --save benchmarks/baselines/http_load.json
+    python -m benchmarks.http_load --compare benchmarks/baselines/http_load.json
+
+Boots `main:app` under uvicorn (unless `--url` points at a running server)
+against the Postgres and Redis configured in the environment. Stripe is
+replaced by `FakeStripeServer` and Gemini by `GEMINI_FAKE_LATENCY_MS`, so
+nothing leaves the machine; `--with-worker` also starts the outbox relay, a
+Celery worker and beat so sent messages are processed end to end.
+
+Every virtual user signs up, verifies its OTP and creates a chatroom (timed
+as the `signup`, `send_otp`, `verify_otp` and `create_chatroom` series), then
+loops over a weighted mix of `GET /chatroom`, `GET /chatroom/{id}` and
+`POST /chatroom/{id}/message` until the duration is up. Users are given the
+pro tier in the plan cache so the basic message limit does not turn the run
+into a 429 benchmark.
+
+`--compare` exits with status 1 when any series' p95 or throughput regressed
+by more than `--tolerance` against the saved baseline.
+"""
+
+import argparse
+import json
+import os
+import random
+import secrets
+import socket
+import subprocess
+import sys
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+from benchmarks.fakes.stripe_server import FakeStripeServer
+from benchmarks.stats import compare, print_table, save_baseline, summarize
+from src.utils.caching import PLAN_TIER_PREFIX, sync_redis
+
+MIX = {
+    "list_chatrooms": 45,
+    "get_chatroom": 35,
+    "send_message": 20,
+}
+PASSWORD = "BenchPass123"
+
+
+class Recorder:
+    def __init__(self):
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(int)
+        self.statuses = defaultdict(lambda: defaultdict(int))
+        self._lock = threading.Lock()
+
+    def timed(self, series: str, session: requests.Session, method: str, url: str, **kwargs):
+        started = time.perf_counter()
+        try:
+            response = session.request(method, url, timeout=30, **kwargs)
+            status = response.status_code
+        except requests.RequestException:
+            response, status = None, "exception"
+        elapsed = time.perf_counter() - started
+        with self._lock:
+            self.latencies[series].append(elapsed)
+            self.statuses[series][status] += 1
+            if response is None or response.status_code >= 400:
+                self.errors[series] += 1
+        return response
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def wait_until_up(url: str, timeout: float = 30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            requests.get(f"{url}/", timeout=1)
+            return
+        except requests.RequestException:
+            time.sleep(0.2)
+    raise RuntimeError(f"API did not come up at {url}")
+
+
+def start_processes(args, stripe_url: str):
+    env = {
+        **os.environ,
+        "STRIPE_API_BASE": stripe_url,
+        "STRIPE_SECRET_KEY": os.getenv("STRIPE_SECRET_KEY") or "sk_test_fake",
+        "GEMINI_FAKE_LATENCY_MS": str(args.gemini_latency_ms),
+    }
+    port = free_port()
+    processes = [
+        subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "main:app", "--port", str(port),
+             "--workers", str(args.workers), "--log-level", "warning"],
+            env=env,
+        )
+    ]
+    if args.with_worker:
+        processes.append(subprocess.Popen([sys.executable, "outbox_relay.py"], env=env))
+        processes.append(subprocess.Popen([sys.executable, "celery_worker.py"], env=env))
+        processes.append(subprocess.Popen([sys.executable, "celery_beat.py"], env=env))
+    return f"http://127.0.0.1:{port}", processes
+
+
+def onboard(base: str, recorder: Recorder):
+    """Signs a new user up and returns an authenticated session and chatroom id."""
+    session = requests.Session()
+    mobile = "9" + "".join(random.choices("0123456789", k=9))
+
+    signup = recorder.timed(
+        "signup", session, "POST", f"{base}/auth/signup",
+        json={"mobile_number": mobile, "password": PASSWORD, "full_name": "Bench"},
+    )
+    recorder.timed("send_otp", session, "POST", f"{base}/auth/send-otp", json={"mobile_number": mobile})
+    verify = recorder.timed(
+        "verify_otp", session, "POST", f"{base}/auth/verify-otp",
+        json={"mobile_number": mobile, "otp": "123456"},
+    )
+    if signup is None or verify is None or verify.status_code != 200:
+        return None, None
+
+    session.headers["Authorization"] = f"Bearer {verify.json()['data']['access_token']}"
+    uid = signup.json()["data"]["uid"]
+    sync_redis.set(f"{PLAN_TIER_PREFIX}{uid}", "pro", ex=3600)
+
+    recorder.timed(
+        "create_chatroom", session, "POST", f"{base}/chatroom/",
+        json={"name": f"bench-{secrets.token_hex(3)}"},
+    )
+    listed = session.get(f"{base}/chatroom/", timeout=30).json()["data"]
+    return session, listed[0]["chatroom_id"] if listed else None
+
+
+def virtual_user(base: str, recorder: Recorder, deadline: float):
+    session, chatroom_id = onboard(base, recorder)
+    if session is None or chatroom_id is None:
+        return
+
+    names, weights = zip(*MIX.items())
+    while time.monotonic() < deadline:
+        action = random.choices(names, weights)[0]
+        if action == "list_chatrooms":
+            recorder.timed(action, session, "GET", f"{base}/chatroom/")
+        elif action == "get_chatroom":
+            recorder.timed(action, session, "GET", f"{base}/chatroom/{chatroom_id}")
+        else:
+            recorder.timed(
+                action, session, "POST", f"{base}/chatroom/{chatroom_id}/message",
+                json={"text": f"benchmark message {secrets.token_hex(4)}"},
+            )
+
+
+def run(args) -> dict:
+    stripe = FakeStripeServer(latency_ms=args.stripe_latency_ms).start()
+    processes = []
+    if args.url:
+        base = args.url.rstrip("/")
+    else:
+        base, processes = start_processes(args, stripe.url)
+    try:
+        wait_until_up(base)
+        recorder = Recorder()
+        started = time.monotonic()
+        deadline = started + args.duration
+        with ThreadPoolExecutor(max_workers=args.users) as pool:
+            for _ in range(args.users):
+                pool.submit(virtual_user, base, recorder, deadline)
+        elapsed = time.monotonic() - started
+    finally:
+        for process in processes:
+            process.terminate()
+        for process in processes:
+            process.wait(timeout=30)
+        stripe.stop()
+
+    results = {
+        series: summarize(latencies, elapsed, recorder.errors[series])
+        for series, latencies in recorder.latencies.items()
+    }
+    for series, statuses in recorder.statuses.items():
+        results[series]["statuses"] = {str(k): v for k, v in statuses.items()}
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--url", help="Target a running server instead of booting one")
+    parser.add_argument("--users", type=int, default=20)
+    parser.add_argument("--duration", type=float, default=30, help="Seconds")
+    parser.add_argument("--workers", type=int, default=1, help="uvicorn workers")
+    parser.add_argument("--with-worker", action="store_true")
+    parser.add_argument("--gemini-latency-ms", type=float, default=800)
+    parser.add_argument("--stripe-latency-ms", type=float, default=150)
+    parser.add_argument("--save", metavar="PATH", help="Write results as a baseline")
+    parser.add_argument("--compare", metavar="PATH", help="Compare with a saved baseline")
+    parser.add_argument("--tolerance", type=float, default=0.1)
+    args = parser.parse_args()
+
+    results = run(args)
+    print_table(results)
+    if args.save:
+        save_baseline(args.save, results)
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare(json.load(f), results, args.tolerance)
+        for line in regressions:
+            print(f"REGRESSION {line}")
+        sys.exit(1 if regressions else 0)
@@ -0,0 +1,20 @@
+from src.core.limiter import user_key_func
+from src.decorators.jwt import decode_jwt_token, extract_token_from_request
+
+
+def bench_extract_token_from_request(benchmark, make_request):
+    request = make_request()
+    benchmark(extract_token_from_request, request)
+
+
+def bench_decode_jwt_token(benchmark, token):
+    payload = benchmark(decode_jwt_token, token)
+    assert payload["sub"]
+
+
+def bench_user_key_func_authenticated(benchmark, make_request):
+    benchmark(user_key_func, make_request(user=True))
+
+
+def bench_user_key_func_anonymous(benchmark, make_request):
+    benchmark(user_key_func, make_request())
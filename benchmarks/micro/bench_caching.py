@@ -0,0 +1,7 @@
+from src.utils.caching import generate_cache_key
+
+
+def bench_generate_cache_key(benchmark, make_request):
+    request = make_request("/chatroom/", b"limit=20&offset=0")
+    key = benchmark(generate_cache_key, request)
+    assert key.startswith("cache:")
@@ -0,0 +1,40 @@
+from sqlalchemy.dialects import postgresql
+
+from src.core.db_methods import DB
+from src.core.db_models import TableNameEnum
+
+db = DB()
+dialect = postgresql.dialect()
+
+
+def bench_get_attr_statement_user(benchmark):
+    benchmark(db.get_attr_statement, TableNameEnum.Users, uid="user-1")
+
+
+def bench_get_attr_statement_active_plan(benchmark):
+    benchmark(
+        db.get_attr_statement,
+        TableNameEnum.UserPlan,
+        uid="user-1",
+        where={"active": True},
+    )
+
+
+def bench_get_attr_statement_compiled(benchmark):
+    # Building plus compiling, as on a cache miss in SQLAlchemy's statement cache.
+    def build_and_compile():
+        return db.get_attr_statement(TableNameEnum.Users, uid="user-1").compile(
+            dialect=dialect
+        )
+
+    benchmark(build_and_compile)
+
+
+def bench_get_rows_statement_messages(benchmark):
+    benchmark(
+        db.get_rows_statement,
+        TableNameEnum.Messages,
+        chatroom_id="room-1",
+        limit="*",
+        order_by="asc",
+    )
@@ -0,0 +1,14 @@
+import pytest
+
+from src.middlewares.block_sensitive_path import is_sensitive_path
+
+PATHS = {
+    "allowed": "/chatroom/8ZkqFhv3RQ2nXcGm/message",
+    "blocked": "/.env",
+    "long": "/chatroom/" + "a" * 200,
+}
+
+
+@pytest.mark.parametrize("kind", PATHS)
+def bench_is_sensitive_path(benchmark, kind):
+    benchmark(is_sensitive_path, PATHS[kind])
@@ -0,0 +1,20 @@
+from src.utils.format_response import format_response
+
+CHATROOMS = [
+    {
+        "chatroom_id": f"room-{i}",
+        "name": f"Chatroom {i}",
+        "owner_id": "5f0c6a1e-8f5e-4a43-9d0c-2b1f6f3b9a10",
+        "created_at": 1735689600 + i,
+        "updated_at": None,
+    }
+    for i in range(20)
+]
+
+
+def bench_format_response_small(benchmark):
+    benchmark(format_response, message="OTP sent", data={"otp": "123456"})
+
+
+def bench_format_response_chatroom_list(benchmark):
+    benchmark(format_response, message="Chatrooms", data=CHATROOMS)
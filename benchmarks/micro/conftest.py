@@ -0,0 +1,37 @@
+from types import SimpleNamespace
+
+import pytest
+from starlette.requests import Request
+
+from src.api.authentication.services import create_jwt_token
+
+USER_ID = "5f0c6a1e-8f5e-4a43-9d0c-2b1f6f3b9a10"
+
+
+@pytest.fixture(scope="session")
+def token() -> str:
+    return create_jwt_token(data={"sub": USER_ID})
+
+
+@pytest.fixture
+def make_request(token):
+    """Builds a Starlette request like the ones the chatroom routes receive."""
+
+    def build(path: str = "/chatroom/", query: bytes = b"", user: bool = False) -> Request:
+        request = Request(
+            {
+                "type": "http",
+                "method": "GET",
+                "path": path,
+                "query_string": query,
+                "headers": [(b"authorization", f"Bearer {token}".encode())],
+                "client": ("127.0.0.1", 51000),
+                "server": ("testserver", 80),
+                "scheme": "http",
+            }
+        )
+        if user:
+            request.state.user = SimpleNamespace(uid=USER_ID)
+        return request
+
+    return build
@@ -0,0 +1,145 @@
+"""
+Chatroom history read through the ORM versus `DB.get_rows`.
+
+    python -m benchmarks.read_path --messages 10000 --runs 20
+    python -m benchmarks.read_path --save benchmarks/baselines/read_path.json
+
+Seeds one chatroom with `--messages` messages in the configured Postgres, then
+loads its history the way `get_chatroom_with_messages` did (SQLModel
+instances, then `model_dump()`) and the way it does now (column-only Core
+select into dicts). Both are rendered as the JSON response body, each run in
+a fresh session so the identity map starts empty. Reports per path the
+latency percentiles and, from a separate traced run, the peak Python memory
+per row. The seeded rows are deleted afterwards.
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import string
+import sys
+import time
+import tracemalloc
+
+from sqlalchemy import delete
+from sqlmodel import Session, select
+
+from benchmarks.stats import compare, print_table, save_baseline, summarize
+from src.core.db_methods import DB
+from src.core.db_models import Chatrooms, Messages, TableNameEnum, Users
+from src.core.db_pool import DataBasePool
+from src.utils.format_response import format_response
+
+db = DB()
+
+
+def seed(messages: int):
+    with Session(DataBasePool._engine) as session:
+        user = Users(mobile_number="7" + "".join(random.choices(string.digits, k=9)), confirmed=True)
+        chatroom = Chatrooms(owner_id=user.uid, name="bench")
+        session.add_all([user, chatroom])
+        session.flush()
+        now = int(time.time())
+        session.execute(
+            Messages.__table__.insert(),
+            [
+                {
+                    "mid": f"{chatroom.chatroom_id}-{i}",
+                    "chatroom_id": chatroom.chatroom_id,
+                    "sender_id": user.uid,
+                    "text": f"bench message {i} " + "lorem ipsum " * 8,
+                    "response": "echo " + "lorem ipsum " * 16,
+                    "status": "processed",
+                    "created_at": now + i,
+                }
+                for i in range(messages)
+            ],
+        )
+        session.commit()
+        return user.uid, chatroom.chatroom_id
+
+
+def cleanup(uid: str, chatroom_id: str):
+    with Session(DataBasePool._engine) as session:
+        session.execute(delete(Messages).where(Messages.chatroom_id == chatroom_id))
+        session.execute(delete(Chatrooms).where(Chatrooms.chatroom_id == chatroom_id))
+        session.execute(delete(Users).where(Users.uid == uid))
+        session.commit()
+
+
+def orm_path(chatroom_id: str) -> bytes:
+    with Session(DataBasePool._engine) as session:
+        messages = session.exec(
+            select(Messages)
+            .where(Messages.chatroom_id == chatroom_id)
+            .order_by(Messages.created_at)
+        ).all()
+        return format_response(data=[message.model_dump() for message in messages]).body
+
+
+def core_path(chatroom_id: str) -> bytes:
+    with Session(DataBasePool._engine) as session:
+        messages = asyncio.run(
+            db.get_rows(
+                dbClassName=TableNameEnum.Messages,
+                chatroom_id=chatroom_id,
+                limit="*",
+                order_by="asc",
+                db_pool=session,
+            )
+        )
+        return format_response(data=messages).body
+
+
+def peak_bytes(path, chatroom_id: str) -> int:
+    tracemalloc.start()
+    try:
+        path(chatroom_id)
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def run(args) -> dict:
+    DataBasePool.sync_setup()
+    uid, chatroom_id = seed(args.messages)
+    results = {}
+    try:
+        for name, path in (("orm", orm_path), ("core", core_path)):
+            path(chatroom_id)  # warm the statement cache and the pool
+            latencies = []
+            started = time.perf_counter()
+            for _ in range(args.runs):
+                begin = time.perf_counter()
+                path(chatroom_id)
+                latencies.append(time.perf_counter() - begin)
+            results[name] = summarize(latencies, time.perf_counter() - started)
+            results[name]["peak_bytes_per_row"] = peak_bytes(path, chatroom_id) // args.messages
+    finally:
+        cleanup(uid, chatroom_id)
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--messages", type=int, default=10000)
+    parser.add_argument("--runs", type=int, default=20)
+    parser.add_argument("--save", metavar="PATH")
+    parser.add_argument("--compare", metavar="PATH")
+    parser.add_argument("--tolerance", type=float, default=0.1)
+    args = parser.parse_args()
+
+    results = run(args)
+    print_table(results)
+    print(json.dumps({k: v["peak_bytes_per_row"] for k, v in results.items()}, indent=2))
+    if args.save:
+        save_baseline(args.save, results)
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare(json.load(f), results, args.tolerance)
+        for line in regressions:
+            print(f"REGRESSION {line}")
+        sys.exit(1 if regressions else 0)
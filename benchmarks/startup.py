@@ -0,0 +1,123 @@
+"""
+Cold import time of the web and worker entry points.
+
+    python -m benchmarks.startup --runs 10
+    python -m benchmarks.startup --save benchmarks/baselines/startup.json
+    python -m benchmarks.startup --compare benchmarks/baselines/startup.json
+
+Each run imports the module in a fresh interpreter, so nothing is cached
+in-process; the bytecode cache is warm after the first run, as on a machine
+that has booted the image once. Only the import itself is timed; the start-up
+of a bare interpreter is reported next to it for reference. Also lists which
+heavy SDKs ended up imported and the slowest top-level imports reported by
+`-X importtime`.
+"""
+
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+import time
+
+from benchmarks.stats import compare, percentile, save_baseline
+
+TARGETS = {
+    "main": "import main",
+    "celery_worker": "import celery_worker",
+}
+HEAVY_MODULES = ("google.generativeai", "stripe", "celery", "grpc")
+
+PROBE = """
+import json, sys, time
+started = time.perf_counter()
+{statement}
+elapsed = time.perf_counter() - started
+print(json.dumps({{"elapsed": elapsed, "loaded": [m for m in {heavy!r} if m in sys.modules]}}))
+"""
+
+
+def probe(statement: str) -> dict:
+    output = subprocess.run(
+        [sys.executable, "-c", PROBE.format(statement=statement, heavy=HEAVY_MODULES)],
+        capture_output=True,
+        text=True,
+        check=True,
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def interpreter_time(runs: int) -> float:
+    samples = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        subprocess.run([sys.executable, "-c", "pass"], check=True)
+        samples.append(time.perf_counter() - started)
+    return statistics.median(samples)
+
+
+def slowest_imports(statement: str, top: int):
+    """Top-level packages by cumulative import time, from `-X importtime`."""
+    stderr = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", statement],
+        capture_output=True,
+        text=True,
+        check=True,
+    ).stderr
+    totals = {}
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        cumulative = cumulative.strip()
+        # Nested imports are indented further than the single leading space.
+        if not cumulative.isdigit() or name.startswith("  "):
+            continue
+        package = name.strip().split(".")[0]
+        totals[package] = max(totals.get(package, 0), int(cumulative))
+    return sorted(totals.items(), key=lambda item: item[1], reverse=True)[:top]
+
+
+def run(args) -> dict:
+    base = interpreter_time(args.runs)
+    results = {}
+    for name, statement in TARGETS.items():
+        probe(statement)  # warm the bytecode cache
+        samples = [probe(statement) for _ in range(args.runs)]
+        import_times = [s["elapsed"] * 1000 for s in samples]
+        results[name] = {
+            "count": args.runs,
+            "errors": 0,
+            "p50_ms": round(statistics.median(import_times), 1),
+            "p95_ms": round(percentile(import_times, 95), 1),
+            "interpreter_ms": round(base * 1000, 1),
+            "heavy_modules": samples[-1]["loaded"],
+            "slowest_imports_ms": {
+                package: round(us / 1000, 1)
+                for package, us in slowest_imports(statement, args.top)
+            },
+        }
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument("--top", type=int, default=10)
+    parser.add_argument("--save", metavar="PATH")
+    parser.add_argument("--compare", metavar="PATH")
+    parser.add_argument("--tolerance", type=float, default=0.15)
+    args = parser.parse_args()
+
+    results = run(args)
+    print(json.dumps(results, indent=2))
+    if args.save:
+        save_baseline(args.save, results)
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare(json.load(f), results, args.tolerance)
+        for line in regressions:
+            print(f"REGRESSION {line}")
+        sys.exit(1 if regressions else 0)
@@ -0,0 +1,58 @@
+import json
+from typing import Dict, List
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    if not ordered:
+        return 0.0
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def summarize(latencies: List[float], elapsed: float, errors: int = 0) -> Dict[str, float]:
+    """Throughput and latency percentiles (ms) of one series of requests."""
+    return {
+        "count": len(latencies),
+        "errors": errors,
+        "rps": round(len(latencies) / elapsed, 2) if elapsed else 0.0,
+        "p50_ms": round(percentile(latencies, 50) * 1000, 2),
+        "p95_ms": round(percentile(latencies, 95) * 1000, 2),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 2),
+    }
+
+
+def save_baseline(path: str, results: Dict[str, dict]):
+    with open(path, "w") as f:
+        json.dump(results, f, indent=2, sort_keys=True)
+
+
+def compare(baseline: Dict[str, dict], results: Dict[str, dict], tolerance: float) -> List[str]:
+    """
+    Lists regressions of `results` against `baseline`.
+
+    A series regresses when its p95 grows, or its throughput drops, by more
+    than `tolerance` (0.1 = 10%), or when it has errors the baseline did not.
+    Metrics missing on either side are skipped.
+    """
+    regressions = []
+    for name, before in baseline.items():
+        after = results.get(name)
+        if after is None:
+            continue
+        if "p95_ms" in before and "p95_ms" in after and after["p95_ms"] > before["p95_ms"] * (1 + tolerance):
+            regressions.append(f"{name}: p95 {before['p95_ms']}ms -> {after['p95_ms']}ms")
+        if "rps" in before and "rps" in after and after["rps"] < before["rps"] * (1 - tolerance):
+            regressions.append(f"{name}: throughput {before['rps']}/s -> {after['rps']}/s")
+        if after.get("errors", 0) > before.get("errors", 0):
+            regressions.append(f"{name}: errors {before.get('errors', 0)} -> {after['errors']}")
+    return regressions
+
+
+def print_table(results: Dict[str, dict]):
+    print(f"{'series':<20}{'count':>8}{'err':>6}{'rps':>10}{'p50':>10}{'p95':>10}{'p99':>10}")
+    for name, r in sorted(results.items()):
+        print(
+            f"{name:<20}{r['count']:>8}{r['errors']:>6}{r['rps']:>10}"
+            f"{r['p50_ms']:>10}{r['p95_ms']:>10}{r['p99_ms']:>10}"
+        )
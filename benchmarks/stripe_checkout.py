@@ -0,0 +1,74 @@
+"""
+Checkout latency and event-loop blocking against the fake Stripe server.
+
+    python -m benchmarks.stripe_checkout --requests 200 --concurrency 20 --latency-ms 150
+
+Drives the checkout Stripe calls through `StripeGateway` and, in the same loop,
+a heartbeat task that records how late it wakes up. With the gateway the
+heartbeat lag should stay near zero regardless of Stripe latency.
+"""
+
+import argparse
+import asyncio
+import statistics
+import time
+
+from benchmarks.fakes.stripe_server import FakeStripeServer
+from benchmarks.stats import percentile
+from src.api.subscription.gateway import StripeGateway
+
+
+async def heartbeat(lags: list, stop: asyncio.Event, interval: float = 0.005):
+    loop = asyncio.get_running_loop()
+    while not stop.is_set():
+        expected = loop.time() + interval
+        await asyncio.sleep(interval)
+        lags.append(max(0.0, loop.time() - expected))
+
+
+async def checkout(gateway: StripeGateway, customer_id: str, price_id: str):
+    started = time.perf_counter()
+    await asyncio.gather(
+        gateway.create_checkout_session(
+            customer_id=customer_id,
+            price_id=price_id,
+            success_url="https://example.test/success",
+            cancel_url="https://example.test/cancel",
+        ),
+        gateway.get_price_amount(price_id),
+    )
+    return time.perf_counter() - started
+
+
+async def main(args):
+    server = FakeStripeServer(latency_ms=args.latency_ms).start()
+    gateway = StripeGateway(api_key="sk_test_fake", api_base=server.url)
+    customer_id = await gateway.create_customer("bench@example.test")
+
+    lags, stop = [], asyncio.Event()
+    beat = asyncio.create_task(heartbeat(lags, stop))
+    semaphore = asyncio.Semaphore(args.concurrency)
+
+    async def bounded():
+        async with semaphore:
+            return await checkout(gateway, customer_id, "price_bench")
+
+    started = time.perf_counter()
+    latencies = await asyncio.gather(*(bounded() for _ in range(args.requests)))
+    elapsed = time.perf_counter() - started
+    stop.set()
+    await beat
+    server.stop()
+
+    print(f"checkouts        : {args.requests} in {elapsed:.2f}s ({args.requests / elapsed:.1f}/s)")
+    print(f"latency p50/p95  : {percentile(latencies, 50) * 1000:.1f} / {percentile(latencies, 95) * 1000:.1f} ms")
+    print(f"loop lag max/avg : {max(lags) * 1000:.2f} / {statistics.mean(lags) * 1000:.2f} ms")
+    print(f"stripe calls     : {server.calls}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--latency-ms", type=float, default=150)
+    asyncio.run(main(parser.parse_args()))
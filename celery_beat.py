@@ -0,0 +1,6 @@
+from src.celery.config import celery_app
+
+# The scheduler runs as its own single process: built into every worker, each
+# replica would fire the periodic tasks once per tick.
+if __name__ == "__main__":
+    celery_app.start(["beat", "--loglevel=INFO"])
@@ -1,15 +1,27 @@
+import os
 import platform
+import tempfile
+
+# Prefork children each write their metrics to this directory and the exporter
+# in the parent aggregates them; it must be set before prometheus_client loads.
+os.environ.setdefault(
+    "PROMETHEUS_MULTIPROC_DIR", tempfile.mkdtemp(prefix="celery-metrics-")
+)
+
 from src.celery.config import celery_app
 from src.celery.service import *
+from src.core.variables import CELERY_CONCURRENCY, CELERY_POOL
 
 if __name__ == "__main__":
     system = platform.system()
     
-    pool = "prefork" if system != "Windows" else "solo"
+    pool = CELERY_POOL or ("prefork" if system != "Windows" else "solo")
+    concurrency = ["--concurrency", str(CELERY_CONCURRENCY)] if CELERY_CONCURRENCY else []
 
     celery_app.worker_main([
         "worker",
         "--loglevel=INFO",
         "--pool", pool,
+        *concurrency,
         "-Q", "default,send_gemini_message",
     ])
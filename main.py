@@ -1,3 +1,4 @@
+import os
 from fastapi import FastAPI
 from src.core.variables import origins, REDIS_URL
 from src.core.db_pool import DataBasePool
@@ -7,6 +8,10 @@ from fastapi.middleware.gzip import GZipMiddleware
 from scalar_fastapi import get_scalar_api_reference
 from src.middlewares.exceptions import ExceptionHandlingMiddleware
 from src.middlewares.block_sensitive_path import BlockSensitivePathsMiddleware
+from src.middlewares.metrics import MetricsMiddleware
+from src.middlewares.server_timing import ServerTimingMiddleware
+from src.core.metrics import mark_process_dead
+from src.core.loop_monitor import loop_monitor
 from src.api.authentication.views import router as auth_router
 from src.api.user.views import router as user_router
 from src.api.chatroom.views import router as chatroom_router
@@ -22,8 +27,11 @@ from slowapi import _rate_limit_exceeded_handler
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     await DataBasePool.setup()
+    await loop_monitor.start()
     yield
     await DataBasePool.teardown()
+    await loop_monitor.stop()
+    mark_process_dead(os.getpid())
 
 
 app = FastAPI(
@@ -47,6 +55,8 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+app.add_middleware(ServerTimingMiddleware)
+app.add_middleware(MetricsMiddleware)
 
 app.include_router(auth_router)
 app.include_router(user_router)
@@ -0,0 +1,56 @@
+import os
+from alembic import command
+from alembic.config import Config
+from sqlalchemy import create_engine, inspect
+from sqlalchemy.pool import NullPool
+from src.core.variables import DATABASE_DIRECT_URL
+
+BASELINE_REVISION = "0001"
+# Tables of the schema 0001 describes, and the ones `create_all` may have added
+# on top of it before migrations existed (0005 creates them when missing).
+BASELINE_TABLES = {
+    "users",
+    "userplan",
+    "transactions",
+    "password",
+    "userprofile",
+    "chatrooms",
+    "messages",
+}
+PRE_MIGRATION_TABLES = BASELINE_TABLES | {"outbox", "stripeevents"}
+
+
+class UnknownSchemaError(Exception):
+    pass
+
+
+def migrate():
+    """
+    Brings the database to the latest schema revision.
+
+    Databases created by `create_all` before migrations existed have the tables
+    but no `alembic_version`; they are stamped at the baseline first so only the
+    later revisions run. Stamping is refused unless the tables are the
+    baseline's, plus at most the later ones 0005 knows how to handle.
+    """
+    config = Config(os.path.join(os.path.dirname(os.path.abspath(__file__)), "alembic.ini"))
+
+    engine = create_engine(DATABASE_DIRECT_URL, poolclass=NullPool)
+    tables = set(inspect(engine).get_table_names())
+    engine.dispose()
+    if tables and "alembic_version" not in tables:
+        if not BASELINE_TABLES <= tables <= PRE_MIGRATION_TABLES:
+            raise UnknownSchemaError(
+                f"Unversioned schema does not match revision {BASELINE_REVISION}: "
+                f"missing {sorted(BASELINE_TABLES - tables)}, "
+                f"unexpected {sorted(tables - PRE_MIGRATION_TABLES)}. "
+                "Reconcile it by hand before stamping."
+            )
+        print(f"Existing schema without version, stamping {BASELINE_REVISION}")
+        command.stamp(config, BASELINE_REVISION)
+
+    command.upgrade(config, "head")
+
+
+if __name__ == "__main__":
+    migrate()
@@ -0,0 +1,20 @@
+"""Helpers shared by the revisions in `versions`."""
+
+from alembic import op
+import sqlalchemy as sa
+
+INVALID_INDEX_QUERY = sa.text(
+    "SELECT 1 FROM pg_index WHERE indexrelid = to_regclass(:name) AND NOT indisvalid"
+)
+
+
+def drop_invalid_index(name: str):
+    """
+    Drops index `name` if an earlier concurrent build left it invalid.
+
+    A failed `CREATE INDEX CONCURRENTLY` leaves an unusable index behind, which
+    `IF NOT EXISTS` would then skip on the rerun. Call it inside the
+    autocommit block, right before the concurrent create.
+    """
+    if op.get_bind().execute(INVALID_INDEX_QUERY, {"name": name}).first():
+        op.execute(f'DROP INDEX CONCURRENTLY IF EXISTS "{name}"')
@@ -0,0 +1,136 @@
+"""Initial schema
+
+The seven tables the app had before the outbox and Stripe event log, as
+`create_all` created them. Databases that predate migrations are stamped at
+this revision by `migrate.py` instead of running it; `outbox` and
+`stripeevents` come in 0005.
+
+Revision ID: 0001
+Revises:
+Create Date: 2025-08-01 00:00:00
+"""
+
+from alembic import op
+import sqlalchemy as sa
+import sqlmodel
+
+revision = "0001"
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "users",
+        sa.Column("uid", sqlmodel.AutoString(), nullable=False),
+        sa.Column("mobile_number", sqlmodel.AutoString(), nullable=False),
+        sa.Column("email", sqlmodel.AutoString(), nullable=True),
+        sa.Column("full_name", sqlmodel.AutoString(), nullable=True),
+        sa.Column("disabled", sa.Boolean(), nullable=False),
+        sa.Column("confirmed", sa.Boolean(), nullable=False),
+        sa.Column("stripe_customer_id", sqlmodel.AutoString(), nullable=True),
+        sa.Column("created_at", sa.Integer(), nullable=True),
+        sa.Column("updated_at", sa.Integer(), nullable=True),
+        sa.PrimaryKeyConstraint("uid"),
+    )
+    op.create_index("ix_users_uid", "users", ["uid"])
+    op.create_index("ix_users_mobile_number", "users", ["mobile_number"], unique=True)
+    op.create_index("ix_users_email", "users", ["email"], unique=True)
+
+    op.create_table(
+        "userplan",
+        sa.Column("plan_id", sqlmodel.AutoString(), nullable=False),
+        sa.Column("user_id", sqlmodel.AutoString(), nullable=False),
+        sa.Column("active", sa.Boolean(), nullable=False),
+        sa.Column("plan", sqlmodel.AutoString(), nullable=False),
+        sa.Column("created_at", sa.Integer(), nullable=True),
+        sa.ForeignKeyConstraint(["user_id"], ["users.uid"]),
+        sa.PrimaryKeyConstraint("plan_id"),
+    )
+    op.create_index("ix_userplan_plan_id", "userplan", ["plan_id"])
+    op.create_index("ix_userplan_user_id", "userplan", ["user_id"])
+
+    op.create_table(
+        "transactions",
+        sa.Column("transaction_id", sqlmodel.AutoString(), nullable=False),
+        sa.Column("user_id", sqlmodel.AutoString(), nullable=False),
+        sa.Column("plan_id", sqlmodel.AutoString(), nullable=True),
+        sa.Column("status", sqlmodel.AutoString(), nullable=False),
+        sa.Column("amount", sa.Integer(), nullable=False),
+        sa.Column("mode", sqlmodel.AutoString(), nullable=False),
+        sa.Column("created_at", sa.Integer(), nullable=True),
+        sa.Column("expires_at", sa.Integer(), nullable=True),
+        sa.ForeignKeyConstraint(["user_id"], ["users.uid"]),
+        sa.ForeignKeyConstraint(["plan_id"], ["userplan.plan_id"]),
+        sa.PrimaryKeyConstraint("transaction_id"),
+    )
+    op.create_index("ix_transactions_transaction_id", "transactions", ["transaction_id"])
+    op.create_index("ix_transactions_user_id", "transactions", ["user_id"])
+    op.create_index("ix_transactions_plan_id", "transactions", ["plan_id"])
+
+    op.create_table(
+        "password",
+        sa.Column("uid", sqlmodel.AutoString(), nullable=False),
+        sa.Column("password", sqlmodel.AutoString(), nullable=False),
+        sa.Column("updated_at", sa.Integer(), nullable=True),
+        sa.ForeignKeyConstraint(["uid"], ["users.uid"]),
+        sa.PrimaryKeyConstraint("uid"),
+    )
+    op.create_index("ix_password_uid", "password", ["uid"])
+
+    op.create_table(
+        "userprofile",
+        sa.Column("upid", sqlmodel.AutoString(), nullable=False),
+        sa.Column("user_id", sqlmodel.AutoString(), nullable=False),
+        sa.Column("bio", sqlmodel.AutoString(), nullable=True),
+        sa.Column("created_at", sa.Integer(), nullable=True),
+        sa.Column("updated_at", sa.Integer(), nullable=True),
+        sa.ForeignKeyConstraint(["user_id"], ["users.uid"]),
+        sa.PrimaryKeyConstraint("upid"),
+    )
+    op.create_index("ix_userprofile_upid", "userprofile", ["upid"])
+    op.create_index("ix_userprofile_user_id", "userprofile", ["user_id"])
+
+    op.create_table(
+        "chatrooms",
+        sa.Column("chatroom_id", sqlmodel.AutoString(), nullable=False),
+        sa.Column("owner_id", sqlmodel.AutoString(), nullable=False),
+        sa.Column("name", sqlmodel.AutoString(), nullable=True),
+        sa.Column("created_at", sa.Integer(), nullable=True),
+        sa.Column("updated_at", sa.Integer(), nullable=True),
+        sa.ForeignKeyConstraint(["owner_id"], ["users.uid"]),
+        sa.PrimaryKeyConstraint("chatroom_id"),
+    )
+    op.create_index("ix_chatrooms_chatroom_id", "chatrooms", ["chatroom_id"])
+    op.create_index("ix_chatrooms_owner_id", "chatrooms", ["owner_id"])
+
+    op.create_table(
+        "messages",
+        sa.Column("mid", sqlmodel.AutoString(), nullable=False),
+        sa.Column("chatroom_id", sqlmodel.AutoString(), nullable=False),
+        sa.Column("sender_id", sqlmodel.AutoString(), nullable=False),
+        sa.Column("text", sqlmodel.AutoString(), nullable=False),
+        sa.Column("response", sqlmodel.AutoString(), nullable=True),
+        sa.Column("status", sqlmodel.AutoString(), nullable=False),
+        sa.Column("created_at", sa.Integer(), nullable=True),
+        sa.Column("updated_at", sa.Integer(), nullable=True),
+        sa.ForeignKeyConstraint(["chatroom_id"], ["chatrooms.chatroom_id"]),
+        sa.ForeignKeyConstraint(["sender_id"], ["users.uid"]),
+        sa.PrimaryKeyConstraint("mid"),
+    )
+    op.create_index("ix_messages_mid", "messages", ["mid"])
+    op.create_index("ix_messages_sender_id", "messages", ["sender_id"])
+
+
+def downgrade():
+    for table in (
+        "messages",
+        "chatrooms",
+        "userprofile",
+        "password",
+        "transactions",
+        "userplan",
+        "users",
+    ):
+        op.drop_table(table)
@@ -0,0 +1,56 @@
+"""Indexes for the hot query patterns
+
+- messages by chatroom in creation order (chatroom detail)
+- chatrooms by owner in creation order (chatroom list)
+- a user's active plan (rate limiter, checkout)
+- users by Stripe customer (webhook processing)
+- lapsed transactions (plan expiry sweep)
+
+Built concurrently so writes keep flowing during a rolling deploy, and with
+IF NOT EXISTS for databases where `create_all` already added some of them.
+Invalid leftovers of a failed concurrent build are dropped first.
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2025-08-01 00:00:01
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+from migrations.helpers import drop_invalid_index
+
+revision = "0002"
+down_revision = "0001"
+branch_labels = None
+depends_on = None
+
+INDEXES = [
+    ("ix_messages_chatroom_id_created_at", "messages", ["chatroom_id", "created_at"], None),
+    ("ix_chatrooms_owner_id_created_at", "chatrooms", ["owner_id", "created_at"], None),
+    ("ix_userplan_user_id_active", "userplan", ["user_id"], "active"),
+    ("ix_users_stripe_customer_id", "users", ["stripe_customer_id"], None),
+    ("ix_transactions_status_expires_at", "transactions", ["status", "expires_at"], None),
+]
+
+
+def upgrade():
+    with op.get_context().autocommit_block():
+        for name, table, columns, where in INDEXES:
+            drop_invalid_index(name)
+            op.create_index(
+                name,
+                table,
+                columns,
+                if_not_exists=True,
+                postgresql_concurrently=True,
+                postgresql_where=sa.text(where) if where else None,
+            )
+
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        for name, table, _, _ in reversed(INDEXES):
+            op.drop_index(
+                name, table_name=table, if_exists=True, postgresql_concurrently=True
+            )
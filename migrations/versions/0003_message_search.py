@@ -0,0 +1,57 @@
+"""Full-text search over messages
+
+Adds `messages.search_vector`, a stored generated tsvector of the message text
+(weight A) and the Gemini response (weight B), and a GIN index on it. Adding a
+stored generated column rewrites the table, so run this outside peak hours on
+large databases; the index is then built concurrently.
+
+The column is left out of the `Messages` model so ORM reads never load it.
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2025-08-01 00:00:02
+"""
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects.postgresql import TSVECTOR
+
+from migrations.helpers import drop_invalid_index
+
+revision = "0003"
+down_revision = "0002"
+branch_labels = None
+depends_on = None
+
+SEARCH_VECTOR = (
+    "setweight(to_tsvector('english', coalesce(text, '')), 'A') || "
+    "setweight(to_tsvector('english', coalesce(response, '')), 'B')"
+)
+
+
+def upgrade():
+    op.add_column(
+        "messages",
+        sa.Column("search_vector", TSVECTOR(), sa.Computed(SEARCH_VECTOR, persisted=True)),
+    )
+    with op.get_context().autocommit_block():
+        drop_invalid_index("ix_messages_search_vector")
+        op.create_index(
+            "ix_messages_search_vector",
+            "messages",
+            ["search_vector"],
+            if_not_exists=True,
+            postgresql_using="gin",
+            postgresql_concurrently=True,
+        )
+
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        op.drop_index(
+            "ix_messages_search_vector",
+            table_name="messages",
+            if_exists=True,
+            postgresql_concurrently=True,
+        )
+    op.drop_column("messages", "search_vector")
@@ -0,0 +1,61 @@
+"""Delta sync of chatroom messages
+
+Messages used to get `updated_at` only on their first update, so new ones had
+none. Backfills it from `created_at` in batches and adds the
+`(chatroom_id, updated_at)` index behind `GET /chatroom/{id}/messages?since=`.
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2025-08-01 00:00:03
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+from migrations.helpers import drop_invalid_index
+
+revision = "0004"
+down_revision = "0003"
+branch_labels = None
+depends_on = None
+
+BACKFILL_BATCH = 10000
+
+
+def upgrade():
+    with op.get_context().autocommit_block():
+        connection = op.get_bind()
+        # Short batches keep row locks brief while the API keeps writing.
+        while True:
+            updated = connection.execute(
+                sa.text(
+                    """
+                    UPDATE messages SET updated_at = coalesce(created_at, 0)
+                    WHERE mid IN (
+                        SELECT mid FROM messages WHERE updated_at IS NULL LIMIT :batch
+                    )
+                    """
+                ),
+                {"batch": BACKFILL_BATCH},
+            ).rowcount
+            if updated == 0:
+                break
+
+        drop_invalid_index("ix_messages_chatroom_id_updated_at")
+        op.create_index(
+            "ix_messages_chatroom_id_updated_at",
+            "messages",
+            ["chatroom_id", "updated_at"],
+            if_not_exists=True,
+            postgresql_concurrently=True,
+        )
+
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        op.drop_index(
+            "ix_messages_chatroom_id_updated_at",
+            table_name="messages",
+            if_exists=True,
+            postgresql_concurrently=True,
+        )
@@ -0,0 +1,69 @@
+"""Outbox and Stripe event log
+
+`outbox` and `stripeevents` were added to the app after the baseline. Some
+databases stamped at 0001 already have them from `create_all`, others (and
+ones stamped by an older `migrate.py`) do not, so each table is only created
+when missing.
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2025-08-01 00:00:04
+"""
+
+from alembic import op
+import sqlalchemy as sa
+import sqlmodel
+
+revision = "0005"
+down_revision = "0004"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    tables = set(sa.inspect(op.get_bind()).get_table_names())
+
+    if "outbox" not in tables:
+        op.create_table(
+            "outbox",
+            sa.Column("id", sa.Integer(), nullable=False),
+            sa.Column("topic", sqlmodel.AutoString(), nullable=False),
+            sa.Column("payload", sa.JSON(), nullable=False),
+            sa.Column("status", sqlmodel.AutoString(), nullable=False),
+            sa.Column("created_at", sa.Integer(), nullable=True),
+            sa.Column("sent_at", sa.Integer(), nullable=True),
+            sa.PrimaryKeyConstraint("id"),
+        )
+    op.create_index(
+        "ix_outbox_pending",
+        "outbox",
+        ["id"],
+        if_not_exists=True,
+        postgresql_where=sa.text("status = 'pending'"),
+    )
+
+    if "stripeevents" not in tables:
+        op.create_table(
+            "stripeevents",
+            sa.Column("event_id", sqlmodel.AutoString(), nullable=False),
+            sa.Column("type", sqlmodel.AutoString(), nullable=False),
+            sa.Column("customer_id", sqlmodel.AutoString(), nullable=True),
+            sa.Column("payload", sa.JSON(), nullable=False),
+            sa.Column("status", sqlmodel.AutoString(), nullable=False),
+            sa.Column("created", sa.Integer(), nullable=False),
+            sa.Column("received_at", sa.Integer(), nullable=True),
+            sa.Column("processed_at", sa.Integer(), nullable=True),
+            sa.PrimaryKeyConstraint("event_id"),
+        )
+    op.create_index(
+        "ix_stripeevents_pending",
+        "stripeevents",
+        ["customer_id", "created"],
+        if_not_exists=True,
+        postgresql_where=sa.text("status = 'pending'"),
+    )
+
+
+def downgrade():
+    op.drop_table("stripeevents")
+    op.drop_table("outbox")
@@ -0,0 +1,32 @@
+"""Retry state for Stripe events
+
+A failing event now stays pending and is retried with backoff instead of being
+marked failed on the first error.
+
+Revision ID: 0006
+Revises: 0005
+Create Date: 2025-08-01 00:00:05
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0006"
+down_revision = "0005"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column(
+        "stripeevents",
+        sa.Column("attempts", sa.Integer(), nullable=False, server_default="0"),
+    )
+    op.add_column(
+        "stripeevents", sa.Column("next_attempt_at", sa.Integer(), nullable=True)
+    )
+
+
+def downgrade():
+    op.drop_column("stripeevents", "next_attempt_at")
+    op.drop_column("stripeevents", "attempts")
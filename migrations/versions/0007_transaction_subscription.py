@@ -0,0 +1,47 @@
+"""Stripe subscription of a transaction
+
+Renewal and cancellation events are matched to the transaction that granted
+the plan through the subscription ID.
+
+Revision ID: 0007
+Revises: 0006
+Create Date: 2025-08-01 00:00:06
+"""
+
+from alembic import op
+import sqlalchemy as sa
+import sqlmodel
+
+from migrations.helpers import drop_invalid_index
+
+revision = "0007"
+down_revision = "0006"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column(
+        "transactions",
+        sa.Column("stripe_subscription_id", sqlmodel.AutoString(), nullable=True),
+    )
+    with op.get_context().autocommit_block():
+        drop_invalid_index("ix_transactions_stripe_subscription_id")
+        op.create_index(
+            "ix_transactions_stripe_subscription_id",
+            "transactions",
+            ["stripe_subscription_id"],
+            if_not_exists=True,
+            postgresql_concurrently=True,
+        )
+
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        op.drop_index(
+            "ix_transactions_stripe_subscription_id",
+            table_name="transactions",
+            if_exists=True,
+            postgresql_concurrently=True,
+        )
+    op.drop_column("transactions", "stripe_subscription_id")
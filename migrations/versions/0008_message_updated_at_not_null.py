@@ -0,0 +1,89 @@
+"""Non-null `updated_at` on messages
+
+Processes from before 0004 keep inserting messages with a NULL `updated_at`
+until the rolling deploy replaces them, and delta sync never returns those
+rows. The column gets a server default, and a trigger fills in the NULLs that
+old processes send explicitly. The rows they wrote since 0004 are backfilled,
+then the column is made NOT NULL through a validated check constraint, so the
+table is never scanned under an exclusive lock.
+
+Revision ID: 0008
+Revises: 0007
+Create Date: 2025-08-01 00:00:07
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0008"
+down_revision = "0007"
+branch_labels = None
+depends_on = None
+
+BACKFILL_BATCH = 10000
+EPOCH_NOW = "CAST(extract(epoch FROM clock_timestamp()) AS integer)"
+
+
+def upgrade():
+    op.alter_column(
+        "messages", "updated_at", server_default=sa.text(EPOCH_NOW)
+    )
+    op.execute(
+        f"""
+        CREATE OR REPLACE FUNCTION messages_fill_updated_at() RETURNS trigger AS $$
+        BEGIN
+            NEW.updated_at := coalesce(NEW.updated_at, NEW.created_at, {EPOCH_NOW});
+            RETURN NEW;
+        END;
+        $$ LANGUAGE plpgsql
+        """
+    )
+    op.execute(
+        """
+        CREATE TRIGGER messages_fill_updated_at
+        BEFORE INSERT ON messages
+        FOR EACH ROW WHEN (NEW.updated_at IS NULL)
+        EXECUTE FUNCTION messages_fill_updated_at()
+        """
+    )
+
+    with op.get_context().autocommit_block():
+        connection = op.get_bind()
+        while True:
+            updated = connection.execute(
+                sa.text(
+                    """
+                    UPDATE messages SET updated_at = coalesce(created_at, 0)
+                    WHERE mid IN (
+                        SELECT mid FROM messages WHERE updated_at IS NULL LIMIT :batch
+                    )
+                    """
+                ),
+                {"batch": BACKFILL_BATCH},
+            ).rowcount
+            if updated == 0:
+                break
+
+        # NOT VALID skips the scan; VALIDATE scans without blocking writes, and
+        # SET NOT NULL then relies on the valid constraint instead of scanning.
+        connection.execute(
+            sa.text(
+                "ALTER TABLE messages ADD CONSTRAINT messages_updated_at_not_null "
+                "CHECK (updated_at IS NOT NULL) NOT VALID"
+            )
+        )
+        connection.execute(
+            sa.text("ALTER TABLE messages VALIDATE CONSTRAINT messages_updated_at_not_null")
+        )
+        connection.execute(
+            sa.text("ALTER TABLE messages ALTER COLUMN updated_at SET NOT NULL")
+        )
+        connection.execute(
+            sa.text("ALTER TABLE messages DROP CONSTRAINT messages_updated_at_not_null")
+        )
+
+
+def downgrade():
+    op.alter_column("messages", "updated_at", nullable=True, server_default=None)
+    op.execute("DROP TRIGGER IF EXISTS messages_fill_updated_at ON messages")
+    op.execute("DROP FUNCTION IF EXISTS messages_fill_updated_at()")
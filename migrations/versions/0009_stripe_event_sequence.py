@@ -0,0 +1,57 @@
+"""Receive order of Stripe events
+
+Stripe's `created` has one-second resolution, and events of the same second
+were applied in event ID order, which is random. `received_seq` numbers events
+as they are recorded and breaks those ties.
+
+Revision ID: 0009
+Revises: 0008
+Create Date: 2025-08-01 00:00:08
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0009"
+down_revision = "0008"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column(
+        "stripeevents",
+        sa.Column("received_seq", sa.BigInteger(), sa.Identity(), nullable=False),
+    )
+    with op.get_context().autocommit_block():
+        op.drop_index(
+            "ix_stripeevents_pending",
+            table_name="stripeevents",
+            if_exists=True,
+            postgresql_concurrently=True,
+        )
+        op.create_index(
+            "ix_stripeevents_pending",
+            "stripeevents",
+            ["customer_id", "created", "received_seq"],
+            postgresql_where=sa.text("status = 'pending'"),
+            postgresql_concurrently=True,
+        )
+
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        op.drop_index(
+            "ix_stripeevents_pending",
+            table_name="stripeevents",
+            if_exists=True,
+            postgresql_concurrently=True,
+        )
+        op.create_index(
+            "ix_stripeevents_pending",
+            "stripeevents",
+            ["customer_id", "created"],
+            postgresql_where=sa.text("status = 'pending'"),
+            postgresql_concurrently=True,
+        )
+    op.drop_column("stripeevents", "received_seq")
@@ -0,0 +1,64 @@
+"""Non-null `created_at` on messages
+
+The chatroom export pages on `(created_at, mid)`, and a NULL `created_at`
+makes that comparison NULL, which ended the export after the batch holding
+it. The app always sets `created_at`, so there is only a backfill, from
+`updated_at`, then a server default and NOT NULL through a validated check
+constraint, as in 0008.
+
+Revision ID: 0010
+Revises: 0009
+Create Date: 2025-08-01 00:00:09
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0010"
+down_revision = "0009"
+branch_labels = None
+depends_on = None
+
+BACKFILL_BATCH = 10000
+EPOCH_NOW = "CAST(extract(epoch FROM clock_timestamp()) AS integer)"
+
+
+def upgrade():
+    op.alter_column("messages", "created_at", server_default=sa.text(EPOCH_NOW))
+
+    with op.get_context().autocommit_block():
+        connection = op.get_bind()
+        while True:
+            updated = connection.execute(
+                sa.text(
+                    """
+                    UPDATE messages SET created_at = updated_at
+                    WHERE mid IN (
+                        SELECT mid FROM messages WHERE created_at IS NULL LIMIT :batch
+                    )
+                    """
+                ),
+                {"batch": BACKFILL_BATCH},
+            ).rowcount
+            if updated == 0:
+                break
+
+        connection.execute(
+            sa.text(
+                "ALTER TABLE messages ADD CONSTRAINT messages_created_at_not_null "
+                "CHECK (created_at IS NOT NULL) NOT VALID"
+            )
+        )
+        connection.execute(
+            sa.text("ALTER TABLE messages VALIDATE CONSTRAINT messages_created_at_not_null")
+        )
+        connection.execute(
+            sa.text("ALTER TABLE messages ALTER COLUMN created_at SET NOT NULL")
+        )
+        connection.execute(
+            sa.text("ALTER TABLE messages DROP CONSTRAINT messages_created_at_not_null")
+        )
+
+
+def downgrade():
+    op.alter_column("messages", "created_at", nullable=True, server_default=None)
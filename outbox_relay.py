@@ -0,0 +1,17 @@
+import asyncio
+import logging
+from sqlalchemy import create_engine
+from sqlalchemy.pool import NullPool
+from src.core.db_pool import DataBasePool
+from src.core.variables import DATABASE_DIRECT_URL
+from src.celery.outbox import OutboxRelay
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+
+    DataBasePool.sync_setup()
+    relay = OutboxRelay(
+        DataBasePool._engine,
+        listen_engine=create_engine(DATABASE_DIRECT_URL, poolclass=NullPool),
+    )
+    asyncio.run(relay.run_forever())
@@ -1,9 +1,104 @@
+import importlib.util
+import os
 import socket
-from src.core.variables import HOST, PORT
+import tempfile
+from src.core.variables import (
+    API_METRICS_PORT,
+    DB_MAX_CONNECTIONS,
+    DB_RESERVED_CONNECTIONS,
+    FORWARDED_ALLOW_IPS,
+    GRACEFUL_SHUTDOWN_TIMEOUT,
+    HOST,
+    KEEP_ALIVE_TIMEOUT,
+    PORT,
+    SERVER_BACKLOG,
+    SERVER_MODE,
+    WEB_CONCURRENCY,
+)
+
+
+def worker_count() -> int:
+    if WEB_CONCURRENCY > 0:
+        return WEB_CONCURRENCY
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+def pool_sizes(workers: int):
+    """
+    Splits the connection budget between web workers.
+
+    Each worker gets `(DB_MAX_CONNECTIONS - DB_RESERVED_CONNECTIONS) / workers`
+    connections, two thirds of them kept in the pool and the rest as overflow,
+    so every worker at full overflow still stays within the budget.
+    """
+    per_worker = max(2, (DB_MAX_CONNECTIONS - DB_RESERVED_CONNECTIONS) // workers)
+    pool_size = max(1, per_worker * 2 // 3)
+    return pool_size, per_worker - pool_size
+
+
+def available(module: str, fallback: str = "auto") -> str:
+    return module if importlib.util.find_spec(module) else fallback
+
+
+def start_metrics_exporter():
+    """
+    Serves /metrics on API_METRICS_PORT, away from the public API port.
+
+    It runs in the server process; in production that is the uvicorn parent,
+    which reads every worker's files from PROMETHEUS_MULTIPROC_DIR.
+    """
+    if not API_METRICS_PORT:
+        return
+    from src.core.metrics import start_exporter
+
+    start_exporter(API_METRICS_PORT)
+
+
+def run_production():
+    workers = worker_count()
+    pool_size, max_overflow = pool_sizes(workers)
+    # Workers are spawned processes and read their settings from the environment.
+    os.environ["DB_POOL_SIZE"] = str(pool_size)
+    os.environ["DB_MAX_OVERFLOW"] = str(max_overflow)
+    os.environ.setdefault(
+        "PROMETHEUS_MULTIPROC_DIR", tempfile.mkdtemp(prefix="web-metrics-")
+    )
+    print(
+        f"Production mode :: {workers} workers | "
+        f"DB pool {pool_size}+{max_overflow} per worker"
+    )
+    start_metrics_exporter()
+
+    import uvicorn
+
+    # uvicorn forwards SIGTERM to the workers, which stop accepting connections
+    # and finish in-flight requests for up to GRACEFUL_SHUTDOWN_TIMEOUT seconds.
+    uvicorn.run(
+        "main:app",
+        host=HOST,
+        port=PORT,
+        workers=workers,
+        loop=available("uvloop"),
+        http=available("httptools"),
+        backlog=SERVER_BACKLOG,
+        timeout_keep_alive=KEEP_ALIVE_TIMEOUT,
+        timeout_graceful_shutdown=GRACEFUL_SHUTDOWN_TIMEOUT,
+        proxy_headers=True,
+        forwarded_allow_ips=FORWARDED_ALLOW_IPS,
+        access_log=False,
+    )
+
 
 if __name__ == "__main__":
     HOSTNAME = socket.gethostname()
     print(f"SOCKET :: {HOSTNAME}\nHOST :: {HOST} | PORT :: {PORT}")
 
-    import uvicorn
-    uvicorn.run("main:app", host=HOST, port=PORT, reload=False, reload_delay=2)
+    if SERVER_MODE == "production":
+        run_production()
+    else:
+        import uvicorn
+        start_metrics_exporter()
+        uvicorn.run("main:app", host=HOST, port=PORT, reload=False, reload_delay=2)
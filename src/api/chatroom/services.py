@@ -1,14 +1,28 @@
-from typing import List
+import base64
+import binascii
+import csv
+import io
+import json
+import time
+from typing import Iterator, List, Optional, Set, Tuple
 from fastapi import HTTPException, status
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
 from src.core.db_models import Chatrooms, TableNameEnum
 from src.core.db_methods import DB
+from src.core.db_pool import DataBasePool
 from src.api.chatroom import schemas
-from src.celery import service
+from src.celery import outbox
+from src.core.tracing import tracer
+from src.core.variables import DELTA_SYNC_SAFETY_WINDOW
 from src.utils.format_response import format_response
 
 db = DB()
 
+EXPORT_MEDIA_TYPES = {"ndjson": "application/x-ndjson", "csv": "text/csv"}
+EXPORT_BATCH_SIZE = 1000
+SEARCH_MAX_LIMIT = 50
+
 
 async def create_chatroom(
     user_id: str, chatroom_create: schemas.ChatroomCreate, db_pool: Session
@@ -33,29 +47,33 @@ async def create_chatroom(
 
 async def list_chatrooms(user_id: str, db_pool: Session) -> List[schemas.Chatroom]:
     """Lists all chatrooms for a specific user."""
-    existing_chatrooms = await db.get_attr_all(
+    existing_chatrooms = await db.get_rows(
         dbClassName=TableNameEnum.Chatrooms, uid=user_id, db_pool=db_pool
     )
-    return format_response(
-        message="Chatrooms retrieved.",
-        data=[chatroom.model_dump() for chatroom in existing_chatrooms],
-    )
+    return format_response(message="Chatrooms retrieved.", data=existing_chatrooms)
 
 
-async def get_chatroom(chatroom_id: int, user_id: int, db_pool: Session) -> Chatrooms:
-    """Retrieves a specific chatroom, ensuring the user has access."""
-    existing_chatroom = await db.get_attr(
-        dbClassName=TableNameEnum.Chatrooms, chatroom_id=chatroom_id, db_pool=db_pool
-    )
-    if not existing_chatroom:
+def check_chatroom_access(owner_id: Optional[str], user_id: str) -> None:
+    """Raises 404 for a missing chatroom (no owner) and 403 for someone else's."""
+    if owner_id is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND, detail="Chatroom not found"
         )
-    if existing_chatroom.owner_id != user_id:
+    if owner_id != user_id:
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="Not authorized to access this chatroom",
         )
+
+
+async def get_chatroom(chatroom_id: int, user_id: int, db_pool: Session) -> Chatrooms:
+    """Retrieves a specific chatroom, ensuring the user has access."""
+    existing_chatroom = await db.get_attr(
+        dbClassName=TableNameEnum.Chatrooms, chatroom_id=chatroom_id, db_pool=db_pool
+    )
+    check_chatroom_access(
+        existing_chatroom.owner_id if existing_chatroom else None, user_id
+    )
     return existing_chatroom
 
 
@@ -63,29 +81,44 @@ async def send_message(
     chatroom_id: int, user_id: int, payload: schemas.MessageCreate, db_pool: Session
 ) -> None:
     """Sends a message to a chatroom and enqueues a Gemini API call."""
-    chatroom = await get_chatroom(
-        chatroom_id, user_id, db_pool
-    )  # Ensure user has access
+    # Root of the message's trace; the worker continues it from the task headers.
+    with tracer.start_span("chatroom.send_message", {"chatroom_id": chatroom_id}):
+        chatroom = await get_chatroom(
+            chatroom_id, user_id, db_pool
+        )  # Ensure user has access
 
-    created_message_record, ok = await db.insert(
-        dbClassName=TableNameEnum.Messages,
-        data={
-            "chatroom_id": chatroom.chatroom_id,
-            "sender_id": user_id,
-            **payload.model_dump(),
-        },
-        db_pool=db_pool,
-    )
-    if ok is False:
-        raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail="Failed to send message, please try again later.",
+        created_message_record, ok = await db.insert(
+            dbClassName=TableNameEnum.Messages,
+            data={
+                "chatroom_id": chatroom.chatroom_id,
+                "sender_id": user_id,
+                **payload.model_dump(),
+            },
+            db_pool=db_pool,
         )
-    service.enqueue_gemini_call(
-        message_id=created_message_record.mid,
-        message_text=payload.text,
-    )
-    db_pool.commit()
+        if ok is False:
+            raise HTTPException(
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                detail="Failed to send message, please try again later.",
+            )
+        # Staged in the same transaction as the message; the outbox relay hands it
+        # to the queue after commit.
+        ok = await outbox.stage(
+            topic="send_gemini_message",
+            payload={
+                "message_id": created_message_record.mid,
+                "message_text": payload.text,
+                "user_id": user_id,
+                "traceparent": tracer.current_traceparent(),
+            },
+            db_pool=db_pool,
+        )
+        if ok is False:
+            raise HTTPException(
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                detail="Failed to send message, please try again later.",
+            )
+        db_pool.commit()
     return format_response(
         message="Message sent and processing.",
         data=schemas.Message(**created_message_record.model_dump()).model_dump(),
@@ -93,48 +126,176 @@ async def send_message(
 
 
 async def get_chatroom_with_messages(chatroom_id: str, user_id: str, db_pool: Session):
-    """Fetches a chatroom and its messages if the user has access."""
-    chatroom = await get_chatroom(chatroom_id, user_id, db_pool)  # access check
+    """Fetches a chatroom and its messages, oldest first, if the user has access."""
+    chatrooms = await db.get_rows(
+        dbClassName=TableNameEnum.Chatrooms, chatroom_id=chatroom_id, db_pool=db_pool
+    )
+    check_chatroom_access(chatrooms[0]["owner_id"] if chatrooms else None, user_id)
 
+    messages = await db.get_rows(
+        dbClassName=TableNameEnum.Messages,
+        chatroom_id=chatroom_id,
+        limit="*",
+        order_by="asc",
+        db_pool=db_pool,
+    )
     return format_response(
         message="Chatroom and messages retrieved.",
-        data={
-            "chatroom": chatroom.model_dump(),
-            "messages": [message.model_dump() for message in chatroom.messages],
-        },
+        data={"chatroom": chatrooms[0], "messages": messages},
     )
 
 
-async def process_gemini_response(
-    message_id: str, response_text: str, db_pool: Session
+async def get_messages_since(
+    chatroom_id: str, user_id: str, since: int, db_pool: Session
 ):
-    """Processes the Gemini API response and stores it as a new message."""
-    existing_message = await db.get_attr(
-        dbClassName=TableNameEnum.Messages, mid=message_id, db_pool=db_pool
+    """
+    Messages of a chatroom created or updated at or after `since`, plus a new watermark.
+
+    The watermark is the newest `updated_at` returned, held back to
+    `DELTA_SYNC_SAFETY_WINDOW` seconds ago so rows committed late are not
+    skipped. Boundary rows can therefore come back on the next poll; clients
+    merge messages by `mid`.
+    """
+    chatrooms = await db.get_rows(
+        dbClassName=TableNameEnum.Chatrooms, chatroom_id=chatroom_id, db_pool=db_pool
+    )
+    check_chatroom_access(chatrooms[0]["owner_id"] if chatrooms else None, user_id)
+
+    messages = await db.get_rows(
+        dbClassName=TableNameEnum.Messages,
+        chatroom_id=chatroom_id,
+        updated_since=since,
+        limit="*",
+        order_by="asc",
+        sort_by="updated_at",
+        db_pool=db_pool,
     )
-    if existing_message is None:
+    watermark = since
+    if messages:
+        newest = messages[-1]["updated_at"] or since
+        watermark = max(since, min(newest, int(time.time()) - DELTA_SYNC_SAFETY_WINDOW))
+    return format_response(
+        message="Messages retrieved.",
+        data={"messages": messages, "watermark": watermark},
+    )
+
+
+def encode_search_cursor(rank: float, mid: str) -> str:
+    return base64.urlsafe_b64encode(json.dumps([rank, mid]).encode()).decode()
+
+
+def decode_search_cursor(cursor: str) -> Tuple[float, str]:
+    try:
+        rank, mid = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        return float(rank), str(mid)
+    except (ValueError, TypeError, binascii.Error):
         raise HTTPException(
-            detail="Message not found.",
-            status_code=status.HTTP_404_NOT_FOUND,
+            status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor"
         )
-    elif existing_message.status == "processed":
+
+
+async def search_messages(
+    user_id: str, query: str, limit: int, cursor: Optional[str], db_pool: Session
+):
+    """Searches the user's messages and responses across all their chatrooms."""
+    if not query.strip():
         raise HTTPException(
-            detail="Message already processed.",
-            status_code=status.HTTP_400_BAD_REQUEST,
+            status_code=status.HTTP_400_BAD_REQUEST, detail="Search query is empty"
         )
+    limit = max(1, min(limit, SEARCH_MAX_LIMIT))
+    hits = await db.search_messages(
+        uid=user_id,
+        query=query,
+        limit=limit,
+        after=decode_search_cursor(cursor) if cursor else None,
+        db_pool=db_pool,
+    )
+    next_cursor = (
+        encode_search_cursor(hits[-1]["rank"], hits[-1]["mid"])
+        if len(hits) == limit
+        else None
+    )
+    return format_response(
+        message="Search results retrieved.",
+        data={"results": hits, "next_cursor": next_cursor},
+    )
 
-    _, ok = await db.update(
-        dbClassName=TableNameEnum.Messages,
-        data={
-            **existing_message.model_dump(),
-            "response": response_text,
-            "status": "processed",
+
+def export_messages(
+    chatroom_id: str, export_format: str, use_replica: bool = False
+) -> Iterator[bytes]:
+    """
+    Encodes a chatroom's messages batch by batch, so memory stays flat.
+
+    Every batch is a keyset query on `(created_at, mid)` in a session that is
+    closed before the batch is sent. When the client disconnects, the
+    generator is dropped between batches with nothing left open.
+    """
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    after = None
+    header = export_format == "csv"
+    while True:
+        with DataBasePool.stream_session(use_replica) as session:
+            columns, rows = db.get_messages_after(
+                chatroom_id, after, batch_size=EXPORT_BATCH_SIZE, db_pool=session
+            )
+        if export_format == "csv":
+            if header:
+                writer.writerow(columns)
+                header = False
+            writer.writerows(rows)
+            if buffer.tell():  # the header alone for an empty chatroom
+                yield buffer.getvalue().encode()
+            buffer.seek(0)
+            buffer.truncate()
+        elif rows:
+            yield "".join(
+                json.dumps(dict(zip(columns, row))) + "\n" for row in rows
+            ).encode()
+        if len(rows) < EXPORT_BATCH_SIZE:
+            return
+        after = (rows[-1].created_at, rows[-1].mid)
+
+
+async def export_chatroom(
+    chatroom_id: str, user_id: str, export_format: str, db_pool: Session
+) -> StreamingResponse:
+    """Streams a chatroom's messages, oldest first, as NDJSON or CSV."""
+    chatrooms = await db.get_rows(
+        dbClassName=TableNameEnum.Chatrooms, chatroom_id=chatroom_id, db_pool=db_pool
+    )
+    check_chatroom_access(chatrooms[0]["owner_id"] if chatrooms else None, user_id)
+
+    # Rows are read after the handler returns, on a session of their own; the
+    # GZip middleware compresses each batch as it goes out.
+    return StreamingResponse(
+        export_messages(
+            chatroom_id, export_format, db_pool.info.get("use_replica", False)
+        ),
+        media_type=EXPORT_MEDIA_TYPES[export_format],
+        headers={
+            "Content-Disposition": f'attachment; filename="chatroom-{chatroom_id}.{export_format}"'
         },
-        db_pool=db_pool,
     )
-    if ok is False:
+
+
+async def process_gemini_responses(
+    responses: List[Tuple[str, str]], db_pool: Session
+) -> Set[str]:
+    """Stores a batch of Gemini API responses, skipping messages already processed."""
+    updated = await db.bulk_process_messages(responses, db_pool=db_pool)
+    db_pool.commit()
+    return updated
+
+
+async def process_gemini_response(
+    message_id: str, response_text: str, db_pool: Session
+):
+    """Processes the Gemini API response and stores it as a new message."""
+    updated = await process_gemini_responses([(message_id, response_text)], db_pool)
+    if message_id not in updated:
         raise HTTPException(
-            detail="Failed to process Gemini response, please try again later.",
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Message not found or already processed.",
+            status_code=status.HTTP_400_BAD_REQUEST,
         )
-    db_pool.commit()
@@ -1,4 +1,5 @@
-from fastapi import APIRouter, Depends, Request
+from typing import Literal, Optional
+from fastapi import APIRouter, Depends, Query, Request
 from sqlmodel import Session
 from src.api.chatroom import schemas, services
 from src.core.db_pool import DataBasePool
@@ -27,7 +28,7 @@ async def create_chatroom(
     "/",
     description="Lists all chatrooms for the authenticated user.",
 )
-@catch_async
+@catch_async(read_only=True)
 @cache_response(ttl=300)
 @authentication_required
 async def list_chatrooms(
@@ -37,11 +38,30 @@ async def list_chatrooms(
     return await services.list_chatrooms(request.state.user.uid, db_pool)
 
 
+# Declared before "/{id}" so "search" is not taken for a chatroom id.
+@router.get(
+    "/search",
+    description="Full-text search over the user's messages and Gemini responses in all their chatrooms.",
+)
+@catch_async(read_only=True)
+@authentication_required
+async def search_messages(
+    request: Request,
+    q: str,
+    limit: int = 20,
+    cursor: Optional[str] = None,
+    db_pool: Session = Depends(DataBasePool.get_pool),
+):
+    return await services.search_messages(
+        request.state.user.uid, q, limit, cursor, db_pool
+    )
+
+
 @router.get(
     "/{id}",
     description="Retrieves detailed information about a specific chatroom, including its messages.",
 )
-@catch_async
+@catch_async(read_only=True)
 @authentication_required
 async def get_chatroom(
     id: str,
@@ -51,6 +71,40 @@ async def get_chatroom(
     return await services.get_chatroom_with_messages(id, request.state.user.uid, db_pool)
 
 
+@router.get(
+    "/{id}/export",
+    description="Downloads a chatroom's full message history as NDJSON or CSV.",
+)
+@catch_async(read_only=True)
+@authentication_required
+async def export_chatroom(
+    id: str,
+    request: Request,
+    export_format: Literal["ndjson", "csv"] = Query("ndjson", alias="format"),
+    db_pool: Session = Depends(DataBasePool.get_pool),
+):
+    return await services.export_chatroom(
+        id, request.state.user.uid, export_format, db_pool
+    )
+
+
+@router.get(
+    "/{id}/messages",
+    description="Returns the chatroom's messages created or updated since the `since` watermark, and the next watermark.",
+)
+@catch_async(read_only=True)
+@authentication_required
+async def get_messages_since(
+    id: str,
+    request: Request,
+    since: int = Query(0, ge=0),
+    db_pool: Session = Depends(DataBasePool.get_pool),
+):
+    return await services.get_messages_since(
+        id, request.state.user.uid, since, db_pool
+    )
+
+
 @router.post("/{id}/message", description="Sends a message to a specific chatroom.")
 @catch_async
 @authentication_required
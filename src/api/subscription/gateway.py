@@ -0,0 +1,96 @@
+import threading
+from typing import TYPE_CHECKING, Optional
+from cachetools import TTLCache
+from fastapi.concurrency import run_in_threadpool
+
+from src.core.variables import (
+    STRIPE_API_BASE,
+    STRIPE_PRICE_CACHE_TTL,
+    STRIPE_SECRET_KEY,
+)
+
+if TYPE_CHECKING:
+    import stripe
+
+
+class StripeGateway:
+    """
+    Thin async wrapper over the Stripe calls made during checkout.
+
+    Every call runs in the threadpool so the event loop never waits on Stripe,
+    and goes through one `StripeClient` whose requests session keeps
+    connections alive per thread. Price metadata barely changes, so it is
+    cached for `price_ttl` seconds instead of fetched on every checkout.
+
+    `api_base` points the client at another host, e.g. a local stand-in for
+    Stripe when benchmarking. The Stripe SDK itself is only imported when the
+    first call is made.
+    """
+
+    def __init__(
+        self,
+        api_key: str = STRIPE_SECRET_KEY,
+        api_base: Optional[str] = STRIPE_API_BASE,
+        price_ttl: int = STRIPE_PRICE_CACHE_TTL,
+    ):
+        self.api_key = api_key
+        self.api_base = api_base
+        self._prices = TTLCache(maxsize=64, ttl=price_ttl)
+        self._lock = threading.Lock()
+        self._client = None
+
+    @property
+    def client(self) -> "stripe.StripeClient":
+        if self._client is None:
+            with self._lock:
+                if self._client is None:
+                    import stripe
+
+                    self._client = stripe.StripeClient(
+                        self.api_key,
+                        base_addresses={"api": self.api_base} if self.api_base else {},
+                        http_client=stripe.RequestsClient(),
+                    )
+        return self._client
+
+    async def create_customer(self, email: Optional[str]) -> str:
+        customer = await run_in_threadpool(
+            self.client.customers.create, params={"email": email}
+        )
+        return customer.id
+
+    async def create_checkout_session(
+        self,
+        customer_id: str,
+        price_id: str,
+        success_url: str,
+        cancel_url: str,
+    ) -> "stripe.checkout.Session":
+        return await run_in_threadpool(
+            self.client.checkout.sessions.create,
+            params={
+                "customer": customer_id,
+                "payment_method_types": ["card"],
+                "line_items": [{"price": price_id, "quantity": 1}],
+                "mode": "subscription",
+                "success_url": success_url,
+                "cancel_url": cancel_url,
+            },
+        )
+
+    async def retrieve_subscription(self, subscription_id: str) -> "stripe.Subscription":
+        return await run_in_threadpool(
+            self.client.subscriptions.retrieve, subscription_id
+        )
+
+    async def get_price_amount(self, price_id: str) -> int:
+        """Unit amount of a price in the smallest currency unit, cached with a TTL."""
+        amount = self._prices.get(price_id)
+        if amount is None:
+            price = await run_in_threadpool(self.client.prices.retrieve, price_id)
+            amount = price.unit_amount
+            self._prices[price_id] = amount
+        return amount
+
+
+gateway = StripeGateway()
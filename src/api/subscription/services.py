@@ -1,20 +1,22 @@
-import stripe
+import asyncio
+import time
 from fastapi import HTTPException, status
 from sqlalchemy.orm import Session
 from src.core.db_models import TableNameEnum
 
 from src.core.db_methods import DB
 from src.api.subscription import schemas
+from src.api.subscription.gateway import gateway
 from src.core.variables import (
-    STRIPE_SECRET_KEY,
+    PLAN_EXPIRY_BATCH_SIZE,
     STRIPE_PRO_PRICE_ID,
     STRIPE_SUCCESS_URL,
     STRIPE_CANCEL_URL,
 )
+from src.utils.caching import invalidate_plan_tiers
 from src.utils.format_response import format_response
 
 
-stripe.api_key = STRIPE_SECRET_KEY
 db = DB()
 
 
@@ -29,14 +31,15 @@ async def initiate_stripe_checkout(user_id: int, db_pool: Session):
                 status_code=status.HTTP_404_NOT_FOUND, detail="User not found"
             )
 
-        # Creating a stripe customer if one doesn't exist
+        # Creating a stripe customer if one doesn't exist. A stored id is used
+        # as is, without a round trip to Stripe to re-fetch the customer.
         if not user.stripe_customer_id:
-            customer = stripe.Customer.create(email=user.email)
+            customer_id = await gateway.create_customer(user.email)
             _, ok = await db.update(
                 dbClassName=TableNameEnum.Users,
                 data={
                     **user.model_dump(),
-                    "stripe_customer_id": customer.id,
+                    "stripe_customer_id": customer_id,
                 },
                 db_pool=db_pool,
             )
@@ -45,22 +48,16 @@ async def initiate_stripe_checkout(user_id: int, db_pool: Session):
                     detail="Failed to update user",
                     status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
                 )
-            user.stripe_customer_id = customer.id
-        else:
-            customer = stripe.Customer.retrieve(user.stripe_customer_id)
+            user.stripe_customer_id = customer_id
 
-        checkout_session = stripe.checkout.Session.create(
-            customer=customer.id,
-            payment_method_types=["card"],
-            line_items=[
-                {
-                    "price": STRIPE_PRO_PRICE_ID,
-                    "quantity": 1,
-                }
-            ],
-            mode="subscription",
-            success_url=STRIPE_SUCCESS_URL,
-            cancel_url=STRIPE_CANCEL_URL,
+        checkout_session, unit_amount = await asyncio.gather(
+            gateway.create_checkout_session(
+                customer_id=user.stripe_customer_id,
+                price_id=STRIPE_PRO_PRICE_ID,
+                success_url=STRIPE_SUCCESS_URL,
+                cancel_url=STRIPE_CANCEL_URL,
+            ),
+            gateway.get_price_amount(STRIPE_PRO_PRICE_ID),
         )
 
         _, ok = await db.insert(
@@ -69,9 +66,7 @@ async def initiate_stripe_checkout(user_id: int, db_pool: Session):
                 "transaction_id": checkout_session.id,
                 "user_id": user.uid,
                 "status": "pending",
-                "amount": int(
-                    stripe.Price.retrieve(STRIPE_PRO_PRICE_ID).unit_amount / 100
-                ),
+                "amount": int(unit_amount / 100),
                 "mode": "subscription",
             },
             db_pool=db_pool,
@@ -112,3 +107,19 @@ async def get_subscription_status(user_id: str, db_pool: Session):
         message="Subscription status retrieved",
         data=schemas.SubscriptionStatus(**user_plan.model_dump()).model_dump(),
     )
+
+
+async def expire_lapsed_plans(
+    db_pool: Session, batch_size: int = PLAN_EXPIRY_BATCH_SIZE
+) -> int:
+    """Moves users whose Pro subscription lapsed back to the basic plan, batch by batch."""
+    now = int(time.time())
+    total = 0
+    while True:
+        ended, user_ids = await db.expire_plans(
+            now, batch_size, db_pool=db_pool, commit=True
+        )
+        invalidate_plan_tiers(user_ids)
+        total += ended
+        if ended < batch_size:
+            return total
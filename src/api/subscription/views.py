@@ -24,7 +24,7 @@ async def subscribe_pro(
     "/status",
     description="Checks the user's current subscription tier (Basic or Pro).",
 )
-@catch_async
+@catch_async(read_only=True)
 @authentication_required
 async def get_subscription_status(
     request: Request, db_pool: Session = Depends(DataBasePool.get_pool)
@@ -13,7 +13,7 @@ router = APIRouter(prefix="/user", tags=["User"])
     "/me",
     description="Returns details of the currently logged in user",
 )
-@catch_async
+@catch_async(read_only=True)
 @authentication_required
 async def me(
     request: Request, db_pool: Session = Depends(DataBasePool.get_pool)
@@ -1,5 +1,11 @@
 from celery import Celery
-from src.core.variables import REDIS_URL
+from src.core.variables import (
+    REDIS_URL,
+    CELERY_MAX_TASKS_PER_CHILD,
+    FAIR_QUEUE_DISPATCH_INTERVAL,
+    PLAN_EXPIRY_SWEEP_INTERVAL,
+    STRIPE_EVENT_RETRY_INTERVAL,
+)
 
 celery_app = Celery(
     "gemini_backend_message_tasks",
@@ -11,6 +17,25 @@ celery_app = Celery(
 celery_app.conf.update(
     task_routes={
         "send_gemini_message": {"queue": "send_gemini_message"},
+        "dispatch_fair_queue": {"queue": "default"},
+        "process_stripe_events": {"queue": "default"},
+        "retry_stripe_events": {"queue": "default"},
+        "expire_plans": {"queue": "default"},
+    },
+    task_default_queue="default",
+    beat_schedule={
+        "dispatch-fair-queue": {
+            "task": "dispatch_fair_queue",
+            "schedule": FAIR_QUEUE_DISPATCH_INTERVAL,
+        },
+        "retry-stripe-events": {
+            "task": "retry_stripe_events",
+            "schedule": STRIPE_EVENT_RETRY_INTERVAL,
+        },
+        "expire-plans": {
+            "task": "expire_plans",
+            "schedule": PLAN_EXPIRY_SWEEP_INTERVAL,
+        },
     },
     task_serializer="json",
     accept_content=["json"],
@@ -21,7 +46,7 @@ celery_app.conf.update(
     task_reject_on_worker_lost=True,  # Reject tasks if worker disconnects
     task_track_started=True,
     task_send_sent_event=True,
-    worker_max_tasks_per_child=1000,  # after 1000 tasks worker will restart
+    worker_max_tasks_per_child=CELERY_MAX_TASKS_PER_CHILD,  # recycle children after N tasks
     broker_connection_retry_on_startup=True,
     worker_log_format="[%(asctime)s: %(levelname)s/%(processName)s] %(message)s",
     worker_task_log_format="[%(asctime)s: %(levelname)s/%(processName)s] [%(task_name)s] %(message)s",
@@ -0,0 +1,253 @@
+import json
+import logging
+import time
+from typing import List, Optional
+from redis import Redis
+
+from src.core.tracing import tracer
+from src.core.variables import (
+    REDIS_URL,
+    FAIR_QUEUE_DISPATCH_WINDOW,
+    FAIR_QUEUE_MAX_INFLIGHT,
+    FAIR_QUEUE_USER_MAX_INFLIGHT,
+    FAIR_QUEUE_INFLIGHT_TTL,
+)
+
+logger = logging.getLogger(__name__)
+
+# The hash tag keeps every fair queue key in one Redis Cluster slot, which the
+# multi-key scripts below need.
+KEY_PREFIX = "{fairq}:"
+RING_KEY = f"{KEY_PREFIX}ring"
+MEMBERS_KEY = f"{KEY_PREFIX}members"
+LEASES_KEY = f"{KEY_PREFIX}leases"
+
+redis_client = Redis.from_url(REDIS_URL, decode_responses=True)
+
+
+def queue_key(user_id: str) -> str:
+    return f"{KEY_PREFIX}queue:{user_id}"
+
+
+def leases_key(user_id: str) -> str:
+    return f"{KEY_PREFIX}leases:{user_id}"
+
+
+# Adds a job to the user's queue (tail for new jobs, head for requeues) and
+# puts the user on the ring if they are not already waiting on it.
+_ENQUEUE_SCRIPT = """
+local ring, members, queue = KEYS[1], KEYS[2], KEYS[3]
+if ARGV[3] == 'head' then
+    redis.call('LPUSH', queue, ARGV[2])
+else
+    redis.call('RPUSH', queue, ARGV[2])
+end
+if redis.call('SADD', members, ARGV[1]) == 1 then
+    redis.call('RPUSH', ring, ARGV[1])
+end
+return 1
+"""
+
+# Looks at the users at the head of the ring (the window read just before the
+# call) and hands out the first job whose owner is under the per-user cap. Each
+# user looked at is rotated to the tail with LMOVE, so the next call starts with
+# whoever comes after them; a window of capped users ends the call. Candidate j
+# (ARGV[3 + j]) has its queue and lease keys at KEYS[2j + 2] and KEYS[2j + 3].
+#
+# In-flight work is held as leases: sorted sets of message ID -> deadline, one
+# per user and one for the fleet. Expired leases are pruned before counting, so
+# a release lost to a killed worker frees its slot once the deadline passes.
+_DISPATCH_SCRIPT = """
+local ring, members, total = KEYS[1], KEYS[2], KEYS[3]
+local user_cap = tonumber(ARGV[1])
+local global_cap = tonumber(ARGV[2])
+local ttl = tonumber(ARGV[3])
+local now = tonumber(redis.call('TIME')[1])
+
+redis.call('ZREMRANGEBYSCORE', total, '-inf', now)
+if redis.call('ZCARD', total) >= global_cap then
+    return nil
+end
+
+for i = 4, #ARGV do
+    local uid = ARGV[i]
+    local queue = KEYS[2 * (i - 3) + 2]
+    local leases = KEYS[2 * (i - 3) + 3]
+    if redis.call('LINDEX', ring, 0) ~= uid then
+        -- Another dispatcher moved the ring since it was read.
+        return 'stale'
+    end
+    if redis.call('LLEN', queue) == 0 then
+        redis.call('LPOP', ring)
+        redis.call('SREM', members, uid)
+    else
+        redis.call('ZREMRANGEBYSCORE', leases, '-inf', now)
+        if redis.call('ZCARD', leases) < user_cap then
+            local job = redis.call('LPOP', queue)
+            local lease = cjson.decode(job)['message_id']
+            redis.call('ZADD', leases, now + ttl, lease)
+            redis.call('EXPIRE', leases, ttl)
+            redis.call('ZADD', total, now + ttl, lease)
+            if redis.call('LLEN', queue) == 0 then
+                redis.call('LPOP', ring)
+                redis.call('SREM', members, uid)
+            else
+                redis.call('LMOVE', ring, ring, 'LEFT', 'RIGHT')
+            end
+            return {uid, job}
+        end
+        redis.call('LMOVE', ring, ring, 'LEFT', 'RIGHT')
+    end
+end
+return nil
+"""
+
+# Releasing is idempotent: a release after the lease expired removes nothing.
+_RELEASE_SCRIPT = """
+redis.call('ZREM', KEYS[1], ARGV[1])
+redis.call('ZREM', KEYS[2], ARGV[1])
+return 1
+"""
+
+_enqueue = redis_client.register_script(_ENQUEUE_SCRIPT)
+_dispatch = redis_client.register_script(_DISPATCH_SCRIPT)
+_release = redis_client.register_script(_RELEASE_SCRIPT)
+
+
+class FairQueue:
+    """
+    Round-robin scheduler that sits in front of the `send_gemini_message` queue.
+
+    Jobs are parked in per-user Redis lists and only handed to Celery while the
+    owner holds fewer than `user_cap` leases and the whole fleet fewer than
+    `global_cap`. A lease lasts until the call is released or `inflight_ttl`
+    seconds pass. Keeping the Celery queue shallow is what bounds the wait for
+    light users: a burst from one user stays in that user's list instead of
+    sitting ahead of everyone else in the broker.
+    """
+
+    def __init__(
+        self,
+        user_cap: int = FAIR_QUEUE_USER_MAX_INFLIGHT,
+        global_cap: int = FAIR_QUEUE_MAX_INFLIGHT,
+        inflight_ttl: int = FAIR_QUEUE_INFLIGHT_TTL,
+        window: int = FAIR_QUEUE_DISPATCH_WINDOW,
+    ):
+        self.user_cap = user_cap
+        self.global_cap = global_cap
+        self.inflight_ttl = inflight_ttl
+        self.window = window
+
+    def enqueue(
+        self,
+        user_id: str,
+        message_id: str,
+        message_text: str,
+        traceparent: Optional[str] = None,
+    ):
+        """Parks a Gemini job in the user's queue and tries to dispatch it."""
+        self.enqueue_many(
+            [
+                {
+                    "user_id": user_id,
+                    "message_id": message_id,
+                    "message_text": message_text,
+                    "traceparent": traceparent,
+                }
+            ]
+        )
+
+    def enqueue_many(self, jobs: List[dict]):
+        """Parks a batch of `{message_id, message_text, user_id}` jobs in one round trip."""
+        with tracer.start_span("redis.fair_queue.enqueue", {"jobs": len(jobs)}):
+            pipe = redis_client.pipeline(transaction=False)
+            now = time.time()
+            for job in jobs:
+                raw_job = json.dumps(
+                    {
+                        "message_id": job["message_id"],
+                        "message_text": job["message_text"],
+                        "traceparent": job.get("traceparent"),
+                        "enqueued_at": now,
+                    }
+                )
+                _enqueue(
+                    keys=[RING_KEY, MEMBERS_KEY, queue_key(job["user_id"])],
+                    args=[job["user_id"], raw_job, "tail"],
+                    client=pipe,
+                )
+            pipe.execute()
+        self.dispatch()
+
+    def dispatch(self, limit: Optional[int] = None) -> int:
+        """
+        Moves jobs from the user queues to Celery until a cap is hit.
+
+        Returns:
+            int: Number of jobs handed to Celery.
+        """
+        from src.celery.service import send_gemini_message
+
+        dispatched = 0
+        while limit is None or dispatched < limit:
+            # Keys touched by the script must be declared up front, so the head
+            # of the ring is read first; only a small window, so a pass stays
+            # cheap however many users are waiting.
+            candidates = redis_client.lrange(RING_KEY, 0, self.window - 1)
+            if not candidates:
+                break
+            keys = [RING_KEY, MEMBERS_KEY, LEASES_KEY]
+            for candidate in candidates:
+                keys += [queue_key(candidate), leases_key(candidate)]
+            popped = _dispatch(
+                keys=keys,
+                args=[self.user_cap, self.global_cap, self.inflight_ttl, *candidates],
+            )
+            if popped == "stale":
+                continue
+            if not popped:
+                break
+
+            user_id, raw_job = popped
+            job = json.loads(raw_job)
+            try:
+                send_gemini_message.apply_async(
+                    kwargs={
+                        "message_id": job["message_id"],
+                        "message_text": job["message_text"],
+                        "user_id": user_id,
+                    },
+                    headers={
+                        "traceparent": job.get("traceparent"),
+                        "enqueued_at": job.get("enqueued_at"),
+                    },
+                )
+            except Exception:
+                # Put the job back at the head of the user's queue so it is not lost.
+                logger.exception("Failed to hand fair queue job to Celery")
+                _enqueue(
+                    keys=[RING_KEY, MEMBERS_KEY, queue_key(user_id)],
+                    args=[user_id, raw_job, "head"],
+                )
+                self.release(user_id, job["message_id"])
+                break
+            dispatched += 1
+
+        return dispatched
+
+    def release(self, user_id: str, message_id: str):
+        """Frees the lease held by a finished Gemini call."""
+        _release(keys=[leases_key(user_id), LEASES_KEY], args=[message_id])
+
+    def depth(self) -> int:
+        """Number of jobs still waiting in user queues."""
+        members = redis_client.smembers(MEMBERS_KEY)
+        if not members:
+            return 0
+        pipe = redis_client.pipeline(transaction=False)
+        for user_id in members:
+            pipe.llen(queue_key(user_id))
+        return sum(pipe.execute())
+
+
+fair_queue = FairQueue()
@@ -0,0 +1,177 @@
+import logging
+import select
+import time
+from collections import defaultdict
+from typing import Callable, Dict, List
+from sqlmodel import Session
+
+from src.core.db_methods import DB
+from src.core.db_models import TableNameEnum
+from src.core.tracing import tracer
+from src.core.variables import (
+    OUTBOX_BATCH_SIZE,
+    OUTBOX_POLL_INTERVAL,
+    OUTBOX_RETENTION,
+)
+
+logger = logging.getLogger(__name__)
+
+OUTBOX_CHANNEL = "outbox"
+
+db = DB()
+
+
+async def stage(topic: str, payload: dict, db_pool: Session):
+    """
+    Records a task in the outbox as part of the caller's transaction.
+
+    Nothing is published here; the relay picks the row up once the transaction
+    commits, so a task can never run ahead of the rows it depends on.
+    """
+    _, ok = await db.insert(
+        dbClassName=TableNameEnum.Outbox,
+        data={"topic": topic, "payload": {**payload, "staged_at": time.time()}},
+        db_pool=db_pool,
+    )
+    if ok is False:
+        return False
+    await db.notify(OUTBOX_CHANNEL, db_pool=db_pool)
+    return True
+
+
+def publish_gemini_messages(payloads: List[dict]):
+    from src.celery.fair_queue import fair_queue
+
+    now = time.time()
+    for payload in payloads:
+        if payload.get("traceparent") and payload.get("staged_at"):
+            tracer.record_span(
+                "outbox.wait",
+                payload["staged_at"],
+                now,
+                traceparent=payload["traceparent"],
+            )
+    fair_queue.enqueue_many(payloads)
+
+
+def publish_stripe_events(payloads: List[dict]):
+    from src.celery.config import celery_app
+
+    # One task per customer is enough: it drains every pending event for them.
+    for customer_id in {payload.get("customer_id") for payload in payloads}:
+        celery_app.send_task(
+            "process_stripe_events", kwargs={"customer_id": customer_id}
+        )
+
+
+PUBLISHERS: Dict[str, Callable[[List[dict]], None]] = {
+    "send_gemini_message": publish_gemini_messages,
+    "process_stripe_events": publish_stripe_events,
+}
+
+
+class OutboxRelay:
+    """
+    Publishes committed outbox rows to the queue and marks them sent.
+
+    LISTEN is session state, so behind a transaction pooler `listen_engine`
+    must connect to Postgres directly; batches can go through either.
+    """
+
+    def __init__(
+        self,
+        engine,
+        batch_size: int = OUTBOX_BATCH_SIZE,
+        poll_interval: float = OUTBOX_POLL_INTERVAL,
+        retention: int = OUTBOX_RETENTION,
+        listen_engine=None,
+    ):
+        self.engine = engine
+        self.listen_engine = listen_engine or engine
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self.retention = retention
+        self._last_purge = 0.0
+
+    async def relay_batch(self) -> int:
+        """
+        Publishes one batch of pending rows.
+
+        Rows are marked sent in the same transaction that locked them. If
+        publishing fails the transaction rolls back and the rows are retried, so
+        delivery is at-least-once; consumers skip work that is already done.
+        Rows of a topic without a publisher are marked failed instead; they are
+        kept and can be set back to pending once a publisher exists.
+        """
+        with Session(self.engine) as session:
+            rows = await db.claim_outbox(self.batch_size, db_pool=session)
+            if not rows:
+                session.rollback()
+                return 0
+
+            by_topic = defaultdict(list)
+            for row in rows:
+                by_topic[row.topic].append(row)
+
+            sent, unroutable = [], []
+            for topic, topic_rows in by_topic.items():
+                publisher = PUBLISHERS.get(topic)
+                if publisher is None:
+                    logger.error(
+                        f"No outbox publisher for topic '{topic}', "
+                        f"marking {len(topic_rows)} rows failed"
+                    )
+                    unroutable.extend(row.id for row in topic_rows)
+                    continue
+                publisher([row.payload for row in topic_rows])
+                sent.extend(row.id for row in topic_rows)
+
+            await db.mark_outbox_sent(sent, sent_at=int(time.time()), db_pool=session)
+            await db.mark_outbox_failed(unroutable, db_pool=session)
+            session.commit()
+            return len(rows)
+
+    async def purge(self):
+        if time.monotonic() - self._last_purge < 3600:
+            return
+        self._last_purge = time.monotonic()
+        with Session(self.engine) as session:
+            await db.purge_outbox(
+                int(time.time()) - self.retention, db_pool=session, commit=True
+            )
+
+    def _listen(self):
+        connection = self.listen_engine.raw_connection()
+        connection.dbapi_connection.autocommit = True
+        connection.cursor().execute(f"LISTEN {OUTBOX_CHANNEL}")
+        return connection
+
+    def _wait(self, listener):
+        dbapi_connection = listener.dbapi_connection
+        ready, _, _ = select.select([dbapi_connection], [], [], self.poll_interval)
+        if ready:
+            dbapi_connection.poll()
+            dbapi_connection.notifies.clear()
+
+    async def run_forever(self):
+        listener = self._listen()
+        logger.info("Outbox relay started")
+        while True:
+            try:
+                sent = await self.relay_batch()
+                await self.purge()
+            except Exception:
+                logger.exception("Outbox relay batch failed")
+                sent = 0
+                time.sleep(self.poll_interval)
+
+            # A full batch means there is probably more waiting; skip the wait.
+            if sent >= self.batch_size:
+                continue
+            try:
+                self._wait(listener)
+            except Exception:
+                logger.exception("Lost outbox LISTEN connection, reconnecting")
+                listener.invalidate()
+                time.sleep(self.poll_interval)
+                listener = self._listen()
@@ -0,0 +1,134 @@
+import asyncio
+import logging
+import os
+import threading
+import time
+from concurrent.futures import Future
+from typing import Awaitable, Callable, Dict, List, Set, Tuple
+
+from src.celery.runtime import get_event_loop
+from src.core.tracing import tracer
+from src.core.variables import RESULT_SINK_MAX_BATCH, RESULT_SINK_MAX_DELAY_MS
+
+logger = logging.getLogger(__name__)
+
+FlushFn = Callable[[List[Tuple[str, str]]], Awaitable[Set[str]]]
+
+
+class ResultSink:
+    """
+    Buffers finished Gemini responses and writes them in batches.
+
+    Tasks `submit` their result and block on the returned future, so the task
+    only returns (and, with `task_acks_late`, only gets acked) once the batch it
+    belongs to has been committed.
+
+    A batch is flushed when it reaches `max_batch` or when its oldest entry is
+    `max_delay_ms` old. Batches only grow when several tasks share the process
+    (threads or gevent pools); a prefork child runs one task at a time, so the
+    worker writes its results directly instead (see `store_result`).
+    """
+
+    def __init__(
+        self,
+        flush: FlushFn,
+        max_batch: int = RESULT_SINK_MAX_BATCH,
+        max_delay_ms: int = RESULT_SINK_MAX_DELAY_MS,
+        flush_retries: int = 2,
+    ):
+        self._flush = flush
+        self.max_batch = max(1, max_batch)
+        self.max_delay = max_delay_ms / 1000
+        self.flush_retries = flush_retries
+
+        self._cond = threading.Condition()
+        self._buffer: Dict[str, Tuple[str, Future]] = {}
+        self._first_at = 0.0
+        self._pid = None
+        self._thread = None
+
+    def submit(self, message_id: str, response_text: str) -> Future:
+        """Queues a response for the next flush. The future resolves to True if the row was updated."""
+        self._ensure_started()
+        future = Future()
+        # Remember the caller's span so the batched write shows up in its trace.
+        future.span = tracer.current_span()
+        with self._cond:
+            if not self._buffer:
+                self._first_at = time.monotonic()
+            previous = self._buffer.get(message_id)
+            if previous is not None:
+                # Redelivered task for a message still in the buffer: the first one wins.
+                previous[1].add_done_callback(
+                    lambda f: future.set_result(False)
+                    if f.exception() is None
+                    else future.set_exception(f.exception())
+                )
+                return future
+            self._buffer[message_id] = (response_text, future)
+            self._cond.notify()
+        return future
+
+    def _ensure_started(self):
+        # Threads do not survive fork, so each worker child starts its own flusher.
+        pid = os.getpid()
+        if self._pid == pid and self._thread is not None:
+            return
+        with self._cond:
+            if self._pid == pid and self._thread is not None:
+                return
+            self._pid = pid
+            self._buffer = {}
+            self._thread = threading.Thread(
+                target=self._run, name="gemini-result-sink", daemon=True
+            )
+            self._thread.start()
+
+    def _should_flush(self) -> bool:
+        pending = len(self._buffer)
+        return (
+            pending >= self.max_batch
+            or time.monotonic() - self._first_at >= self.max_delay
+        )
+
+    def _run(self):
+        loop = get_event_loop()
+        while True:
+            with self._cond:
+                while not self._buffer:
+                    self._cond.wait()
+                while not self._should_flush():
+                    remaining = self._first_at + self.max_delay - time.monotonic()
+                    self._cond.wait(max(remaining, 0.001))
+                batch, self._buffer = self._buffer, {}
+            self._write(loop, batch)
+
+    def _write(self, loop: asyncio.AbstractEventLoop, batch: Dict[str, Tuple[str, Future]]):
+        rows = [(mid, response) for mid, (response, _) in batch.items()]
+        for attempt in range(self.flush_retries + 1):
+            started = time.time()
+            try:
+                updated = loop.run_until_complete(self._flush(rows))
+                break
+            except Exception as e:
+                logger.exception(
+                    f"Result sink flush of {len(rows)} rows failed (attempt {attempt + 1})"
+                )
+                error = e
+                time.sleep(0.1 * (attempt + 1))
+        else:
+            for _, future in batch.values():
+                future.set_exception(error)
+            return
+
+        finished = time.time()
+        for mid, (_, future) in batch.items():
+            if future.span is not None:
+                tracer.record_span(
+                    "db.process_gemini_responses",
+                    started,
+                    finished,
+                    parent=future.span,
+                    attributes={"batch_size": len(rows), "updated": mid in updated},
+                )
+            future.set_result(mid in updated)
@@ -0,0 +1,26 @@
+import asyncio
+import threading
+from typing import Any, Coroutine, TypeVar
+
+T = TypeVar("T")
+
+_local = threading.local()
+
+
+def get_event_loop() -> asyncio.AbstractEventLoop:
+    """Returns this thread's long-lived event loop, creating it on first use."""
+    loop = getattr(_local, "loop", None)
+    if loop is None or loop.is_closed():
+        loop = asyncio.new_event_loop()
+        _local.loop = loop
+    return loop
+
+
+def run_async(coro: Coroutine[Any, Any, T]) -> T:
+    """
+    Runs a coroutine to completion on the thread's persistent loop.
+
+    Replaces `asyncio.run` in tasks, which builds and tears down a new loop for
+    every call.
+    """
+    return get_event_loop().run_until_complete(coro)
@@ -1,19 +1,177 @@
-import asyncio
+import time
+from typing import List, Set, Tuple
+from celery.exceptions import Retry
+from celery.signals import (
+    task_postrun,
+    task_prerun,
+    worker_init,
+    worker_process_init,
+    worker_process_shutdown,
+)
 from src.api.chatroom import services
+from src.api.subscription import services as subscription_services
 from src.core.db_pool import DataBasePool
 from src.celery.config import celery_app
+from src.celery.fair_queue import fair_queue, redis_client
+from src.celery.result_sink import ResultSink
+from src.celery.runtime import get_event_loop, run_async
+from src.core.metrics import (
+    CELERY_TASK_DURATION,
+    QueueDepthCollector,
+    mark_process_dead,
+    start_exporter,
+)
+from src.core.tracing import tracer
+from src.core.variables import CELERY_POOL, WORKER_METRICS_PORT
 from src.utils.gemini import call_gemini_api
+from src.webhook import services as webhook_services
 
-db = DataBasePool()
-db.sync_setup()
-db_pool = db.get_pool()
+RESULT_WAIT_TIMEOUT = 60
+RETRY_COUNTDOWN = 5
 
 
-@celery_app.task(name="send_gemini_message")
-def send_gemini_message(message_id: str, message_text: str):
-    gemini_response = call_gemini_api(message_text)
-    asyncio.run(services.process_gemini_response(message_id, gemini_response, db_pool))
+@worker_init.connect
+def check_schema(**kwargs):
+    # The parent only checks the schema version; it never serves tasks, so its
+    # engine is dropped before children are forked.
+    DataBasePool.sync_setup()
+    DataBasePool.dispose()
+    if WORKER_METRICS_PORT:
+        start_exporter(
+            WORKER_METRICS_PORT,
+            QueueDepthCollector(
+                redis_client, ["default", "send_gemini_message"], fair_queue
+            ),
+        )
 
 
-def enqueue_gemini_call(message_id: str, message_text: str):
-    send_gemini_message.delay(message_id, message_text)
+@worker_process_init.connect
+def init_worker_process(**kwargs):
+    DataBasePool.worker_setup()
+    get_event_loop()
+
+
+@worker_process_shutdown.connect
+def shutdown_worker_process(pid: int = None, **kwargs):
+    mark_process_dead(pid)
+
+
+async def write_gemini_results(responses: List[Tuple[str, str]]) -> Set[str]:
+    with DataBasePool.session_scope() as session:
+        return await services.process_gemini_responses(responses, session)
+
+
+# Several tasks per process share one sink; a prefork or solo child would only
+# ever put its own single row in a batch.
+result_sink = (
+    ResultSink(flush=write_gemini_results)
+    if CELERY_POOL in ("threads", "gevent", "eventlet")
+    else None
+)
+
+
+def store_result(message_id: str, response_text: str) -> bool:
+    """Stores a Gemini response, through the result sink when the pool has one."""
+    if result_sink is None:
+        with tracer.start_span("db.process_gemini_responses", {"batch_size": 1}):
+            return message_id in run_async(
+                write_gemini_results([(message_id, response_text)])
+            )
+    # Block until the batch holding this result is committed so the late ack
+    # still means "stored".
+    with tracer.start_span("result_sink.wait"):
+        return result_sink.submit(message_id, response_text).result(
+            timeout=RESULT_WAIT_TIMEOUT
+        )
+
+
+def task_header(request, name: str):
+    """Reads a custom message header from a task request."""
+    value = getattr(request, name, None)
+    if value is None:
+        value = (getattr(request, "headers", None) or {}).get(name)
+    return value
+
+
+@celery_app.task(name="send_gemini_message", bind=True, max_retries=3)
+def send_gemini_message(
+    self, message_id: str, message_text: str, user_id: str = None
+):
+    traceparent = task_header(self.request, "traceparent")
+    enqueued_at = task_header(self.request, "enqueued_at")
+    if enqueued_at:
+        tracer.record_span(
+            "celery.queue_wait", enqueued_at, time.time(), traceparent=traceparent
+        )
+
+    retrying = False
+    try:
+        with tracer.start_span(
+            "celery.send_gemini_message",
+            {"message_id": message_id},
+            traceparent=traceparent,
+        ):
+            gemini_response = call_gemini_api(message_text)
+            try:
+                store_result(message_id, gemini_response)
+            except Exception as exc:
+                raise self.retry(
+                    exc=exc,
+                    countdown=RETRY_COUNTDOWN,
+                    kwargs=self.request.kwargs,
+                    headers={
+                        "traceparent": traceparent,
+                        "enqueued_at": time.time() + RETRY_COUNTDOWN,
+                    },
+                )
+    except Retry:
+        # The retry inherits this run's lease and releases it when done.
+        retrying = True
+        raise
+    finally:
+        if user_id and not retrying:
+            # Free the user's slot and pull the next job in round-robin order.
+            fair_queue.release(user_id, message_id)
+            fair_queue.dispatch()
+
+
+@celery_app.task(name="dispatch_fair_queue")
+def dispatch_fair_queue():
+    """Periodic safety net for jobs left parked after a missed release."""
+    return fair_queue.dispatch()
+
+
+@celery_app.task(name="process_stripe_events")
+def process_stripe_events(customer_id: str = None):
+    with DataBasePool.session_scope() as session:
+        return run_async(webhook_services.process_pending_events(customer_id, session))
+
+
+@celery_app.task(name="retry_stripe_events")
+def retry_stripe_events():
+    """Re-runs customers whose failed Stripe events are due for another attempt."""
+    with DataBasePool.session_scope() as session:
+        customers = run_async(webhook_services.retry_due_events(session))
+    for customer_id in customers:
+        process_stripe_events.delay(customer_id=customer_id)
+    return len(customers)
+
+
+@celery_app.task(name="expire_plans")
+def expire_plans():
+    with DataBasePool.session_scope() as session:
+        return run_async(subscription_services.expire_lapsed_plans(session))
+
+
+@task_prerun.connect
+def start_task_timer(task=None, **kwargs):
+    task.request._started_at = time.perf_counter()
+
+
+@task_postrun.connect
+def record_task_duration(task=None, state=None, **kwargs):
+    started_at = getattr(task.request, "_started_at", None)
+    if started_at is not None:
+        CELERY_TASK_DURATION.labels(task=task.name, state=state or "UNKNOWN").observe(
+            time.perf_counter() - started_at
+        )
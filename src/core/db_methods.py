@@ -1,23 +1,48 @@
+import html
 import logging
+import time
 import traceback
 from fastapi import HTTPException, status
+from src.core.db_pool import db_call
 from src.core.db_models import (
     Chatrooms,
     Messages,
+    Outbox,
     Password,
+    StripeEvents,
     TableNameEnum,
     Transactions,
     UserPlan,
     UserProfile,
     Users,
 )
-from typing import Any, Dict, List, Optional, Tuple, TypeVar, Union
+from typing import Any, Dict, List, Optional, Set, Tuple, TypeVar, Union
 from sqlmodel import SQLModel, Session, and_, or_, select
+from sqlalchemy import (
+    REAL,
+    Integer,
+    String,
+    cast,
+    column,
+    delete,
+    func,
+    literal_column,
+    text,
+    true,
+    tuple_,
+    update,
+    values,
+)
+from sqlalchemy.dialects.postgresql import insert as pg_insert
 from sqlalchemy.exc import IntegrityError
 
 T = TypeVar("T", bound=SQLModel)
 logger = logging.getLogger(__name__)
 
+# Placeholders for the search highlight tags, see `DB.search_messages`.
+HIGHLIGHT_START = "\x02"
+HIGHLIGHT_STOP = "\x03"
+
 
 class DB:
     def __init__(self):
@@ -76,6 +101,7 @@ class DB:
 
         return merged_objects[0] if len(merged_objects) == 1 else merged_objects
 
+    @db_call()
     async def insert(
         self,
         dbClassName: TableNameEnum,
@@ -117,6 +143,8 @@ class DB:
                 data = Transactions(**data)
             elif dbClassName == TableNameEnum.UserPlan:
                 data = UserPlan(**data)
+            elif dbClassName == TableNameEnum.Outbox:
+                data = Outbox(**data)
             else:
                 return None, False
 
@@ -143,6 +171,7 @@ class DB:
                 detail="Something went wrong",
             )
 
+    @db_call()
     async def update(
         self,
         dbClassName: TableNameEnum,
@@ -210,6 +239,7 @@ class DB:
                 detail="Something went wrong",
             )
 
+    @db_call()
     async def get_attr_all(
         self,
         dbClassName: TableNameEnum,
@@ -238,10 +268,208 @@ class DB:
 
         except Exception as e:
             if isinstance(db_pool, Session):
+                if db_pool.in_nested_transaction():
+                    # The savepoint's owner rolls back to it; a session-wide
+                    # rollback would also drop the outer transaction and its locks.
+                    raise
                 db_pool.rollback()
                 traceback.print_exc()
             return None
 
+    def get_rows_statement(
+        self,
+        dbClassName: TableNameEnum,
+        uid: str = None,
+        chatroom_id: str = None,
+        updated_since: Optional[int] = None,
+        limit: Optional[int | str] = 1,
+        offset: Optional[int] = 0,
+        order_by: Optional[str] = "desc",
+        sort_by: str = "created_at",
+    ):
+        """Builds the column-only SELECT used by `get_rows`, or None for an unsupported table."""
+        statement = None
+
+        if dbClassName == TableNameEnum.Chatrooms:
+            table = Chatrooms.__table__
+            statement = select(
+                table.c.chatroom_id,
+                table.c.name,
+                table.c.owner_id,
+                table.c.created_at,
+                table.c.updated_at,
+            )
+            if uid:
+                statement = statement.where(table.c.owner_id == uid)
+            if chatroom_id:
+                statement = statement.where(table.c.chatroom_id == chatroom_id)
+
+        if dbClassName == TableNameEnum.Messages:
+            table = Messages.__table__
+            statement = select(
+                table.c.mid,
+                table.c.chatroom_id,
+                table.c.sender_id,
+                table.c.text,
+                table.c.response,
+                table.c.status,
+                table.c.created_at,
+                table.c.updated_at,
+            )
+            if uid:
+                statement = statement.where(table.c.sender_id == uid)
+            if chatroom_id:
+                statement = statement.where(table.c.chatroom_id == chatroom_id)
+            if updated_since is not None:
+                statement = statement.where(table.c.updated_at >= updated_since)
+
+        if statement is None:
+            return None
+        if order_by == "asc":
+            statement = statement.order_by(table.c[sort_by].asc())
+        else:
+            statement = statement.order_by(table.c[sort_by].desc())
+        return statement.limit(limit if limit != "*" else None).offset(offset)
+
+    @db_call()
+    async def get_rows(
+        self,
+        dbClassName: TableNameEnum,
+        uid: str = None,
+        chatroom_id: str = None,
+        updated_since: Optional[int] = None,
+        limit: Optional[int | str] = 1,
+        offset: Optional[int] = 0,
+        order_by: Optional[str] = "desc",
+        sort_by: str = "created_at",
+        db_pool: Session = None,
+    ) -> Optional[List[Dict[str, Any]]]:
+        """
+        Read rows as plain dicts, for responses that only serialise them.
+
+        Selects the columns of the response schema through SQLAlchemy Core, so
+        no model instances are built, validated or added to the identity map.
+        Filters, `limit` and `order_by` work as in `get_attr_all`; rows are sorted
+        on `sort_by` (`created_at` by default). `updated_since` keeps messages
+        with `updated_at` at or after it.
+
+        Returns:
+            :Optional[List[Dict[str, Any]]]: One dict per row, or None for an unsupported table.
+        """
+
+        statement = self.get_rows_statement(
+            dbClassName,
+            uid=uid,
+            chatroom_id=chatroom_id,
+            updated_since=updated_since,
+            limit=limit,
+            offset=offset,
+            order_by=order_by,
+            sort_by=sort_by,
+        )
+        if statement is None:
+            return None
+        result = db_pool.execute(statement)
+        keys = tuple(result.keys())
+        return [dict(zip(keys, row)) for row in result]
+
+    def get_messages_after(
+        self,
+        chatroom_id: str,
+        after: Optional[Tuple[int, str]] = None,
+        batch_size: int = 1000,
+        db_pool: Session = None,
+    ) -> Tuple[Tuple[str, ...], List[tuple]]:
+        """
+        Read the next batch of a chatroom's messages, oldest first.
+
+        Takes the same columns as `get_rows` and pages on `(created_at, mid)`:
+        pass the last row's pair as `after` to get the following batch. Each
+        call is a single short query, so no transaction has to stay open
+        between batches. Returns the column names and up to `batch_size` rows.
+        """
+
+        table = Messages.__table__
+        statement = (
+            self.get_rows_statement(
+                TableNameEnum.Messages, chatroom_id=chatroom_id, limit=batch_size
+            )
+            .order_by(None)
+            .order_by(table.c.created_at.asc(), table.c.mid.asc())
+        )
+        if after is not None:
+            statement = statement.where(
+                tuple_(table.c.created_at, table.c.mid) > tuple_(*after)
+            )
+        result = db_pool.execute(statement)
+        return tuple(result.keys()), result.all()
+
+    def get_attr_statement(
+        self,
+        dbClassName: TableNameEnum,
+        mobile_number: str = None,
+        uid: str = None,
+        mid: str = None,
+        customer_id: str = None,
+        chatroom_id: str = None,
+        transaction_id: str = None,
+        plan_id: str = None,
+        where: Optional[Dict[str, Any]] = None,
+    ):
+        """Builds the SELECT used by `get_attr`, or None for an unsupported table."""
+        filters = []
+        statement = None
+
+        if dbClassName == TableNameEnum.Users:
+            statement = select(Users)
+            if uid:
+                statement = statement.where(Users.uid == uid)
+            if mobile_number:
+                statement = statement.where(Users.mobile_number == mobile_number)
+            if customer_id:
+                statement = statement.where(Users.stripe_customer_id == customer_id)
+
+        if dbClassName == TableNameEnum.Chatrooms:
+            statement = select(Chatrooms)
+            if uid:
+                statement = statement.where(Chatrooms.owner_id == uid)
+            if chatroom_id:
+                statement = statement.where(Chatrooms.chatroom_id == chatroom_id)
+
+        if dbClassName == TableNameEnum.Messages:
+            statement = select(Messages)
+            if uid:
+                statement = statement.where(Messages.sender_id == uid)
+            if mid:
+                statement = statement.where(Messages.mid == mid)
+
+        if dbClassName == TableNameEnum.Transactions:
+            statement = select(Transactions)
+            if transaction_id:
+                statement = statement.where(
+                    Transactions.transaction_id == transaction_id
+                )
+        if dbClassName == TableNameEnum.UserPlan:
+            statement = select(UserPlan)
+            if plan_id:
+                statement = statement.where(UserPlan.plan_id == plan_id)
+            if uid:
+                statement = statement.where(UserPlan.user_id == uid)
+            if where:
+                if not isinstance(where, dict):
+                    raise TypeError("'where' must be a dictionary")
+                
+                # in this format -> {column_name: value}
+                for k, v in where.items():
+                    col = getattr(UserPlan, k, None)
+                    if col is not None:
+                        filters.append(col == v)
+
+        if statement is not None and filters:
+            statement = statement.where(and_(*filters))
+        return statement
+
+    @db_call()
     async def get_attr(
         self,
         dbClassName: TableNameEnum,
@@ -256,64 +484,431 @@ class DB:
         db_pool: Session = None,
     ) -> Optional[Users | Chatrooms | Messages | Transactions | UserPlan | None]:
         try:
-            filters = []
-            statement = None
-            table = None
-
-            if dbClassName == TableNameEnum.Users:
-                statement = select(Users)
-                if uid:
-                    statement = statement.where(Users.uid == uid)
-                if mobile_number:
-                    statement = statement.where(Users.mobile_number == mobile_number)
-                if customer_id:
-                    statement = statement.where(Users.stripe_customer_id == customer_id)
-
-            if dbClassName == TableNameEnum.Chatrooms:
-                statement = select(Chatrooms)
-                if uid:
-                    statement = statement.where(Chatrooms.owner_id == uid)
-                if chatroom_id:
-                    statement = statement.where(Chatrooms.chatroom_id == chatroom_id)
-
-            if dbClassName == TableNameEnum.Messages:
-                statement = select(Messages)
-                if uid:
-                    statement = statement.where(Messages.sender_id == uid)
-                if mid:
-                    statement = statement.where(Messages.mid == mid)
-
-            if dbClassName == TableNameEnum.Transactions:
-                statement = select(Transactions)
-                if transaction_id:
-                    statement = statement.where(
-                        Transactions.transaction_id == transaction_id
-                    )
-            if dbClassName == TableNameEnum.UserPlan:
-                statement = select(UserPlan)
-                if plan_id:
-                    statement = statement.where(UserPlan.plan_id == plan_id)
-                if uid:
-                    statement = statement.where(UserPlan.user_id == uid)
-                if where:
-                    if not isinstance(where, dict):
-                        raise TypeError("'where' must be a dictionary")
-                    
-                    # in this format -> {column_name: value}
-                    for k, v in where.items():
-                        col = getattr(UserPlan, k, None)
-                        if col is not None:
-                            filters.append(col == v)
-
+            statement = self.get_attr_statement(
+                dbClassName,
+                mobile_number=mobile_number,
+                uid=uid,
+                mid=mid,
+                customer_id=customer_id,
+                chatroom_id=chatroom_id,
+                transaction_id=transaction_id,
+                plan_id=plan_id,
+                where=where,
+            )
             if statement is None:
                 return None
-            elif filters:
-                statement = statement.where(and_(*filters))
 
             table = db_pool.exec(statement).first()
             return table
         except Exception as e:
             if isinstance(db_pool, Session):
+                if db_pool.in_nested_transaction():
+                    # The savepoint's owner rolls back to it; a session-wide
+                    # rollback would also drop the outer transaction and its locks.
+                    raise
                 db_pool.rollback()
                 traceback.print_exc()
             return None
+
+    @db_call(table="messages")
+    async def bulk_process_messages(
+        self,
+        responses: List[Tuple[str, str]],
+        db_pool: Session,
+        commit: bool = False,
+    ) -> Set[str]:
+        """
+        Store Gemini responses for many messages in a single statement.
+
+        Issues one `UPDATE messages ... FROM (VALUES ...)` and only touches rows that
+        are not already processed, so replaying a batch is a no-op.
+
+        Parameters:
+            responses (List[Tuple[str, str]]): `(mid, response_text)` pairs.
+            db_pool (Session): SQLAlchemy session object.
+            commit (bool, optional): Whether to commit the transaction. Defaults to False.
+
+        Returns:
+            :Set[str]: The mids that were actually updated by this call.
+        """
+
+        if not responses:
+            return set()
+
+        table = Messages.__table__
+        incoming = values(
+            column("mid", String), column("response", String), name="incoming"
+        ).data(responses)
+        statement = (
+            update(table)
+            .where(table.c.mid == incoming.c.mid, table.c.status != "processed")
+            .values(
+                response=incoming.c.response,
+                status="processed",
+                # Commit-time clock rather than the transaction start, for delta sync.
+                updated_at=cast(func.extract("epoch", func.clock_timestamp()), Integer),
+            )
+            .returning(table.c.mid)
+        )
+        updated = set(db_pool.execute(statement).scalars().all())
+        if commit:
+            db_pool.commit()
+        return updated
+
+    @db_call(table="messages")
+    async def search_messages(
+        self,
+        uid: str,
+        query: str,
+        limit: int = 20,
+        after: Optional[Tuple[float, str]] = None,
+        db_pool: Session = None,
+    ) -> List[Dict[str, Any]]:
+        """
+        Full-text search over the text and responses of a user's messages.
+
+        `query` takes web search syntax (quotes, `or`, `-word`). Matches come
+        from the GIN index on `search_vector`, narrowed to the user's own
+        messages, and are ranked with `ts_rank_cd`. Pages are keyset-paginated
+        on `(rank, mid)`: pass the last row's pair as `after` for the next page.
+        Snippets are built for the returned page only. They are HTML-escaped,
+        with matches wrapped in `<mark>`: `ts_headline` marks them with control
+        characters stripped from the source text, which are swapped for the
+        tags after escaping.
+
+        Returns:
+            :List[Dict[str, Any]]: One dict per hit, best match first.
+        """
+
+        messages = Messages.__table__
+        chatrooms = Chatrooms.__table__
+        # Built as a Core select, not raw SQL, so RoutingSession can send it to
+        # a replica like the other reads.
+        english = literal_column("'english'")
+        search_vector = literal_column("messages.search_vector")
+        q = select(func.websearch_to_tsquery(english, query).label("query")).cte("q")
+        ranked = (
+            select(
+                messages.c.mid,
+                messages.c.chatroom_id,
+                chatrooms.c.name.label("chatroom_name"),
+                messages.c.text,
+                messages.c.response,
+                messages.c.created_at,
+                func.ts_rank_cd(search_vector, q.c.query).label("rank"),
+            )
+            .select_from(
+                messages.join(
+                    chatrooms, chatrooms.c.chatroom_id == messages.c.chatroom_id
+                ).join(q, true())
+            )
+            .where(
+                messages.c.sender_id == uid,
+                chatrooms.c.owner_id == uid,
+                search_vector.op("@@")(q.c.query),
+            )
+            .cte("hits")
+        )
+        page = select(ranked)
+        if after is not None:
+            page = page.where(
+                tuple_(ranked.c.rank, ranked.c.mid)
+                < tuple_(cast(after[0], REAL), after[1])
+            )
+        page = (
+            page.order_by(ranked.c.rank.desc(), ranked.c.mid.desc())
+            .limit(limit)
+            .cte("page")
+        )
+
+        options = (
+            f'StartSel="{HIGHLIGHT_START}", StopSel="{HIGHLIGHT_STOP}", MaxFragments=2'
+        )
+        sentinels = HIGHLIGHT_START + HIGHLIGHT_STOP
+
+        def snippet(source):
+            return func.ts_headline(
+                english, func.translate(source, sentinels, ""), q.c.query, options
+            )
+
+        statement = (
+            select(
+                page.c.mid,
+                page.c.chatroom_id,
+                page.c.chatroom_name,
+                page.c.created_at,
+                page.c.rank,
+                snippet(page.c.text).label("text_snippet"),
+                snippet(func.coalesce(page.c.response, "")).label("response_snippet"),
+            )
+            .select_from(page.join(q, true()))
+            .order_by(page.c.rank.desc(), page.c.mid.desc())
+        )
+        hits = []
+        for row in db_pool.execute(statement).mappings():
+            hit = dict(row)
+            for key in ("text_snippet", "response_snippet"):
+                hit[key] = (
+                    html.escape(hit[key])
+                    .replace(HIGHLIGHT_START, "<mark>")
+                    .replace(HIGHLIGHT_STOP, "</mark>")
+                )
+            hits.append(hit)
+        return hits
+
+    @db_call(table="outbox")
+    async def claim_outbox(self, limit: int, db_pool: Session) -> List[Outbox]:
+        """
+        Lock the oldest pending outbox rows for publishing.
+
+        Rows are locked with `FOR UPDATE SKIP LOCKED`, so several relays can run
+        side by side without handing out the same row twice.
+        """
+
+        statement = (
+            select(Outbox)
+            .where(Outbox.status == "pending")
+            .order_by(Outbox.id)
+            .limit(limit)
+            .with_for_update(skip_locked=True)
+        )
+        return db_pool.exec(statement).all()
+
+    @db_call(table="outbox")
+    async def mark_outbox_sent(
+        self, ids: List[int], sent_at: int, db_pool: Session, commit: bool = False
+    ):
+        """Flag published outbox rows as sent in a single statement."""
+
+        if not ids:
+            return
+        table = Outbox.__table__
+        db_pool.execute(
+            update(table)
+            .where(table.c.id.in_(ids))
+            .values(status="sent", sent_at=sent_at)
+        )
+        if commit:
+            db_pool.commit()
+
+    @db_call(table="outbox")
+    async def mark_outbox_failed(
+        self, ids: List[int], db_pool: Session, commit: bool = False
+    ):
+        """Flag outbox rows that could not be published; purging skips them."""
+
+        if not ids:
+            return
+        table = Outbox.__table__
+        db_pool.execute(
+            update(table).where(table.c.id.in_(ids)).values(status="failed")
+        )
+        if commit:
+            db_pool.commit()
+
+    @db_call(table="outbox")
+    async def purge_outbox(self, before: int, db_pool: Session, commit: bool = False):
+        """Delete sent outbox rows older than `before`."""
+
+        table = Outbox.__table__
+        db_pool.execute(
+            delete(table).where(table.c.status == "sent", table.c.sent_at < before)
+        )
+        if commit:
+            db_pool.commit()
+
+    @db_call()
+    async def notify(self, channel: str, db_pool: Session, payload: str = ""):
+        """Queue a Postgres NOTIFY; it is only delivered when the transaction commits."""
+
+        db_pool.execute(
+            text("SELECT pg_notify(:channel, :payload)"),
+            {"channel": channel, "payload": payload},
+        )
+
+    @db_call(table="stripeevents")
+    async def record_stripe_event(self, event: dict, db_pool: Session) -> bool:
+        """
+        Store a verified Stripe event unless it was already recorded.
+
+        Returns:
+            :bool: True if the event is new, False for a duplicate delivery.
+        """
+
+        table = StripeEvents.__table__
+        data = event["data"]["object"]
+        statement = (
+            pg_insert(table)
+            .values(
+                event_id=event["id"],
+                type=event["type"],
+                customer_id=data.get("customer"),
+                payload=data,
+                status="pending",
+                created=event["created"],
+                received_at=int(time.time()),
+                attempts=0,
+            )
+            .on_conflict_do_nothing(index_elements=[table.c.event_id])
+            .returning(table.c.event_id)
+        )
+        return db_pool.execute(statement).first() is not None
+
+    @db_call()
+    async def lock_stripe_customer(self, customer_id: Optional[str], db_pool: Session):
+        """Serialise event processing per customer until the transaction ends."""
+
+        db_pool.execute(
+            text("SELECT pg_advisory_xact_lock(hashtext(:key))"),
+            {"key": f"stripe:{customer_id or ''}"},
+        )
+
+    @db_call(table="stripeevents")
+    async def get_pending_stripe_events(
+        self, customer_id: Optional[str], db_pool: Session
+    ) -> List[StripeEvents]:
+        """Pending events for one customer, oldest first."""
+
+        statement = select(StripeEvents).where(StripeEvents.status == "pending")
+        if customer_id:
+            statement = statement.where(StripeEvents.customer_id == customer_id)
+        else:
+            statement = statement.where(StripeEvents.customer_id.is_(None))
+        statement = statement.order_by(StripeEvents.created, StripeEvents.received_seq)
+        return db_pool.exec(statement).all()
+
+    @db_call(table="stripeevents")
+    async def mark_stripe_event(
+        self, event_id: str, event_status: str, db_pool: Session
+    ):
+        table = StripeEvents.__table__
+        db_pool.execute(
+            update(table)
+            .where(table.c.event_id == event_id)
+            .values(status=event_status, processed_at=int(time.time()))
+        )
+
+    @db_call(table="stripeevents")
+    async def schedule_stripe_event_retry(
+        self, event_id: str, attempts: int, next_attempt_at: int, db_pool: Session
+    ):
+        """Keep a failed event pending, to be retried from `next_attempt_at` on."""
+        table = StripeEvents.__table__
+        db_pool.execute(
+            update(table)
+            .where(table.c.event_id == event_id)
+            .values(attempts=attempts, next_attempt_at=next_attempt_at)
+        )
+
+    @db_call(table="stripeevents")
+    async def get_due_stripe_customers(
+        self, now: int, limit: int, db_pool: Session
+    ) -> List[Optional[str]]:
+        """Customers with pending events that are not waiting out a retry backoff."""
+        table = StripeEvents.__table__
+        statement = (
+            select(table.c.customer_id)
+            .where(
+                table.c.status == "pending",
+                or_(table.c.next_attempt_at.is_(None), table.c.next_attempt_at <= now),
+            )
+            .distinct()
+            .limit(limit)
+        )
+        return list(db_pool.execute(statement).scalars().all())
+
+    @db_call(table="transactions")
+    async def set_subscription_expiry(
+        self, subscription_id: str, expires_at: int, how: str, db_pool: Session
+    ) -> int:
+        """
+        Move the expiry of the completed transaction behind a Stripe subscription.
+
+        `how` is "extend" (never moves it earlier, for renewals), "set" (takes
+        `expires_at` as is) or "end" (never moves it later, for cancellations).
+
+        Returns:
+            :int: Number of transactions updated.
+        """
+
+        table = Transactions.__table__
+        if how == "extend":
+            value = func.greatest(func.coalesce(table.c.expires_at, 0), expires_at)
+        elif how == "end":
+            value = func.least(func.coalesce(table.c.expires_at, expires_at), expires_at)
+        else:
+            value = expires_at
+        result = db_pool.execute(
+            update(table)
+            .where(
+                table.c.stripe_subscription_id == subscription_id,
+                table.c.status == "completed",
+            )
+            .values(expires_at=value)
+        )
+        return result.rowcount
+
+    @db_call(table="transactions")
+    async def expire_plans(
+        self, now: int, batch_size: int, db_pool: Session, commit: bool = False
+    ) -> Tuple[int, List[str]]:
+        """
+        End one batch of lapsed Pro subscriptions with set-based statements.
+
+        Picks completed transactions whose `expires_at` has passed (served by the
+        `(status, expires_at)` index), marks them `ended`, deactivates the plans
+        they granted and gives each affected user a fresh basic plan unless they
+        still hold another active one.
+
+        Returns:
+            :Tuple[int, List[str]]:
+                - Number of transactions ended by this batch.
+                - uids of users whose active plan was deactivated.
+        """
+
+        statement = text(
+            """
+            WITH batch AS (
+                SELECT transaction_id
+                FROM transactions
+                WHERE status = 'completed' AND expires_at <= :now
+                ORDER BY expires_at
+                LIMIT :batch_size
+                FOR UPDATE SKIP LOCKED
+            ), ended AS (
+                UPDATE transactions t
+                SET status = 'ended'
+                FROM batch
+                WHERE t.transaction_id = batch.transaction_id
+                RETURNING t.plan_id
+            ), deactivated AS (
+                UPDATE userplan p
+                SET active = false
+                FROM ended
+                WHERE p.plan_id = ended.plan_id AND p.active
+                RETURNING p.user_id
+            ), inserted AS (
+                INSERT INTO userplan (plan_id, user_id, active, plan, created_at)
+                SELECT gen_random_uuid()::text, d.user_id, true, 'basic', :now
+                FROM (SELECT DISTINCT user_id FROM deactivated) d
+                WHERE NOT EXISTS (
+                    SELECT 1 FROM userplan other
+                    WHERE other.user_id = d.user_id
+                      AND other.active
+                      AND other.plan_id NOT IN (
+                          SELECT plan_id FROM ended WHERE plan_id IS NOT NULL
+                      )
+                )
+                RETURNING user_id
+            )
+            SELECT
+                (SELECT count(*) FROM ended) AS ended_count,
+                ARRAY(SELECT DISTINCT user_id FROM deactivated) AS user_ids
+            """
+        )
+        ended_count, user_ids = db_pool.execute(
+            statement, {"now": now, "batch_size": batch_size}
+        ).one()
+        if commit:
+            db_pool.commit()
+        return ended_count, list(user_ids or [])
@@ -2,11 +2,15 @@ from enum import Enum
 from re import A
 import time
 from typing import List, Optional
-from sqlalchemy import Column, Integer, func
+from sqlalchemy import JSON, BigInteger, Column, Identity, Index, Integer, cast, func, text
 from sqlmodel import Field, Relationship, SQLModel
 
 from src.core.security import Security, TokenType
 
+# Latest migration in migrations/versions. Processes refuse to start against a
+# database at any other revision; run `python migrate.py` first.
+SCHEMA_VERSION = "0010"
+
 
 class TableNameEnum(str, Enum):
     Users = "users"
@@ -16,6 +20,8 @@ class TableNameEnum(str, Enum):
     Password = "password"
     UserPlan = "userplan"
     Transactions = "transactions"
+    Outbox = "outbox"
+    StripeEvents = "stripeevents"
 
 
 class Users(SQLModel, table=True):
@@ -29,7 +35,7 @@ class Users(SQLModel, table=True):
     full_name: str = Field(nullable=True)
     disabled: bool = Field(default=False)
     confirmed: bool = Field(default=False)
-    stripe_customer_id: str = Field(nullable=True)
+    stripe_customer_id: str = Field(nullable=True, index=True)
 
     created_at: Optional[int] = Field(default_factory=lambda: int(time.time()))
     updated_at: Optional[int] = Field(
@@ -45,6 +51,10 @@ class Users(SQLModel, table=True):
 
 
 class UserPlan(SQLModel, table=True):
+    __table_args__ = (
+        Index("ix_userplan_user_id_active", "user_id", postgresql_where=text("active")),
+    )
+
     plan_id: str = Field(
         primary_key=True,
         index=True,
@@ -59,6 +69,10 @@ class UserPlan(SQLModel, table=True):
 
 
 class Transactions(SQLModel, table=True):
+    __table_args__ = (
+        Index("ix_transactions_status_expires_at", "status", "expires_at"),
+    )
+
     transaction_id: str = Field(
         primary_key=True,
         index=True,
@@ -71,6 +85,10 @@ class Transactions(SQLModel, table=True):
     status: str = Field(nullable=False)
     amount: int = Field(nullable=False)
     mode: str
+    # Set for recurring checkouts; renewals and cancellations are matched on it.
+    stripe_subscription_id: Optional[str] = Field(
+        default=None, index=True, nullable=True
+    )
 
     created_at: Optional[int] = Field(default_factory=lambda: int(time.time()))
     expires_at: Optional[int] = Field(nullable=True)
@@ -104,6 +122,10 @@ class UserProfile(SQLModel, table=True):
 
 
 class Chatrooms(SQLModel, table=True):
+    __table_args__ = (
+        Index("ix_chatrooms_owner_id_created_at", "owner_id", "created_at"),
+    )
+
     chatroom_id: str = Field(
         primary_key=True,
         index=True,
@@ -121,7 +143,15 @@ class Chatrooms(SQLModel, table=True):
     messages: List["Messages"] = Relationship(back_populates="chatroom")
 
 
+# Migration 0003 also gives messages a generated `search_vector` tsvector with a
+# GIN index. It is not mapped here, so ORM reads never load it; only
+# `DB.search_messages` uses it.
 class Messages(SQLModel, table=True):
+    __table_args__ = (
+        Index("ix_messages_chatroom_id_created_at", "chatroom_id", "created_at"),
+        Index("ix_messages_chatroom_id_updated_at", "chatroom_id", "updated_at"),
+    )
+
     mid: str = Field(
         primary_key=True,
         index=True,
@@ -132,10 +162,66 @@ class Messages(SQLModel, table=True):
     text: str = Field(nullable=False)
     response: str = Field(nullable=True)
     status: str = Field(default="pending", nullable=False)
-    created_at: Optional[int] = Field(default_factory=lambda: int(time.time()))
+    # Part of the export's keyset, where a NULL would end the export early.
+    created_at: Optional[int] = Field(
+        default_factory=lambda: int(time.time()),
+        sa_column=Column(
+            Integer,
+            nullable=False,
+            server_default=text("CAST(extract(epoch FROM clock_timestamp()) AS integer)"),
+        ),
+    )
+    # Set on insert too, so delta sync sees new messages. clock_timestamp(), like
+    # bulk_process_messages, rather than now(), which is the transaction start.
     updated_at: Optional[int] = Field(
-        default=None,
-        sa_column=Column(Integer, onupdate=func.extract("epoch", func.now())),
+        default_factory=lambda: int(time.time()),
+        sa_column=Column(
+            Integer,
+            nullable=False,
+            server_default=text("CAST(extract(epoch FROM clock_timestamp()) AS integer)"),
+            onupdate=cast(func.extract("epoch", func.clock_timestamp()), Integer),
+        ),
     )
 
     chatroom: "Chatrooms" = Relationship(back_populates="messages")
+
+
+class Outbox(SQLModel, table=True):
+    __table_args__ = (
+        Index("ix_outbox_pending", "id", postgresql_where=text("status = 'pending'")),
+    )
+
+    id: Optional[int] = Field(default=None, primary_key=True)
+    topic: str = Field(nullable=False)
+    payload: dict = Field(sa_column=Column(JSON, nullable=False))
+    status: str = Field(default="pending", nullable=False)
+    created_at: Optional[int] = Field(default_factory=lambda: int(time.time()))
+    sent_at: Optional[int] = Field(default=None, nullable=True)
+
+
+class StripeEvents(SQLModel, table=True):
+    __table_args__ = (
+        Index(
+            "ix_stripeevents_pending",
+            "customer_id",
+            "created",
+            "received_seq",
+            postgresql_where=text("status = 'pending'"),
+        ),
+    )
+
+    event_id: str = Field(primary_key=True)
+    type: str = Field(nullable=False)
+    customer_id: Optional[str] = Field(default=None, nullable=True)
+    payload: dict = Field(sa_column=Column(JSON, nullable=False))
+    status: str = Field(default="pending", nullable=False)
+    created: int = Field(nullable=False)
+    received_at: Optional[int] = Field(default_factory=lambda: int(time.time()))
+    # Stripe's `created` has one-second resolution, so events of the same
+    # second are applied in the order they were recorded.
+    received_seq: Optional[int] = Field(
+        default=None, sa_column=Column(BigInteger, Identity(), nullable=False)
+    )
+    processed_at: Optional[int] = Field(default=None, nullable=True)
+    attempts: int = Field(default=0, nullable=False)
+    next_attempt_at: Optional[int] = Field(default=None, nullable=True)
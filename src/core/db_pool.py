@@ -1,18 +1,475 @@
-import traceback
+import json
+import logging
+import os
+import queue
+import random
+import threading
+import time
 from venv import logger
-from typing import Optional
-from sqlalchemy import create_engine
-from sqlmodel import SQLModel, Session, select
-from src.core.variables import DATABASE_URL
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+from typing import AsyncIterator, Iterator, List, Optional, Tuple
+from fastapi import Request
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import ProgrammingError
+from sqlalchemy.orm import scoped_session, sessionmaker
+from sqlalchemy.pool import NullPool, QueuePool
+from sqlalchemy.sql import Select
+from sqlalchemy.sql.dml import UpdateBase
+from sqlmodel import Session, select
+from src.core.db_models import SCHEMA_VERSION
+from src.core.variables import (
+    DATABASE_URL,
+    DB_POOL_SIZE,
+    DB_MAX_OVERFLOW,
+    DATABASE_REPLICA_URLS,
+    DB_POOLER_MODE,
+    DB_POOLER_POOL_SIZE,
+    DB_STATEMENT_TIMEOUT_MS,
+    REPLICA_LAG_CHECK_INTERVAL,
+    REPLICA_MAX_LAG,
+    WORKER_DB_POOL_SIZE,
+    WORKER_DB_MAX_OVERFLOW,
+    SLOW_QUERY_THRESHOLD_MS,
+    SLOW_QUERY_EXPLAIN_SAMPLE_RATE,
+    SLOW_QUERY_LOG_PER_MINUTE,
+)
+from src.core.metrics import (
+    DB_POOL_CHECKOUT_SECONDS,
+    DB_POOL_CONNECTIONS_IN_USE,
+    DB_REPLICA_LAG_SECONDS,
+)
+from src.core.request_stats import current_stats, record_query
+from src.core.tracing import tracer
+from src.decorators.jwt import decode_jwt_token, extract_token_from_request
+from src.utils.caching import has_recent_write, mark_recent_write
 
 
-def initDB(_engine):
+class SchemaVersionMismatchError(Exception):
+    def __init__(self, found: Optional[str], expected: str = SCHEMA_VERSION):
+        self.message = (
+            f"Database schema is at revision {found or 'none'}, expected {expected}. "
+            "Run `python migrate.py` before starting the app."
+        )
+        super().__init__(self.message)
+
+
+def check_schema_version(_engine):
+    """Refuses to run against a database that is not at `SCHEMA_VERSION`."""
+    with _engine.connect() as connection:
+        try:
+            found = connection.exec_driver_sql(
+                "SELECT version_num FROM alembic_version"
+            ).scalar()
+        except ProgrammingError:
+            found = None
+    if found != SCHEMA_VERSION:
+        raise SchemaVersionMismatchError(found)
+
+
+slow_query_logger = logging.getLogger("slow_query")
+
+# (DB method, table) of the `DB` call currently running, for slow query reports.
+_current_db_call: ContextVar[Optional[Tuple[str, Optional[str]]]] = ContextVar(
+    "current_db_call", default=None
+)
+
+
+def db_call(table=None):
+    """
+    Tags the statements issued by a `DB` method with the method and table name.
+
+    The table comes from the `dbClassName` keyword when the method is given
+    one, otherwise from `table`.
+    """
+
+    def decorator(func):
+        @wraps(func)
+        async def wrapper(*args, **kwargs):
+            target = kwargs.get("dbClassName", table)
+            token = _current_db_call.set(
+                (func.__name__, getattr(target, "value", target))
+            )
+            try:
+                return await func(*args, **kwargs)
+            finally:
+                _current_db_call.reset(token)
+
+        return wrapper
+
+    return decorator
+
+
+class SlowQueryMonitor:
+    """
+    Logs statements slower than `threshold_ms` and samples their plans.
+
+    Each report carries the route, the `DB` method and the table that issued
+    the statement. For a sample of plain SELECTs an `EXPLAIN (ANALYZE, BUFFERS)`
+    is run on a background thread, inside a transaction that is rolled back,
+    so the request never waits on it. Reports are capped at `per_minute`
+    with a token bucket; anything beyond that is only counted.
+    """
+
+    def __init__(
+        self,
+        threshold_ms: float = SLOW_QUERY_THRESHOLD_MS,
+        explain_sample_rate: float = SLOW_QUERY_EXPLAIN_SAMPLE_RATE,
+        per_minute: int = SLOW_QUERY_LOG_PER_MINUTE,
+    ):
+        self.threshold = threshold_ms / 1000
+        self.explain_sample_rate = explain_sample_rate
+        self.per_minute = per_minute
+        self.dropped = 0
+        self._tokens = float(per_minute)
+        self._refilled_at = time.monotonic()
+        self._lock = threading.Lock()
+        self._explains: queue.Queue = queue.Queue(maxsize=32)
+        self._thread = None
+        self._pid = None
+
+    def _allow(self) -> bool:
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(
+                self.per_minute,
+                self._tokens + (now - self._refilled_at) * self.per_minute / 60,
+            )
+            self._refilled_at = now
+            if self._tokens < 1:
+                self.dropped += 1
+                return False
+            self._tokens -= 1
+            return True
+
+    @staticmethod
+    def _explainable(statement: str) -> bool:
+        head = statement.lstrip()[:6].upper()
+        upper = statement.upper()
+        return head == "SELECT" and "FOR UPDATE" not in upper and "PG_" not in upper
+
+    def observe(self, engine: Engine, statement: str, parameters, duration: float, executemany: bool):
+        if duration < self.threshold or statement.lstrip().upper().startswith("EXPLAIN"):
+            return
+        if not self._allow():
+            return
+
+        stats = current_stats()
+        method, table = _current_db_call.get() or (None, None)
+        report = {
+            "duration_ms": round(duration * 1000, 2),
+            "route": stats.route if stats else None,
+            "db_method": method,
+            "table": table,
+            "statement": statement[:1000],
+            "dropped_since_last": self.dropped,
+        }
+        self.dropped = 0
+        slow_query_logger.warning(json.dumps(report))
+
+        if (
+            not executemany
+            and self._explainable(statement)
+            and random.random() < self.explain_sample_rate
+        ):
+            self._ensure_started()
+            try:
+                self._explains.put_nowait((engine, statement, parameters, report))
+            except queue.Full:
+                pass
+
+    def _ensure_started(self):
+        if self._thread is not None and self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._thread is not None and self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self._thread = threading.Thread(
+                target=self._run, name="slow-query-explain", daemon=True
+            )
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            engine, statement, parameters, report = self._explains.get()
+            try:
+                with engine.connect() as connection:
+                    transaction = connection.begin()
+                    try:
+                        plan = connection.exec_driver_sql(
+                            f"EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) {statement}",
+                            parameters,
+                        ).scalar()
+                    finally:
+                        transaction.rollback()
+                slow_query_logger.warning(
+                    json.dumps(
+                        {
+                            "route": report["route"],
+                            "db_method": report["db_method"],
+                            "table": report["table"],
+                            "plan": plan,
+                        },
+                        default=str,
+                    )
+                )
+            except Exception:
+                slow_query_logger.exception("EXPLAIN of slow statement failed")
+
+
+slow_query_monitor = SlowQueryMonitor()
+
+
+class InstrumentedQueuePool(QueuePool):
+    """QueuePool that records how long callers wait for a connection."""
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            DB_POOL_CHECKOUT_SECONDS.observe(time.perf_counter() - started)
+
+
+def pooler_options(kwargs: dict) -> dict:
+    """
+    Engine options for running behind PgBouncer in transaction pooling mode.
+
+    The pooler multiplexes server connections, so each process only keeps a
+    few client connections (or none with `DB_POOLER_POOL_SIZE=0`). psycopg2
+    never uses server-side prepared statements, and the app keeps no session
+    state: timeouts are set per transaction and LISTEN uses the direct URL.
+    """
+    options = {
+        k: v
+        for k, v in kwargs.items()
+        if k not in ("pool_size", "max_overflow", "pool_timeout")
+    }
+    if DB_POOLER_POOL_SIZE <= 0:
+        options.pop("pool_pre_ping", None)
+        return {**options, "poolclass": NullPool}
+    return {
+        **options,
+        "pool_size": DB_POOLER_POOL_SIZE,
+        "max_overflow": 0,
+        "pool_timeout": kwargs.get("pool_timeout", 30),
+    }
+
+
+def create_db_engine(url: str = DATABASE_URL, **kwargs) -> Engine:
+    """Creates an engine with the instrumented pool and connection hooks attached."""
+    kwargs = {"poolclass": InstrumentedQueuePool, **kwargs}
+    if DB_POOLER_MODE == "transaction":
+        kwargs = pooler_options(kwargs)
+    engine = create_engine(url, **kwargs)
+
+    if DB_STATEMENT_TIMEOUT_MS > 0:
+
+        @event.listens_for(engine, "begin")
+        def _set_statement_timeout(conn):
+            # Autocommit connections have no transaction to scope it to; see
+            # `_read_only` for how read-only sessions keep it behind a pooler.
+            if conn.get_execution_options().get("isolation_level") != "AUTOCOMMIT":
+                conn.exec_driver_sql(
+                    f"SET LOCAL statement_timeout = {DB_STATEMENT_TIMEOUT_MS}"
+                )
+
+    @event.listens_for(engine, "checkout")
+    def _on_checkout(dbapi_connection, connection_record, connection_proxy):
+        DB_POOL_CONNECTIONS_IN_USE.inc()
+
+    @event.listens_for(engine, "checkin")
+    def _on_checkin(dbapi_connection, connection_record):
+        DB_POOL_CONNECTIONS_IN_USE.dec()
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        context._started_at = time.time()
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        finished = time.time()
+        duration = finished - context._started_at
+        record_query(duration)
+        slow_query_monitor.observe(
+            conn.engine, statement, parameters, duration, executemany
+        )
+        if tracer.enabled and tracer.current_span() is not None:
+            tracer.record_span(
+                "db.statement",
+                context._started_at,
+                finished,
+                attributes={"db.statement": statement[:500]},
+            )
+
+    return engine
+
+
+REPLICA_LAG_QUERY = """
+SELECT CASE
+    WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+    ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0)
+END
+"""
+
+
+class ReplicaSet:
+    """
+    Read replicas with a background lag check.
+
+    A replica serves reads only while its last measured replication lag is
+    under `max_lag` seconds; one that lags or cannot be reached is skipped
+    until the next check finds it healthy again. With no healthy replica,
+    reads go to the primary.
+    """
+
+    def __init__(
+        self,
+        engines: List[Engine],
+        max_lag: float = REPLICA_MAX_LAG,
+        check_interval: float = REPLICA_LAG_CHECK_INTERVAL,
+    ):
+        self.engines = engines
+        self.max_lag = max_lag
+        self.check_interval = check_interval
+        self._healthy: List[Engine] = []
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def __bool__(self) -> bool:
+        return bool(self.engines)
+
+    def pick(self) -> Optional[Engine]:
+        healthy = self._healthy
+        return random.choice(healthy) if healthy else None
+
+    def check(self):
+        healthy = []
+        for index, engine in enumerate(self.engines):
+            try:
+                with engine.connect() as connection:
+                    lag = float(connection.exec_driver_sql(REPLICA_LAG_QUERY).scalar())
+            except Exception:
+                logger.warning(f"Replica {index} unreachable, reading from primary")
+                lag = -1
+            DB_REPLICA_LAG_SECONDS.labels(replica=str(index)).set(lag)
+            if 0 <= lag <= self.max_lag:
+                healthy.append(engine)
+        self._healthy = healthy
+
+    def start(self):
+        self.check()
+        self._stopped.clear()
+        self._thread = threading.Thread(
+            target=self._run, name="replica-lag-check", daemon=True
+        )
+        self._thread.start()
+
+    def _run(self):
+        while not self._stopped.wait(self.check_interval):
+            self.check()
+
+    def dispose(self):
+        self._stopped.set()
+        for engine in self.engines:
+            engine.dispose()
+
+
+class ReadOnlySessionError(Exception):
+    def __init__(self, message="Write attempted in a handler declared read-only"):
+        self.message = message
+        super().__init__(self.message)
+
+
+_read_only_engines = {}
+
+
+def _read_only(engine: Engine) -> Engine:
+    """
+    Same engine and pool, set up for sessions that only read.
+
+    Connections run in autocommit: psycopg2 switches it client side, so reads
+    skip the BEGIN and ROLLBACK round trips without any extra statement.
+    Behind a pooler with `DB_STATEMENT_TIMEOUT_MS` set they run in a
+    `BEGIN READ ONLY` transaction instead, so the timeout still applies with
+    `SET LOCAL`.
+    """
+    read_only_engine = _read_only_engines.get(engine)
+    if read_only_engine is None:
+        if DB_POOLER_MODE == "transaction" and DB_STATEMENT_TIMEOUT_MS > 0:
+            read_only_engine = engine.execution_options(postgresql_readonly=True)
+        else:
+            read_only_engine = engine.execution_options(isolation_level="AUTOCOMMIT")
+        _read_only_engines[engine] = read_only_engine
+    return read_only_engine
+
+
+class RoutingSession(Session):
+    """
+    Session that sends reads to a replica when the request allows it.
+
+    Only plain SELECTs of a session marked `use_replica` leave the primary.
+    Flushes, INSERT/UPDATE/DELETE and raw SQL always go to the primary, and
+    after the first write every later statement of the session does too.
+
+    A session marked `read_only` (see `catch_async`) runs on autocommit
+    connections, or read-only transactions behind a pooler (see `_read_only`),
+    and refuses writes.
+    """
+
+    def __init__(self, *args, replicas: Optional[ReplicaSet] = None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.replicas = replicas
+
+    def get_bind(self, mapper=None, clause=None, **kwargs):
+        if self._flushing or isinstance(clause, UpdateBase):
+            if self.info.get("read_only"):
+                raise ReadOnlySessionError()
+            self.info["wrote"] = True
+        elif (
+            self.replicas
+            and self.info.get("use_replica")
+            and not self.info.get("wrote")
+            and isinstance(clause, Select)
+        ):
+            replica = self.replicas.pick()
+            if replica is not None:
+                return _read_only(replica) if self.info.get("read_only") else replica
+
+        engine = super().get_bind(mapper, clause=clause, **kwargs)
+        return _read_only(engine) if self.info.get("read_only") else engine
+
+
+@contextmanager
+def on_primary(session: Session) -> Iterator[Session]:
+    """
+    Sends the reads made inside the block to the primary.
+
+    For reads that must see a write made without a token to key the
+    read-your-writes window on, such as the account confirmed by verify-otp.
+    """
+    use_replica = session.info.get("use_replica")
+    session.info["use_replica"] = False
     try:
-        SQLModel.metadata.create_all(_engine)
-        print("DB initialized")
-    except:
-        traceback.print_exc()
-        print(f"Error in creating init tables.")
+        yield session
+    finally:
+        session.info["use_replica"] = use_replica
+
+
+READ_METHODS = {"GET", "HEAD", "OPTIONS"}
+
+
+def _request_user_id(request: Request) -> Optional[str]:
+    user = getattr(request.state, "user", None)
+    if user is not None:
+        return user.uid
+    try:
+        return decode_jwt_token(extract_token_from_request(request)).get("sub")
+    except Exception:
+        return None
 
 
 class UninitializedDatabasePoolError(Exception):
@@ -30,10 +487,13 @@ class DataBasePool:
     _instance = None
     _engine = None
     _db_pool: Session = None
+    _pid: Optional[int] = None
+    _session_factory: Optional[scoped_session] = None
+    _replicas: Optional[ReplicaSet] = None
 
     @classmethod
-    async def initDB(cls):
-        initDB(cls._engine)
+    def check_schema(cls):
+        check_schema_version(cls._engine)
 
     @classmethod
     async def getEngine(cls):
@@ -42,42 +502,156 @@ class DataBasePool:
     @classmethod
     async def setup(cls, timeout: Optional[float] = None):
         if cls._engine == None:
-            cls._engine = create_engine(
+            cls._engine = create_db_engine(
                 DATABASE_URL,
-                pool_size=20,  # Maximum number of connections
-                max_overflow=10,  # Extra connections when pool maxed
+                pool_size=DB_POOL_SIZE,  # Maximum number of connections
+                max_overflow=DB_MAX_OVERFLOW,  # Extra connections when pool maxed
                 pool_timeout=30,  # Seconds to wait for connection
                 pool_recycle=300,  # Recycle connections after 30 mins
                 pool_pre_ping=True,  # Verify connection is valid
                 echo=False,
             )
-            initDB(cls._engine)
+            check_schema_version(cls._engine)
+            cls._pid = os.getpid()
             cls._timeout = timeout
             with Session(cls._engine) as session:
                 cls._db_pool = session
 
+            cls._replicas = ReplicaSet(
+                [
+                    create_db_engine(
+                        url,
+                        pool_size=DB_POOL_SIZE,
+                        max_overflow=DB_MAX_OVERFLOW,
+                        pool_timeout=30,
+                        pool_recycle=300,
+                        pool_pre_ping=True,
+                    )
+                    for url in DATABASE_REPLICA_URLS
+                ]
+            )
+            if cls._replicas:
+                cls._replicas.start()
+
     @classmethod
     def sync_setup(cls, timeout: Optional[float] = None):
         if cls._engine == None:
-            cls._engine = create_engine(
+            cls._engine = create_db_engine(
                 DATABASE_URL,
-                pool_size=20,
-                max_overflow=10,
+                pool_size=DB_POOL_SIZE,
+                max_overflow=DB_MAX_OVERFLOW,
                 pool_timeout=30,
                 pool_recycle=1800,
                 pool_pre_ping=True,
                 echo=False,
             )
-            initDB(cls._engine)
+            check_schema_version(cls._engine)
+            cls._pid = os.getpid()
             cls._timeout = timeout
             with Session(cls._engine) as session:
                 cls._db_pool = session
 
     @classmethod
-    def get_pool(cls) -> Session:
-        if not cls._db_pool:
+    def worker_setup(
+        cls,
+        pool_size: int = WORKER_DB_POOL_SIZE,
+        max_overflow: int = WORKER_DB_MAX_OVERFLOW,
+    ):
+        """
+        Gives a worker process its own engine and a per-thread session registry.
+
+        Meant to run in each forked child: an engine inherited from the parent is
+        dropped without closing its sockets, which still belong to the parent.
+        The pool is sized for one task thread plus the result sink flusher.
+        """
+        if cls._engine is not None and cls._pid != os.getpid():
+            cls._engine.dispose(close=False)
+            cls._engine = None
+            cls._db_pool = None
+
+        if cls._engine is None:
+            cls._engine = create_db_engine(
+                DATABASE_URL,
+                pool_size=pool_size,
+                max_overflow=max_overflow,
+                pool_timeout=30,
+                pool_recycle=1800,
+                pool_pre_ping=True,
+                echo=False,
+            )
+            cls._pid = os.getpid()
+            cls._session_factory = scoped_session(
+                sessionmaker(bind=cls._engine, class_=Session)
+            )
+
+    @classmethod
+    @contextmanager
+    def session_scope(cls) -> Iterator[Session]:
+        """Yields the calling thread's session and discards it afterwards."""
+        if cls._session_factory is None or cls._pid != os.getpid():
+            cls.worker_setup()
+        session = cls._session_factory()
+        try:
+            yield session
+        finally:
+            cls._session_factory.remove()
+
+    @classmethod
+    @contextmanager
+    def stream_session(cls, use_replica: bool = False) -> Iterator[Session]:
+        """
+        A session for reads that outlive the request handler, like streamed responses.
+
+        The request's own session is closed once the handler returns. Open one
+        per batch and close it before yielding, so a slow or vanished client
+        never holds a transaction or a pooled connection.
+        """
+        if cls._engine is None:
             raise UninitializedDatabasePoolError()
-        return cls._db_pool
+
+        session = RoutingSession(cls._engine, replicas=cls._replicas)
+        session.info["use_replica"] = use_replica
+        try:
+            yield session
+        finally:
+            session.close()
+
+    @classmethod
+    def dispose(cls):
+        """Closes every pooled connection and forgets the engine."""
+        if cls._engine is not None:
+            cls._engine.dispose()
+        cls._engine = None
+        cls._db_pool = None
+        cls._session_factory = None
+        cls._pid = None
+
+    @classmethod
+    async def get_pool(cls, request: Request) -> AsyncIterator[Session]:
+        """
+        Request-scoped session dependency.
+
+        Reads of GET requests go to a healthy replica, unless the user wrote
+        something within the last `READ_YOUR_WRITES_WINDOW` seconds; any
+        request that writes opens that window for its user.
+        """
+        if cls._engine is None:
+            raise UninitializedDatabasePoolError()
+
+        session = RoutingSession(cls._engine, replicas=cls._replicas)
+        if cls._replicas and request.method in READ_METHODS:
+            user_id = _request_user_id(request)
+            session.info["use_replica"] = not (
+                user_id and await has_recent_write(user_id)
+            )
+        try:
+            yield session
+        finally:
+            session.close()
+            if cls._replicas and session.info.get("wrote"):
+                user_id = _request_user_id(request)
+                if user_id:
+                    await mark_recent_write(user_id)
 
     @classmethod
     async def teardown(cls):
@@ -94,6 +668,9 @@ class DataBasePool:
             cls._db_pool.close()
             logger.info(f"db_pool closed")
 
+        if cls._replicas:
+            cls._replicas.dispose()
+
     @classmethod
     async def verify_connection(cls, db_pool: Session) -> bool:
         try:
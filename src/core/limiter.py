@@ -6,6 +6,7 @@ from fastapi import Request, HTTPException, status
 from slowapi.util import get_remote_address
 
 from src.core.variables import REDIS_URL
+from src.utils.caching import get_cached_plan_tier, set_cached_plan_tier
 
 PLAN_LIMITS = {
     "basic": "5/day",
@@ -37,9 +38,13 @@ def rate_limit_by_plan(limiter: Limiter):
                     status_code=status.HTTP_401_UNAUTHORIZED, detail="Unauthorized"
                 )
 
-            user_plan_list = getattr(request.state.user, "plan", [])
-            active_plan = next((p for p in user_plan_list if p.active), None)
-            user_tier = getattr(active_plan, "plan", "basic").lower()
+            user_id = str(request.state.user.uid)
+            user_tier = await get_cached_plan_tier(user_id)
+            if user_tier is None:
+                user_plan_list = getattr(request.state.user, "plan", [])
+                active_plan = next((p for p in user_plan_list if p.active), None)
+                user_tier = getattr(active_plan, "plan", "basic").lower()
+                await set_cached_plan_tier(user_id, user_tier)
 
             limit = PLAN_LIMITS.get(user_tier.lower(), PLAN_LIMITS["basic"])
 
@@ -0,0 +1,122 @@
+import asyncio
+import logging
+import sys
+import threading
+import time
+import traceback
+from dataclasses import dataclass
+from typing import List, Optional
+
+from src.core.metrics import EVENT_LOOP_BLOCKED, EVENT_LOOP_LAG
+from src.core.variables import (
+    LOOP_MONITOR_INTERVAL_MS,
+    LOOP_MONITOR_STRICT,
+    LOOP_MONITOR_THRESHOLD_MS,
+)
+
+logger = logging.getLogger("loop_monitor")
+
+
+@dataclass
+class BlockingIncident:
+    duration: float
+    stack: str
+
+
+class LoopMonitor:
+    """
+    Measures how late the event loop runs its callbacks.
+
+    A probe task sleeps for `interval_ms` and records how much later than that
+    it actually woke up (`event_loop_lag_seconds`). A watchdog thread checks
+    the probe's heartbeat; once the loop has not come back for `threshold_ms`
+    it grabs the loop thread's stack, which points at the sync call that is
+    blocking it (a DB query, Stripe, bcrypt, ...), and logs it once per stall.
+
+    In strict mode every stall is kept in `incidents`, asyncio debug mode is on
+    so slow callbacks are named too, and `stop()` raises if anything blocked.
+    Meant for tests and CI, not production.
+    """
+
+    def __init__(
+        self,
+        interval_ms: float = LOOP_MONITOR_INTERVAL_MS,
+        threshold_ms: float = LOOP_MONITOR_THRESHOLD_MS,
+        strict: bool = LOOP_MONITOR_STRICT,
+    ):
+        self.interval = interval_ms / 1000
+        self.threshold = threshold_ms / 1000
+        self.strict = strict
+        self.incidents: List[BlockingIncident] = []
+
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._loop_thread_id: Optional[int] = None
+        self._heartbeat = 0.0
+        self._probe: Optional[asyncio.Task] = None
+        self._watchdog: Optional[threading.Thread] = None
+        self._stopped = threading.Event()
+
+    async def start(self):
+        self._loop = asyncio.get_running_loop()
+        self._loop_thread_id = threading.get_ident()
+        self._heartbeat = time.monotonic()
+        self._stopped.clear()
+        if self.strict:
+            self._loop.set_debug(True)
+            self._loop.slow_callback_duration = self.threshold
+
+        self._probe = asyncio.create_task(self._run_probe(), name="loop-monitor")
+        self._watchdog = threading.Thread(
+            target=self._run_watchdog, name="loop-watchdog", daemon=True
+        )
+        self._watchdog.start()
+
+    async def stop(self):
+        self._stopped.set()
+        if self._probe is not None:
+            self._probe.cancel()
+            try:
+                await self._probe
+            except asyncio.CancelledError:
+                pass
+        if self.strict:
+            self.assert_no_blocking()
+
+    def assert_no_blocking(self):
+        if self.incidents:
+            worst = max(self.incidents, key=lambda i: i.duration)
+            raise AssertionError(
+                f"Event loop was blocked {len(self.incidents)} time(s), "
+                f"worst {worst.duration * 1000:.0f}ms at:\n{worst.stack}"
+            )
+
+    async def _run_probe(self):
+        while True:
+            expected = time.monotonic() + self.interval
+            await asyncio.sleep(self.interval)
+            now = time.monotonic()
+            self._heartbeat = now
+            EVENT_LOOP_LAG.observe(max(now - expected, 0.0))
+
+    def _run_watchdog(self):
+        reported_for = None
+        while not self._stopped.wait(self.threshold / 2):
+            heartbeat = self._heartbeat
+            stalled = time.monotonic() - heartbeat - self.interval
+            if stalled < self.threshold or reported_for == heartbeat:
+                continue
+            reported_for = heartbeat
+            self._report(stalled)
+
+    def _report(self, stalled: float):
+        frame = sys._current_frames().get(self._loop_thread_id)
+        stack = "".join(traceback.format_stack(frame)) if frame else "<unavailable>"
+        EVENT_LOOP_BLOCKED.inc()
+        logger.warning(
+            f"Event loop blocked for at least {stalled * 1000:.0f}ms at:\n{stack}"
+        )
+        if self.strict:
+            self.incidents.append(BlockingIncident(stalled, stack))
+
+
+loop_monitor = LoopMonitor()
@@ -0,0 +1,127 @@
+import os
+from typing import Optional
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    generate_latest,
+    multiprocess,
+    start_http_server,
+)
+from prometheus_client.core import GaugeMetricFamily
+
+# Labels are kept to small, fixed sets (route templates, task names, outcomes)
+# so series counts do not grow with traffic.
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+LLM_BUCKETS = (0.25, 0.5, 1, 2, 4, 8, 16, 32, 64)
+
+HTTP_REQUEST_DURATION = Histogram(
+    "http_request_duration_seconds",
+    "HTTP request latency by route template.",
+    ["method", "route", "status"],
+    buckets=LATENCY_BUCKETS,
+)
+CACHE_REQUESTS = Counter(
+    "cache_requests_total",
+    "Cache lookups by cache and result (hit/miss).",
+    ["cache", "result"],
+)
+DB_POOL_CHECKOUT_SECONDS = Histogram(
+    "db_pool_checkout_seconds",
+    "Time spent waiting for a connection from the DataBasePool engine.",
+    buckets=(0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 5, 30),
+)
+DB_POOL_CONNECTIONS_IN_USE = Gauge(
+    "db_pool_connections_in_use",
+    "Connections currently checked out of the pool.",
+    multiprocess_mode="livesum",
+)
+DB_REPLICA_LAG_SECONDS = Gauge(
+    "db_replica_lag_seconds",
+    "Replication lag per replica; -1 while a replica is unreachable.",
+    ["replica"],
+    multiprocess_mode="max",
+)
+GEMINI_REQUEST_DURATION = Histogram(
+    "gemini_request_duration_seconds",
+    "Latency of call_gemini_api by outcome.",
+    ["outcome"],
+    buckets=LLM_BUCKETS,
+)
+GEMINI_ERRORS = Counter("gemini_errors_total", "Failed call_gemini_api calls.")
+CELERY_TASK_DURATION = Histogram(
+    "celery_task_duration_seconds",
+    "Celery task run time by task and final state.",
+    ["task", "state"],
+    buckets=LLM_BUCKETS,
+)
+EVENT_LOOP_LAG = Histogram(
+    "event_loop_lag_seconds",
+    "How late the API event loop ran a scheduled callback.",
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5),
+)
+EVENT_LOOP_BLOCKED = Counter(
+    "event_loop_blocked_total",
+    "Stalls of the API event loop longer than LOOP_MONITOR_THRESHOLD_MS.",
+)
+
+
+def get_registry() -> CollectorRegistry:
+    """
+    Registry to expose on scrape.
+
+    With `PROMETHEUS_MULTIPROC_DIR` set (several uvicorn workers or prefork
+    children) values are aggregated from every process' files.
+    """
+    if os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return registry
+    return REGISTRY
+
+
+def render_metrics(registry: Optional[CollectorRegistry] = None):
+    return generate_latest(registry or get_registry()), CONTENT_TYPE_LATEST
+
+
+def mark_process_dead(pid: int):
+    if os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+        multiprocess.mark_process_dead(pid)
+
+
+class QueueDepthCollector:
+    """Reads queue depths from Redis at scrape time instead of tracking them."""
+
+    def __init__(self, redis_client, queues, fair_queue=None):
+        self.redis_client = redis_client
+        self.queues = queues
+        self.fair_queue = fair_queue
+
+    def collect(self):
+        family = GaugeMetricFamily(
+            "celery_queue_depth", "Messages waiting in a queue.", labels=["queue"]
+        )
+        try:
+            pipe = self.redis_client.pipeline(transaction=False)
+            for queue in self.queues:
+                pipe.llen(queue)
+            for queue, depth in zip(self.queues, pipe.execute()):
+                family.add_metric([queue], depth)
+            if self.fair_queue is not None:
+                family.add_metric(["fair_queue"], self.fair_queue.depth())
+        except Exception:
+            pass
+        yield family
+
+
+def start_exporter(port: int, *collectors):
+    """Serves /metrics for a non-HTTP process such as the Celery worker."""
+    registry = get_registry()
+    for collector in collectors:
+        registry.register(collector)
+    start_http_server(port, registry=registry)
+
@@ -0,0 +1,69 @@
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterator, Optional
+
+
+@dataclass
+class RequestStats:
+    """Counts and time (seconds) spent per backend while serving one request."""
+
+    scope: Optional[Dict[str, Any]] = None
+    started_at: float = field(default_factory=time.perf_counter)
+    db_count: int = 0
+    db_time: float = 0.0
+    timings: Dict[str, float] = field(default_factory=dict)
+    counts: Dict[str, int] = field(default_factory=dict)
+
+    def add(self, kind: str, seconds: float):
+        self.timings[kind] = self.timings.get(kind, 0.0) + seconds
+        self.counts[kind] = self.counts.get(kind, 0) + 1
+
+    @property
+    def route(self) -> Optional[str]:
+        """Route template once the router has matched, else the raw path."""
+        if self.scope is None:
+            return None
+        route = self.scope.get("route")
+        return getattr(route, "path", None) or self.scope.get("path")
+
+    @property
+    def elapsed(self) -> float:
+        return time.perf_counter() - self.started_at
+
+
+_request_stats: ContextVar[Optional[RequestStats]] = ContextVar(
+    "request_stats", default=None
+)
+
+
+def start_request(scope: Optional[Dict[str, Any]] = None) -> RequestStats:
+    stats = RequestStats(scope=scope)
+    _request_stats.set(stats)
+    return stats
+
+
+def current_stats() -> Optional[RequestStats]:
+    return _request_stats.get()
+
+
+def record_query(seconds: float):
+    stats = _request_stats.get()
+    if stats is not None:
+        stats.db_count += 1
+        stats.db_time += seconds
+
+
+@contextmanager
+def measure(kind: str) -> Iterator[None]:
+    """Adds the block's wall time to the current request under `kind` (e.g. cache, redis)."""
+    stats = _request_stats.get()
+    if stats is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        stats.add(kind, time.perf_counter() - started)
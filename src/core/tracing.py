@@ -0,0 +1,213 @@
+import json
+import logging
+import secrets
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import asdict, dataclass, field
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from src.core.variables import TRACE_EXPORTER, TRACE_FILE
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class Span:
+    name: str
+    trace_id: str
+    span_id: str
+    parent_id: Optional[str]
+    start: float
+    end: Optional[float] = None
+    status: str = "ok"
+    attributes: Dict[str, Any] = field(default_factory=dict)
+
+    def set_attribute(self, key: str, value: Any):
+        self.attributes[key] = value
+
+    @property
+    def traceparent(self) -> str:
+        """W3C `traceparent` header value pointing at this span."""
+        return f"00-{self.trace_id}-{self.span_id}-01"
+
+    def to_dict(self) -> dict:
+        data = asdict(self)
+        data["duration_ms"] = (
+            round((self.end - self.start) * 1000, 3) if self.end is not None else None
+        )
+        return data
+
+
+class NoopExporter:
+    enabled = False
+
+    def export(self, span: Span):
+        pass
+
+
+class InMemoryExporter:
+    """Keeps finished spans in a list; meant for tests and benchmarks."""
+
+    enabled = True
+
+    def __init__(self):
+        self.spans: List[Span] = []
+        self._lock = threading.Lock()
+
+    def export(self, span: Span):
+        with self._lock:
+            self.spans.append(span)
+
+    def clear(self):
+        with self._lock:
+            self.spans.clear()
+
+    def by_trace(self, trace_id: str) -> List[Span]:
+        return sorted(
+            (s for s in self.spans if s.trace_id == trace_id), key=lambda s: s.start
+        )
+
+
+class FileExporter:
+    """Appends finished spans to a JSON-lines file, one span per line."""
+
+    enabled = True
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def export(self, span: Span):
+        line = json.dumps(span.to_dict(), default=str)
+        with self._lock:
+            with open(self.path, "a") as f:
+                f.write(line + "\n")
+
+
+def parse_traceparent(value: Optional[str]) -> Optional[Tuple[str, str]]:
+    """Returns `(trace_id, parent_span_id)` from a `traceparent` header, if valid."""
+    if not value:
+        return None
+    parts = value.split("-")
+    if len(parts) != 4 or len(parts[1]) != 32 or len(parts[2]) != 16:
+        return None
+    return parts[1], parts[2]
+
+
+_current_span: ContextVar[Optional[Span]] = ContextVar("current_span", default=None)
+
+
+class Tracer:
+    """
+    Minimal tracer with W3C trace context and a pluggable exporter.
+
+    With the default `NoopExporter` no spans are built at all, so instrumented
+    code pays only for an attribute check.
+    """
+
+    def __init__(self, exporter=None):
+        self.exporter = exporter or NoopExporter()
+
+    @property
+    def enabled(self) -> bool:
+        return self.exporter.enabled
+
+    def set_exporter(self, exporter):
+        self.exporter = exporter
+
+    def current_span(self) -> Optional[Span]:
+        return _current_span.get()
+
+    def current_traceparent(self) -> Optional[str]:
+        span = _current_span.get()
+        return span.traceparent if span else None
+
+    def _new_span(
+        self,
+        name: str,
+        start: float,
+        traceparent: Optional[str] = None,
+        parent: Optional[Span] = None,
+        attributes: Optional[Dict[str, Any]] = None,
+    ) -> Span:
+        remote = parse_traceparent(traceparent)
+        parent = parent or (None if remote else _current_span.get())
+        if parent is not None:
+            trace_id, parent_id = parent.trace_id, parent.span_id
+        elif remote is not None:
+            trace_id, parent_id = remote
+        else:
+            trace_id, parent_id = secrets.token_hex(16), None
+        return Span(
+            name=name,
+            trace_id=trace_id,
+            span_id=secrets.token_hex(8),
+            parent_id=parent_id,
+            start=start,
+            attributes=dict(attributes or {}),
+        )
+
+    @contextmanager
+    def start_span(
+        self,
+        name: str,
+        attributes: Optional[Dict[str, Any]] = None,
+        traceparent: Optional[str] = None,
+    ) -> Iterator[Optional[Span]]:
+        """
+        Runs the block inside a new span.
+
+        The span is a child of the current span, or of `traceparent` when one is
+        passed (e.g. from Celery task headers), or starts a new trace.
+        """
+        if not self.exporter.enabled:
+            yield None
+            return
+
+        span = self._new_span(name, time.time(), traceparent, attributes=attributes)
+        token = _current_span.set(span)
+        try:
+            yield span
+        except BaseException as e:
+            span.status = "error"
+            span.set_attribute("error", repr(e))
+            raise
+        finally:
+            _current_span.reset(token)
+            span.end = time.time()
+            self._export(span)
+
+    def record_span(
+        self,
+        name: str,
+        start: float,
+        end: float,
+        parent: Optional[Span] = None,
+        traceparent: Optional[str] = None,
+        attributes: Optional[Dict[str, Any]] = None,
+    ):
+        """Records a span after the fact, e.g. queue wait or a batched write."""
+        if not self.exporter.enabled:
+            return
+        span = self._new_span(name, start, traceparent, parent, attributes)
+        span.end = end
+        self._export(span)
+
+    def _export(self, span: Span):
+        try:
+            self.exporter.export(span)
+        except Exception:
+            logger.exception("Span export failed")
+
+
+def _exporter_from_env():
+    if TRACE_EXPORTER == "file":
+        return FileExporter(TRACE_FILE)
+    if TRACE_EXPORTER == "memory":
+        return InMemoryExporter()
+    return NoopExporter()
+
+
+tracer = Tracer(_exporter_from_env())
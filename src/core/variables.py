@@ -7,6 +7,14 @@ load_dotenv(override=True)
 HOST = os.getenv("HOST", "localhost")
 PORT = int(os.getenv("PORT", "8000"))
 JWT_SECRET = os.getenv("JWT_SECRET", "default_fallback_jwt_secret")
+SERVER_MODE = os.getenv("SERVER_MODE", "development")  # development | production
+WEB_CONCURRENCY = int(os.getenv("WEB_CONCURRENCY", "0"))  # 0: one worker per CPU
+SERVER_BACKLOG = int(os.getenv("SERVER_BACKLOG", "2048"))
+# Longer than the proxy's idle timeout so the proxy, not us, closes idle connections.
+KEEP_ALIVE_TIMEOUT = int(os.getenv("KEEP_ALIVE_TIMEOUT", "75"))
+GRACEFUL_SHUTDOWN_TIMEOUT = int(os.getenv("GRACEFUL_SHUTDOWN_TIMEOUT", "25"))
+# Proxies whose X-Forwarded-For is trusted: comma-separated addresses or CIDRs.
+FORWARDED_ALLOW_IPS = os.getenv("FORWARDED_ALLOW_IPS", "127.0.0.1")
 
 ## DATABASE ##
 DATABASE_HOST = os.getenv("DATABASE_HOST", "localhost")
@@ -15,15 +23,77 @@ DATABASE_DB = os.getenv("DATABASE_DB", "gemini_backend_clone")
 DATABASE_USER = os.getenv("DATABASE_USER", "postgres")
 DATABASE_PASS = os.getenv("DATABASE_PASS", "")
 DATABASE_URL = f"postgresql://{DATABASE_USER}:{DATABASE_PASS}@{DATABASE_HOST}:{DATABASE_PORT}/{DATABASE_DB}"
+# Direct connection to Postgres for LISTEN, migrations and anything else that
+# needs session state. Differs from DATABASE_URL only behind a pooler.
+DATABASE_DIRECT_URL = os.getenv("DATABASE_DIRECT_URL", DATABASE_URL)
+# "transaction" when DATABASE_URL points at PgBouncer in transaction pooling mode.
+DB_POOLER_MODE = os.getenv("DB_POOLER_MODE", "none")
+# Client-side connections per process in pooler mode; 0 opens one per checkout.
+DB_POOLER_POOL_SIZE = int(os.getenv("DB_POOLER_POOL_SIZE", "4"))
+# Applied with SET LOCAL at the start of every transaction; 0 disables it.
+DB_STATEMENT_TIMEOUT_MS = int(os.getenv("DB_STATEMENT_TIMEOUT_MS", "0"))
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "20"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+# Connections the web processes of one machine may hold in total, and how many of
+# Postgres' max_connections to leave for workers, the relay and admin sessions.
+DB_MAX_CONNECTIONS = int(os.getenv("DB_MAX_CONNECTIONS", "100"))
+DB_RESERVED_CONNECTIONS = int(os.getenv("DB_RESERVED_CONNECTIONS", "20"))
+# Comma separated URLs of streaming replicas that serve read-only requests.
+DATABASE_REPLICA_URLS = [
+    url.strip() for url in os.getenv("DATABASE_REPLICA_URLS", "").split(",") if url.strip()
+]
+REPLICA_MAX_LAG = float(os.getenv("REPLICA_MAX_LAG", "5"))
+REPLICA_LAG_CHECK_INTERVAL = float(os.getenv("REPLICA_LAG_CHECK_INTERVAL", "2"))
+READ_YOUR_WRITES_WINDOW = int(os.getenv("READ_YOUR_WRITES_WINDOW", "10"))
+# Delta-sync watermarks trail the clock by this many seconds so rows committed
+# late, or not yet on a replica, are still picked up. Keep it above REPLICA_MAX_LAG.
+DELTA_SYNC_SAFETY_WINDOW = int(os.getenv("DELTA_SYNC_SAFETY_WINDOW", "10"))
+WORKER_DB_POOL_SIZE = int(os.getenv("WORKER_DB_POOL_SIZE", "2"))
+WORKER_DB_MAX_OVERFLOW = int(os.getenv("WORKER_DB_MAX_OVERFLOW", "1"))
+SLOW_QUERY_THRESHOLD_MS = float(os.getenv("SLOW_QUERY_THRESHOLD_MS", "200"))
+SLOW_QUERY_EXPLAIN_SAMPLE_RATE = float(os.getenv("SLOW_QUERY_EXPLAIN_SAMPLE_RATE", "0.1"))
+SLOW_QUERY_LOG_PER_MINUTE = int(os.getenv("SLOW_QUERY_LOG_PER_MINUTE", "30"))
 
 ## LLM ##
 GEMINI_API_KEY = os.getenv("GEMINI_API_KEY", "")
+# When set, call_gemini_api sleeps this long and echoes the prompt instead of
+# calling Gemini. Only for benchmarks and local load tests.
+GEMINI_FAKE_LATENCY_MS = os.getenv("GEMINI_FAKE_LATENCY_MS")
 
 ## REDIS ##
 REDIS_HOST = os.getenv("REDIS_HOST", "")
 REDIS_PORT = int(os.getenv("REDIS_PORT", "6379"))
 REDIS_PASSWORD = os.getenv("REDIS_PASSWORD", None)
 REDIS_URL = f"redis://:{REDIS_PASSWORD}@{REDIS_HOST}:{REDIS_PORT}/0"
+PLAN_TIER_CACHE_TTL = int(os.getenv("PLAN_TIER_CACHE_TTL", "3600"))
+
+## QUEUE ##
+FAIR_QUEUE_MAX_INFLIGHT = int(os.getenv("FAIR_QUEUE_MAX_INFLIGHT", "16"))
+FAIR_QUEUE_USER_MAX_INFLIGHT = int(os.getenv("FAIR_QUEUE_USER_MAX_INFLIGHT", "2"))
+# Lease length; a call whose release is lost holds its slot this long at most.
+FAIR_QUEUE_INFLIGHT_TTL = int(os.getenv("FAIR_QUEUE_INFLIGHT_TTL", "900"))
+# Users looked at per dispatch pass, from the head of the ring.
+FAIR_QUEUE_DISPATCH_WINDOW = int(os.getenv("FAIR_QUEUE_DISPATCH_WINDOW", "16"))
+FAIR_QUEUE_DISPATCH_INTERVAL = float(os.getenv("FAIR_QUEUE_DISPATCH_INTERVAL", "5"))
+RESULT_SINK_MAX_BATCH = int(os.getenv("RESULT_SINK_MAX_BATCH", "50"))
+RESULT_SINK_MAX_DELAY_MS = int(os.getenv("RESULT_SINK_MAX_DELAY_MS", "50"))
+OUTBOX_BATCH_SIZE = int(os.getenv("OUTBOX_BATCH_SIZE", "200"))
+OUTBOX_POLL_INTERVAL = float(os.getenv("OUTBOX_POLL_INTERVAL", "1"))
+OUTBOX_RETENTION = int(os.getenv("OUTBOX_RETENTION", "86400"))
+CELERY_POOL = os.getenv("CELERY_POOL", "")  # empty: prefork, or solo on Windows
+CELERY_CONCURRENCY = int(os.getenv("CELERY_CONCURRENCY", "0"))  # 0: one per CPU
+CELERY_MAX_TASKS_PER_CHILD = int(os.getenv("CELERY_MAX_TASKS_PER_CHILD", "1000"))
+
+## METRICS ##
+API_METRICS_PORT = int(os.getenv("API_METRICS_PORT", "9807"))
+WORKER_METRICS_PORT = int(os.getenv("WORKER_METRICS_PORT", "9808"))
+TRACE_EXPORTER = os.getenv("TRACE_EXPORTER", "none")  # none | file | memory
+TRACE_FILE = os.getenv("TRACE_FILE", "traces.jsonl")
+QUERY_COUNT_THRESHOLD = int(os.getenv("QUERY_COUNT_THRESHOLD", "10"))
+QUERY_COUNT_STRICT = os.getenv("QUERY_COUNT_STRICT", "false").lower() == "true"
+LOOP_MONITOR_INTERVAL_MS = float(os.getenv("LOOP_MONITOR_INTERVAL_MS", "100"))
+LOOP_MONITOR_THRESHOLD_MS = float(os.getenv("LOOP_MONITOR_THRESHOLD_MS", "100"))
+LOOP_MONITOR_STRICT = os.getenv("LOOP_MONITOR_STRICT", "false").lower() == "true"
 
 ## STRIPE ##
 STRIPE_SECRET_KEY = os.getenv("STRIPE_SECRET_KEY", "")
@@ -31,6 +101,19 @@ STRIPE_PRO_PRICE_ID = os.getenv("STRIPE_PRO_PRICE_ID", "")
 STRIPE_CANCEL_URL = os.getenv("STRIPE_CANCEL_URL", "")
 STRIPE_SUCCESS_URL = os.getenv("STRIPE_SUCCESS_URL", "")
 STRIPE_WEBHOOK_SECRET = os.getenv("STRIPE_WEBHOOK_SECRET", "")
+STRIPE_EVENT_DEDUP_TTL = int(os.getenv("STRIPE_EVENT_DEDUP_TTL", "259200"))
+STRIPE_API_BASE = os.getenv("STRIPE_API_BASE", None)
+STRIPE_PRICE_CACHE_TTL = int(os.getenv("STRIPE_PRICE_CACHE_TTL", "3600"))
+# A failing event is retried after 30s, 60s, 120s, ... (capped at an hour) and
+# given up on, as "failed", after this many attempts.
+STRIPE_EVENT_MAX_ATTEMPTS = int(os.getenv("STRIPE_EVENT_MAX_ATTEMPTS", "8"))
+STRIPE_EVENT_RETRY_BACKOFF = int(os.getenv("STRIPE_EVENT_RETRY_BACKOFF", "30"))
+STRIPE_EVENT_RETRY_INTERVAL = float(os.getenv("STRIPE_EVENT_RETRY_INTERVAL", "60"))
+
+## PLANS ##
+PRO_PLAN_DURATION = int(os.getenv("PRO_PLAN_DURATION", str(30 * 86400)))
+PLAN_EXPIRY_SWEEP_INTERVAL = float(os.getenv("PLAN_EXPIRY_SWEEP_INTERVAL", "300"))
+PLAN_EXPIRY_BATCH_SIZE = int(os.getenv("PLAN_EXPIRY_BATCH_SIZE", "500"))
 
 ## CORS ##
 origins = [
@@ -7,6 +7,7 @@ import traceback
 from typing import Optional
 from src.core.db_models import TableNameEnum
 from src.core.db_methods import DB
+from src.core.db_pool import on_primary
 from src.decorators.jwt import decode_jwt_token, extract_token_from_request
 
 from src.utils.format_response import format_response
@@ -32,11 +33,14 @@ def authentication_required(func):
         payload = decode_jwt_token(token)
         user_id = payload["sub"]
 
-        exist_user = await db.get_attr(
-            dbClassName=TableNameEnum.Users,
-            uid=user_id,
-            db_pool=db_pool,
-        )
+        # Signup and verify-otp write without a token, so no read-your-writes
+        # window covers them; a lagging replica would still see confirmed=False.
+        with on_primary(db_pool):
+            exist_user = await db.get_attr(
+                dbClassName=TableNameEnum.Users,
+                uid=user_id,
+                db_pool=db_pool,
+            )
         if not exist_user or exist_user.disabled is True:
             raise HTTPException(
                 detail="User account is inactive or invalid.",
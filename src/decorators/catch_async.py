@@ -5,12 +5,29 @@ from sqlmodel import Session
 from src.utils.format_response import format_response
 
 
-def catch_async(func):
+def catch_async(func=None, *, read_only: bool = False):
+    """
+    Turns exceptions into formatted responses and scopes the request's transaction.
+
+    Handlers that only read can be declared with `@catch_async(read_only=True)`:
+    their statements run in autocommit without BEGIN/ROLLBACK (in a read-only
+    transaction behind a pooler with a statement timeout), and any write
+    raises. Other handlers run in a transaction that is rolled back unless the
+    service commits it.
+    """
+    if func is None:
+        return lambda f: catch_async(f, read_only=read_only)
+
     @wraps(func)
     async def wrapper(*args, **kwargs):
         db_pool: Session | None = kwargs.get("db_pool", None)
 
         try:
+            if read_only:
+                if db_pool:
+                    db_pool.info["read_only"] = True
+                return await func(*args, **kwargs)
+
             if db_pool and not db_pool.in_transaction():
                 db_pool.begin()
 
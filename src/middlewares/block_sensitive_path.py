@@ -17,14 +17,17 @@ SENSITIVE_PATTERNS = [
 ]
 
 
+def is_sensitive_path(path: str) -> bool:
+    return any(pattern.search(path) for pattern in SENSITIVE_PATTERNS)
+
+
 class BlockSensitivePathsMiddleware(BaseHTTPMiddleware):
     async def dispatch(self, request: Request, call_next):
         path = request.url.path
-        for pattern in SENSITIVE_PATTERNS:
-            if pattern.search(path):
-                logging.warning(f"Access to sensitive content is forbidden for {path}")
-                return format_response(
-                    status_code=status.HTTP_403_FORBIDDEN,
-                    message="Access to sensitive content is forbidden.",
-                )
+        if is_sensitive_path(path):
+            logging.warning(f"Access to sensitive content is forbidden for {path}")
+            return format_response(
+                status_code=status.HTTP_403_FORBIDDEN,
+                message="Access to sensitive content is forbidden.",
+            )
         return await call_next(request)
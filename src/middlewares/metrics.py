@@ -0,0 +1,40 @@
+import time
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+from src.core.metrics import HTTP_REQUEST_DURATION
+
+
+class MetricsMiddleware:
+    """
+    Records request latency per route template.
+
+    Written as plain ASGI rather than `BaseHTTPMiddleware` so it adds no extra
+    task or body buffering. The route is read after the app has run, once the
+    router has put the matched route in the scope; unmatched paths share one
+    label so random URLs cannot blow up the series count.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        started = time.perf_counter()
+        status_code = 500
+
+        async def send_wrapper(message: Message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            route = scope.get("route")
+            HTTP_REQUEST_DURATION.labels(
+                method=scope["method"],
+                route=getattr(route, "path", "unmatched"),
+                status=str(status_code),
+            ).observe(time.perf_counter() - started)
@@ -0,0 +1,97 @@
+import json
+import logging
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+from src.core.request_stats import start_request
+from src.core.variables import QUERY_COUNT_STRICT, QUERY_COUNT_THRESHOLD
+
+logger = logging.getLogger("request_stats")
+
+
+class ServerTimingMiddleware:
+    """
+    Adds per-request DB, cache and Redis totals to the response and the logs.
+
+    Totals are exposed as a `Server-Timing` header and logged as one JSON line
+    per request. Requests issuing more than `QUERY_COUNT_THRESHOLD` statements
+    are logged as warnings; with `QUERY_COUNT_STRICT` on (CI) they fail with a
+    500 so N+1 regressions break the build.
+    """
+
+    def __init__(
+        self,
+        app: ASGIApp,
+        threshold: int = QUERY_COUNT_THRESHOLD,
+        strict: bool = QUERY_COUNT_STRICT,
+    ):
+        self.app = app
+        self.threshold = threshold
+        self.strict = strict
+
+    def _header(self, stats) -> bytes:
+        parts = [f'db;dur={stats.db_time * 1000:.1f};desc="{stats.db_count} queries"']
+        for kind, seconds in stats.timings.items():
+            parts.append(f"{kind};dur={seconds * 1000:.1f}")
+        parts.append(f"app;dur={stats.elapsed * 1000:.1f}")
+        return ", ".join(parts).encode()
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        stats = start_request(scope)
+        status_code = 500
+        rejected = False
+
+        async def send_wrapper(message: Message):
+            nonlocal status_code, rejected
+            if message["type"] == "http.response.start":
+                if self.strict and stats.db_count > self.threshold:
+                    rejected = True
+                    body = json.dumps(
+                        {
+                            "message": f"Query budget exceeded: {stats.db_count} > {self.threshold}",
+                            "success": False,
+                            "status_code": 500,
+                            "data": {},
+                        }
+                    ).encode()
+                    status_code = 500
+                    await send(
+                        {
+                            "type": "http.response.start",
+                            "status": 500,
+                            "headers": [
+                                (b"content-type", b"application/json"),
+                                (b"content-length", str(len(body)).encode()),
+                                (b"server-timing", self._header(stats)),
+                            ],
+                        }
+                    )
+                    await send({"type": "http.response.body", "body": body})
+                    return
+                status_code = message["status"]
+                message.setdefault("headers", [])
+                message["headers"] = list(message["headers"]) + [
+                    (b"server-timing", self._header(stats))
+                ]
+            elif rejected:
+                return
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            route = getattr(scope.get("route"), "path", scope["path"])
+            record = {
+                "method": scope["method"],
+                "route": route,
+                "status": status_code,
+                "duration_ms": round(stats.elapsed * 1000, 2),
+                "db_queries": stats.db_count,
+                "db_ms": round(stats.db_time * 1000, 2),
+                **{f"{k}_ms": round(v * 1000, 2) for k, v in stats.timings.items()},
+            }
+            if stats.db_count > self.threshold:
+                logger.warning(json.dumps({**record, "query_budget_exceeded": True}))
+            else:
+                logger.info(json.dumps(record))
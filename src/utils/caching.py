@@ -1,16 +1,24 @@
 import hashlib
 import json
-from redis import asyncio as aioredis
+from typing import Iterable, Optional
+from redis import Redis, asyncio as aioredis
 from fastapi import Request
 
 from functools import wraps
 from fastapi import Request
 from fastapi.responses import JSONResponse
 
-from src.core.variables import REDIS_URL
+from src.core.metrics import CACHE_REQUESTS
+from src.core.request_stats import measure
+from src.core.tracing import tracer
+from src.core.variables import REDIS_URL, PLAN_TIER_CACHE_TTL, READ_YOUR_WRITES_WINDOW
 from src.decorators.jwt import decode_jwt_token, extract_token_from_request
 
 redis = aioredis.from_url(REDIS_URL, decode_responses=True)
+sync_redis = Redis.from_url(REDIS_URL, decode_responses=True)
+
+PLAN_TIER_PREFIX = "plan_tier:"
+RECENT_WRITE_PREFIX = "rw:"
 
 
 def generate_cache_key(request: Request) -> str:
@@ -29,11 +37,13 @@ def generate_cache_key(request: Request) -> str:
 
 
 async def get_cached_response(key: str):
-    return await redis.get(key)
+    with tracer.start_span("redis.get"), measure("cache"):
+        return await redis.get(key)
 
 
 async def set_cached_response(key: str, data: dict, ttl: int = 60):
-    await redis.set(key, data, ex=ttl)
+    with tracer.start_span("redis.set"), measure("cache"):
+        await redis.set(key, data, ex=ttl)
 
 
 def cache_response(ttl: int = 60):
@@ -47,10 +57,12 @@ def cache_response(ttl: int = 60):
             cache_key = generate_cache_key(request)
             cached = await get_cached_response(cache_key)
             if cached:
+                CACHE_REQUESTS.labels(cache="response", result="hit").inc()
                 return JSONResponse(
                     content=json.loads(cached), headers={"X-Cache-Status": "HIT"}
                 )
 
+            CACHE_REQUESTS.labels(cache="response", result="miss").inc()
             response = await func(*args, **kwargs)
             # if response is not of JSONResponse we avoid caching it.
             if isinstance(response, JSONResponse) and response.status_code == 200:
@@ -62,3 +74,35 @@ def cache_response(ttl: int = 60):
         return wrapper
 
     return decorator
+
+
+async def get_cached_plan_tier(user_id: str) -> Optional[str]:
+    with tracer.start_span("redis.get"), measure("cache"):
+        tier = await redis.get(f"{PLAN_TIER_PREFIX}{user_id}")
+    CACHE_REQUESTS.labels(
+        cache="plan_tier", result="miss" if tier is None else "hit"
+    ).inc()
+    return tier
+
+
+async def set_cached_plan_tier(user_id: str, tier: str, ttl: int = PLAN_TIER_CACHE_TTL):
+    with measure("cache"):
+        await redis.set(f"{PLAN_TIER_PREFIX}{user_id}", tier, ex=ttl)
+
+
+def invalidate_plan_tiers(user_ids: Iterable[str]):
+    """Drops cached plan tiers; used from sync code such as Celery tasks."""
+    keys = [f"{PLAN_TIER_PREFIX}{user_id}" for user_id in user_ids]
+    if keys:
+        sync_redis.delete(*keys)
+
+
+async def mark_recent_write(user_id: str, ttl: int = READ_YOUR_WRITES_WINDOW):
+    """Pins the user's reads to the primary for `ttl` seconds after a write."""
+    with measure("cache"):
+        await redis.set(f"{RECENT_WRITE_PREFIX}{user_id}", 1, ex=ttl)
+
+
+async def has_recent_write(user_id: str) -> bool:
+    with measure("cache"):
+        return bool(await redis.exists(f"{RECENT_WRITE_PREFIX}{user_id}"))
@@ -1,16 +1,54 @@
-import google.generativeai as genai
-from src.core.variables import GEMINI_API_KEY
+import threading
+import time
+from src.core.metrics import GEMINI_ERRORS, GEMINI_REQUEST_DURATION
+from src.core.tracing import tracer
+from src.core.variables import GEMINI_API_KEY, GEMINI_FAKE_LATENCY_MS
 
-genai.configure(api_key=GEMINI_API_KEY)
-model = genai.GenerativeModel("models/gemini-1.5-flash")
+_model = None
+_model_lock = threading.Lock()
+
+
+def get_model():
+    """
+    Returns the Gemini model, importing and configuring the SDK on first use.
+
+    Only worker processes call Gemini, so nothing else pays for loading the
+    SDK, and each prefork child sets up its own gRPC channel after the fork.
+    """
+    global _model
+    if _model is None:
+        with _model_lock:
+            if _model is None:
+                import google.generativeai as genai
+
+                genai.configure(api_key=GEMINI_API_KEY)
+                _model = genai.GenerativeModel("models/gemini-1.5-flash")
+    return _model
+
+
+def _fake_generate(prompt: str) -> str:
+    time.sleep(float(GEMINI_FAKE_LATENCY_MS) / 1000)
+    return f"Echo: {prompt}"
 
 
 def call_gemini_api(prompt: str) -> str:
     """
     Calls the Gemini API with the given prompt and returns the response text.
     """
+    started = time.perf_counter()
     try:
-        response = model.generate_content(prompt)
-        return response.text
+        with tracer.start_span("gemini.generate_content"):
+            if GEMINI_FAKE_LATENCY_MS is not None:
+                text = _fake_generate(prompt)
+            else:
+                text = get_model().generate_content(prompt).text
+        GEMINI_REQUEST_DURATION.labels(outcome="success").observe(
+            time.perf_counter() - started
+        )
+        return text
     except Exception as e:
+        GEMINI_REQUEST_DURATION.labels(outcome="error").observe(
+            time.perf_counter() - started
+        )
+        GEMINI_ERRORS.inc()
         return f"Error: {e}"
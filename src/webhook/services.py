@@ -1,17 +1,40 @@
-from fastapi import HTTPException, status
+import logging
+import time
+from typing import List, Optional
 from sqlmodel import Session
-import stripe
-from src.core.variables import STRIPE_WEBHOOK_SECRET
+from src.celery import outbox
 from src.core.db_methods import DB
 from src.core.db_models import TableNameEnum
-from src.core.variables import STRIPE_WEBHOOK_SECRET
+from src.api.subscription.gateway import gateway
+from src.core.variables import (
+    PRO_PLAN_DURATION,
+    STRIPE_EVENT_DEDUP_TTL,
+    STRIPE_EVENT_MAX_ATTEMPTS,
+    STRIPE_EVENT_RETRY_BACKOFF,
+    STRIPE_WEBHOOK_SECRET,
+)
+from src.core.request_stats import measure
+from src.utils.caching import invalidate_plan_tiers, redis
 
 db = DB()
+logger = logging.getLogger(__name__)
+
+EVENT_DEDUP_PREFIX = "stripe:event:"
+ENDED_SUBSCRIPTION_STATUSES = ("canceled", "unpaid", "incomplete_expired")
 
 
 async def process_stripe_webhook(
     payload: bytes, stripe_signature: str, db_pool: Session
 ):
+    """
+    Verifies a Stripe event and queues it for processing.
+
+    Only the signature check, a Redis dedup lookup and one insert happen on the
+    request path; the plan and transaction writes run in the worker. Duplicate
+    deliveries are acknowledged without touching the database.
+    """
+    import stripe
+
     try:
         decoded_payload = payload.decode()
         event = stripe.Webhook.construct_event(
@@ -22,98 +45,196 @@ async def process_stripe_webhook(
     except Exception:
         return None  # Signature or webhook secret is invalid
 
-    event_type = event["type"]
-    data = event["data"]["object"]
+    if event["type"] not in EVENT_HANDLERS:
+        return True  # Unhandled event, but valid signature, so we simply return 200
 
-    print("event_type", event_type)
-    session_id = data.get("id")
-    if event_type == "checkout.session.completed":
-        customer_id = data.get("customer")
-        return await handle_checkout_completed(customer_id, session_id, db_pool)
-    elif event_type == "checkout.session.expired":
-        return await handle_checkout_expired(session_id, db_pool)
+    dedup_key = f"{EVENT_DEDUP_PREFIX}{event['id']}"
+    with measure("redis"):
+        is_new = await redis.set(dedup_key, 1, nx=True, ex=STRIPE_EVENT_DEDUP_TTL)
+    if not is_new:
+        return True
 
-    return True  # Unhandled event, but valid signature, so we simply return 200
+    try:
+        if await db.record_stripe_event(event, db_pool=db_pool):
+            customer_id = event["data"]["object"].get("customer")
+            await outbox.stage(
+                topic="process_stripe_events",
+                payload={"customer_id": customer_id},
+                db_pool=db_pool,
+            )
+        db_pool.commit()
+    except Exception:
+        # Let Stripe's retry get through the dedup check.
+        await redis.delete(dedup_key)
+        raise
 
+    return True
 
-async def handle_checkout_completed(
-    customer_id: str, session_id: str, db_pool: Session
-):
-    user = await db.get_attr(
-        dbClassName=TableNameEnum.Users, customer_id=customer_id, db_pool=db_pool
-    )
-    if user:
-        # Before updating the transaction details we are doing one final retrieve.
-        existing_transaction = await db.get_attr(
-            dbClassName=TableNameEnum.Transactions,
-            transaction_id=session_id,
-            db_pool=db_pool,
-        )
-        if existing_transaction is None:
-            raise HTTPException(
-                detail="Transaction not found", status_code=status.HTTP_404_NOT_FOUND
+
+async def process_pending_events(customer_id: Optional[str], db_pool: Session):
+    """
+    Applies every pending event of a customer in the order Stripe created them.
+
+    An advisory lock serialises runs for the same customer, so a task that queued
+    behind another finds the events already handled and does nothing.
+
+    A failing event stays pending with a growing backoff, and the customer's
+    later events wait behind it so they still apply in order. `retry_due_events`
+    picks it up again; after `STRIPE_EVENT_MAX_ATTEMPTS` it is marked failed.
+    """
+    await db.lock_stripe_customer(customer_id, db_pool=db_pool)
+    events = await db.get_pending_stripe_events(customer_id, db_pool=db_pool)
+    now = int(time.time())
+
+    for event in events:
+        event_id, attempts = event.event_id, event.attempts
+        if event.next_attempt_at and event.next_attempt_at > now:
+            break
+        handler = EVENT_HANDLERS.get(event.type)
+        savepoint = db_pool.begin_nested()
+        try:
+            handled = await handler(event.payload, db_pool) if handler else False
+            savepoint.commit()
+        except Exception:
+            savepoint.rollback()
+            attempts += 1
+            if attempts >= STRIPE_EVENT_MAX_ATTEMPTS:
+                logger.exception(f"Stripe event {event_id} failed {attempts} times, giving up")
+                await db.mark_stripe_event(event_id, "failed", db_pool=db_pool)
+                continue
+            delay = min(STRIPE_EVENT_RETRY_BACKOFF * 2 ** (attempts - 1), 3600)
+            logger.exception(f"Stripe event {event_id} failed, retrying in {delay}s")
+            await db.schedule_stripe_event_retry(
+                event_id, attempts, now + delay, db_pool=db_pool
             )
-        # Deactive user old plan.
-        existing_plan = await db.get_attr(
-            dbClassName=TableNameEnum.UserPlan,
-            uid=user.uid,
-            where={"active": True},
-            db_pool=db_pool,
+            break
+        await db.mark_stripe_event(
+            event_id, "processed" if handled else "skipped", db_pool=db_pool
         )
-        if existing_plan:
-            updated_plan, ok = await db.update(
-                dbClassName=TableNameEnum.UserPlan,
-                data={
-                    **existing_plan.model_dump(),
-                    "active": False,
-                },
-                db_pool=db_pool,
-            )
-            print("updated_plan", updated_plan)
-        new_plan, ok = await db.insert(
-            dbClassName=TableNameEnum.UserPlan,
-            data={
-                "user_id": user.uid,
-                "active": True,
-                "plan": "pro",
-            },
-            db_pool=db_pool,
+
+    db_pool.commit()
+
+    if events and customer_id:
+        user = await db.get_attr(
+            dbClassName=TableNameEnum.Users, customer_id=customer_id, db_pool=db_pool
         )
-        if ok is False:
-            raise HTTPException(
-                detail="Failed to create new plan",
-                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            )
+        if user:
+            invalidate_plan_tiers([user.uid])
+    return len(events)
+
+
+async def retry_due_events(db_pool: Session, limit: int = 500) -> List[Optional[str]]:
+    """Customers whose pending events are due, to be processed again."""
+    return await db.get_due_stripe_customers(int(time.time()), limit, db_pool=db_pool)
+
+
+def subscription_period_end(subscription: dict) -> Optional[int]:
+    """End of the current billing period; newer API versions keep it on the items."""
+    if subscription.get("current_period_end"):
+        return subscription["current_period_end"]
+    items = (subscription.get("items") or {}).get("data") or []
+    ends = [item["current_period_end"] for item in items if item.get("current_period_end")]
+    return max(ends) if ends else None
+
+
+def invoice_subscription_id(invoice: dict) -> Optional[str]:
+    if invoice.get("subscription"):
+        return invoice["subscription"]
+    details = ((invoice.get("parent") or {}).get("subscription_details")) or {}
+    return details.get("subscription")
+
+
+async def handle_checkout_completed(data: dict, db_pool: Session) -> bool:
+    customer_id = data.get("customer")
+    session_id = data.get("id")
+    subscription_id = data.get("subscription")
+    user = await db.get_attr(
+        dbClassName=TableNameEnum.Users, customer_id=customer_id, db_pool=db_pool
+    )
+    if not user:
+        logger.warning(f"No user for Stripe customer {customer_id}")
+        return False
+
+    # Before updating the transaction details we are doing one final retrieve.
+    existing_transaction = await db.get_attr(
+        dbClassName=TableNameEnum.Transactions,
+        transaction_id=session_id,
+        db_pool=db_pool,
+    )
+    if existing_transaction is None:
+        logger.warning(f"Transaction {session_id} not found")
+        return False
+    elif existing_transaction.status == "completed":
+        return False
+
+    # Deactive user old plan.
+    existing_plan = await db.get_attr(
+        dbClassName=TableNameEnum.UserPlan,
+        uid=user.uid,
+        where={"active": True},
+        db_pool=db_pool,
+    )
+    if existing_plan:
         _, ok = await db.update(
-            dbClassName=TableNameEnum.Transactions,
+            dbClassName=TableNameEnum.UserPlan,
             data={
-                **existing_transaction.model_dump(),
-                "status": "completed",
-                "plan_id": new_plan.plan_id,
+                **existing_plan.model_dump(),
+                "active": False,
             },
             db_pool=db_pool,
         )
         if ok is False:
-            raise HTTPException(
-                detail="Failed to update transaction",
-                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            )
+            raise RuntimeError("Failed to deactivate old plan")
+    new_plan, ok = await db.insert(
+        dbClassName=TableNameEnum.UserPlan,
+        data={
+            "user_id": user.uid,
+            "active": True,
+            "plan": "pro",
+        },
+        db_pool=db_pool,
+    )
+    if ok is False:
+        raise RuntimeError("Failed to create new plan")
+
+    # A recurring checkout lasts until the end of the billing period; renewals
+    # push it further through invoice.paid and customer.subscription.updated.
+    # The subscription is read live, so its events that were applied before
+    # this one, and matched no transaction yet, are still reflected.
+    expires_at = None
+    if subscription_id:
+        subscription = await gateway.retrieve_subscription(subscription_id)
+        if subscription.get("status") in ENDED_SUBSCRIPTION_STATUSES:
+            expires_at = int(time.time())
+        else:
+            expires_at = subscription_period_end(subscription)
+    _, ok = await db.update(
+        dbClassName=TableNameEnum.Transactions,
+        data={
+            **existing_transaction.model_dump(),
+            "status": "completed",
+            "plan_id": new_plan.plan_id,
+            "stripe_subscription_id": subscription_id,
+            "expires_at": expires_at or int(time.time()) + PRO_PLAN_DURATION,
+        },
+        db_pool=db_pool,
+    )
+    if ok is False:
+        raise RuntimeError("Failed to update transaction")
 
-    db_pool.commit()
     return True
 
 
-async def handle_checkout_expired(session_id: str, db_pool: Session):
+async def handle_checkout_expired(data: dict, db_pool: Session) -> bool:
+    session_id = data.get("id")
     existing_transaction = await db.get_attr(
         dbClassName=TableNameEnum.Transactions,
         transaction_id=session_id,
         db_pool=db_pool,
     )
     if existing_transaction is None:
-        raise HTTPException(
-            detail="Transaction not found.",
-            status_code=status.HTTP_404_NOT_FOUND,
-        )
+        logger.warning(f"Transaction {session_id} not found")
+        return False
 
     _, ok = await db.update(
         dbClassName=TableNameEnum.Transactions,
@@ -123,11 +244,57 @@ async def handle_checkout_expired(session_id: str, db_pool: Session):
         },
         db_pool=db_pool,
     )
-    if not ok:
-        raise HTTPException(
-            detail="Failed to update expired transaction",
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-        )
+    if ok is False:
+        raise RuntimeError("Failed to update expired transaction")
 
-    db_pool.commit()
     return True
+
+
+async def handle_invoice_paid(data: dict, db_pool: Session) -> bool:
+    subscription_id = invoice_subscription_id(data)
+    lines = (data.get("lines") or {}).get("data") or []
+    period_ends = [line["period"]["end"] for line in lines if line.get("period")]
+    if not subscription_id or not period_ends:
+        return False
+    # Before the checkout is applied nothing matches; it reads the period itself.
+    updated = await db.set_subscription_expiry(
+        subscription_id, max(period_ends), "extend", db_pool=db_pool
+    )
+    return updated > 0
+
+
+async def handle_subscription_updated(data: dict, db_pool: Session) -> bool:
+    status = data.get("status")
+    if status in ("active", "trialing"):
+        period_end = subscription_period_end(data)
+        if not period_end:
+            return False
+        # Never moves it back, so an older update applied late changes nothing.
+        updated = await db.set_subscription_expiry(
+            data["id"], period_end, "extend", db_pool=db_pool
+        )
+    elif status in ENDED_SUBSCRIPTION_STATUSES:
+        updated = await db.set_subscription_expiry(
+            data["id"], int(time.time()), "end", db_pool=db_pool
+        )
+    else:
+        # past_due and friends keep the plan until the paid period runs out.
+        return False
+    return updated > 0
+
+
+async def handle_subscription_deleted(data: dict, db_pool: Session) -> bool:
+    # The expiry sweep moves the user back to basic on its next run.
+    updated = await db.set_subscription_expiry(
+        data["id"], int(time.time()), "end", db_pool=db_pool
+    )
+    return updated > 0
+
+
+EVENT_HANDLERS = {
+    "checkout.session.completed": handle_checkout_completed,
+    "checkout.session.expired": handle_checkout_expired,
+    "invoice.paid": handle_invoice_paid,
+    "customer.subscription.updated": handle_subscription_updated,
+    "customer.subscription.deleted": handle_subscription_deleted,
+}
@@ -11,7 +11,7 @@ router = APIRouter(prefix="/webhook", tags=["Webhooks"])
 
 @router.post(
     "/stripe",
-    description="Handles Stripe webhook events (e.g., payment success/failure).",
+    description="Verifies Stripe webhook events and queues them for processing (e.g., payment success/failure).",
 )
 @catch_async
 async def stripe_webhook(